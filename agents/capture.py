@@ -0,0 +1,102 @@
+import contextvars
+import io
+import os
+import sys
+import threading
+
+from core.request_context import current_request
+
+# cap for what one tool call hands back to the LLM (what one request keeps: AGENT_LOG_MAX_ENTRIES)
+AGENT_LOG_MAX_CHARS = int(os.getenv("AGENT_LOG_MAX_CHARS", "8000"))
+
+_buffer = contextvars.ContextVar("agent_stdout", default=None)
+_install_lock = threading.Lock()
+
+
+class _StdoutProxy:
+    '''
+    sys.stdout replacement that writes into the buffer of the current context when one is set.
+    contextlib.redirect_stdout swaps the process wide stream, which breaks as soon as two agents
+    run on different threads; this keeps each captured transcript separate.
+    '''
+
+    def __init__(self, stream):
+        self._stream = stream
+
+    def write(self, s):
+        buf = _buffer.get()
+        return (buf if buf is not None else self._stream).write(s)
+
+    def flush(self):
+        buf = _buffer.get()
+        (buf if buf is not None else self._stream).flush()
+
+    def __getattr__(self, name):
+        return getattr(self._stream, name)
+
+
+def _install():
+    if isinstance(sys.stdout, _StdoutProxy):
+        return
+    with _install_lock:
+        if not isinstance(sys.stdout, _StdoutProxy):
+            sys.stdout = _StdoutProxy(sys.stdout)
+
+
+def run_captured(callable_fn, *args, **kwargs):
+    '''
+    calls callable_fn capturing everything it prints (e.g. verbose AgentExecutor output).
+    returns (result, output); on failure returns ({"error": msg}, msg).
+    '''
+    _install()
+    buffer = io.StringIO()
+    token = _buffer.set(buffer)
+    try:
+        result = callable_fn(*args, **kwargs)
+        return result, buffer.getvalue()
+    except Exception as e:
+        error_msg = f"[ERROR] {str(e)}"
+        return {"error": error_msg}, error_msg
+    finally:
+        _buffer.reset(token)
+
+
+async def arun_captured(coroutine_fn, *args, **kwargs):
+    '''async version of run_captured, the buffer follows the current asyncio task'''
+    _install()
+    buffer = io.StringIO()
+    token = _buffer.set(buffer)
+    try:
+        result = await coroutine_fn(*args, **kwargs)
+        return result, buffer.getvalue()
+    except Exception as e:
+        error_msg = f"[ERROR] {str(e)}"
+        return {"error": error_msg}, error_msg
+    finally:
+        _buffer.reset(token)
+
+
+def request_logs():
+    '''the transcripts recorded in the current request so far'''
+    request = current_request()
+    return list(request.logs) if request is not None else []
+
+
+def truncate_log(output, max_chars=AGENT_LOG_MAX_CHARS):
+    if len(output) <= max_chars:
+        return output
+    head = max_chars // 2
+    tail = max_chars - head
+    return f"{output[:head]}\n...[{len(output) - max_chars} chars truncated]...\n{output[-tail:]}"
+
+
+def record_log(output):
+    '''
+    truncates one captured transcript and appends it to the current request's log (if any).
+    returns the truncated text.
+    '''
+    output = truncate_log(output)
+    request = current_request()
+    if request is not None:
+        request.logs.append(output)
+    return output
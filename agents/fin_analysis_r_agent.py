@@ -1,25 +1,17 @@
-from retriever.vectorstore import retriever_ 
 from langchain_core.tools import tool
-from langchain.agents import AgentExecutor, create_tool_calling_agent
 import requests
-import os
-import io
-import sys
-from contextlib import redirect_stdout
-from langchain_groq import ChatGroq
-from langchain_core.prompts import ChatPromptTemplate
 from dotenv import load_dotenv
-from langchain_tavily import TavilySearch
+from core.registry import get_node_llm, get_prompt, get_executor
+from core.fmp import get_client
+from core.compaction import project
+from core import analytics
+from core.concurrency import run_parallel, arun_parallel, limited
+from core.tools import with_coroutine, limited_tool
+from agents.capture import run_captured, arun_captured, record_log
 
 
 load_dotenv()
 
-FMP_API_KEY = os.getenv("FMP_API_KEY")
-TAVILY_API_KEY = os.getenv("TAVILY_API_KEY")
-
-websearch = TavilySearch()  
-llm = ChatGroq(model="gemma2-9b-it", temperature=0)
-
 
 @tool
 def get_company_profile(ticker: str):
@@ -29,13 +21,10 @@ def get_company_profile(ticker: str):
     gets general comany profile details
     input : ticker :str
     returns api response as text'''
-    url = f"https://financialmodelingprep.com/api/v3/profile/{ticker}?apikey={FMP_API_KEY}"
     try:
-        response = requests.get(url)
-        response.raise_for_status()
-        data = response.json()
+        data = get_client().get_json(f"profile/{ticker}")
         if data:
-            return data[0]
+            return project("profile", data[0])
         return {"error": "No data found for this ticker."}
     except requests.exceptions.RequestException as e:
         return {"error": f"API request failed: {e}"}
@@ -46,67 +35,84 @@ def get_annual_financial_statements(ticker: str):
     '''
     name:get_annual_financial_statements
     this function should only be used if proper and surely ticker is available for the company
-    gets annual financial statements of company 
+    gets annual financial statements of company: the latest year plus computed multi-year
+    growth rates and margins (use these numbers, don't recompute them)
     input : ticker :str
     return api response as text'''
-    url = f"https://financialmodelingprep.com/api/v3/income-statement/{ticker}?period=annual&limit=5&apikey={FMP_API_KEY}"
     try:
-        response = requests.get(url)
-        response.raise_for_status()
-        data = response.json()
+        data = get_client().get_json(f"income-statement/{ticker}", period="annual", limit=analytics.HISTORY_YEARS)
         if data:
-            return data[0]
+            tables = analytics.ticker_tables(analytics.compute({"income": {ticker: data}}), ticker)
+            return {"latest": project("income-statement", data[0]), **tables}
         return {"error": "No financial statements found for this ticker."}
     except requests.exceptions.RequestException as e:
         return {"error": f"API request failed: {e}"}
     
 
-agent_logs = []
-
 def capture_agent_output(callable_fn, *args, **kwargs):
-    buffer = io.StringIO()
-    try:
-        with redirect_stdout(buffer):
-            result = callable_fn(*args, **kwargs)
-        output = buffer.getvalue()
-        agent_logs.append(output)
-        return result
-    except Exception as e:
-        error_msg = f"[ERROR] {str(e)}"
-        agent_logs.append(error_msg)
-        return {"error": error_msg}
-
+    '''returns (result, logs) where logs holds this call's truncated transcript'''
+    result, output = run_captured(callable_fn, *args, **kwargs)
+    return result, [record_log(output)]
 
-@tool
-def fin_agent(query):
-    '''
-    name:fin_analysis_r_agent
-    input: str query
-    output: financial details of the company'''
 
-    prompt = ChatPromptTemplate.from_messages([
+def build_executor():
+    llm = get_node_llm("agent", temperature=0)
+    prompt = get_prompt("fin_agent", [
         ("system", "you are a help ful finance assistant, if you are sure then use ticker name of the company to query, else just return empty, donot give false information taking the wrong ticker name."),
         ("user", "{input}"),
         ("placeholder", "{agent_scratchpad}")
     ])
-    prompt_web = ChatPromptTemplate.from_messages([
-        ("system", "you are a help ful finance assistant use tavilysearch tool for getting company details donot use any other tools"),
-        ("user", "{input}"),
-        ("placeholder", "{agent_scratchpad}")
-    ])
 
     tools = [
         # tool(retriever_),
-        get_annual_financial_statements,
-        get_company_profile
+        limited_tool(get_annual_financial_statements, "fmp"),
+        limited_tool(get_company_profile, "fmp")
     ]
-    tools_web = [websearch]
 
-    agent = create_tool_calling_agent(llm, tools, prompt)
-    agent_exec = AgentExecutor(agent=agent, tools=tools, verbose=True)
+    return get_executor("fin_agent", llm, tools, prompt)
 
-    web_Agent = create_tool_calling_agent(llm, tools_web, prompt_web)
-    agent_exec_web = AgentExecutor(agent=web_Agent, tools=tools_web, verbose=True)
 
-    response = capture_agent_output(agent_exec.invoke, {'input': query})
-    return agent_logs
\ No newline at end of file
+@tool
+def fin_agent(query):
+    '''
+    name:fin_analysis_r_agent
+    input: str query
+    output: financial details of the company'''
+
+    agent_exec = build_executor()
+
+    response, logs = capture_agent_output(agent_exec.invoke, {'input': query})
+    return logs
+
+
+async def afin_agent(query):
+    agent_exec = build_executor()
+
+    response, output = await arun_captured(agent_exec.ainvoke, {'input': query})
+    return [record_log(output)]
+
+
+fin_agent = with_coroutine(fin_agent, afin_agent)
+
+
+def gather(ticker, query):
+    '''
+    fin_analysis data fetched directly, no agent loop: company profile and annual statements
+    '''
+    if not ticker:
+        return {}
+    profile, statements = run_parallel([
+        lambda: get_company_profile.invoke({"ticker": ticker}),
+        lambda: get_annual_financial_statements.invoke({"ticker": ticker}),
+    ])
+    return {"profile": profile, "annual_financial_statements": statements}
+
+
+async def agather(ticker, query):
+    if not ticker:
+        return {}
+    profile, statements = await arun_parallel([
+        limited("fmp", get_company_profile.ainvoke({"ticker": ticker})),
+        limited("fmp", get_annual_financial_statements.ainvoke({"ticker": ticker})),
+    ])
+    return {"profile": profile, "annual_financial_statements": statements}
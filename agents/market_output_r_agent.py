@@ -1,26 +1,18 @@
-from retriever.vectorstore import retriever_
 from langchain_core.tools import tool
-from langchain.agents import AgentExecutor, create_tool_calling_agent
 import requests
-import os
-import io
-from contextlib import redirect_stdout
-from langchain_groq import ChatGroq
-from langchain_core.prompts import ChatPromptTemplate
-from langchain_tavily import TavilySearch
 from dotenv import load_dotenv
+from core.registry import get_node_llm, get_prompt, get_executor
+from core.fmp import get_client
+from core.compaction import project, dedupe_news
+from core.concurrency import run_parallel, arun_parallel, limited
+from core.tools import with_coroutine, limited_tool, get_shared_websearch, web_search, aweb_search
+from core.request_scope import web_query
+from agents.capture import run_captured, arun_captured, record_log
 
 
 
 load_dotenv()
 
-FMP_API_KEY = os.getenv("FMP_API_KEY")
-
-
-
-
-llm = ChatGroq(model="gemma2-9b-it", temperature=0)
-websearch = TavilySearch()
 
 @tool
 def get_market_movers():
@@ -30,16 +22,14 @@ def get_market_movers():
     no input required
     returns a dictionary of top 5 gainers and losers
     '''
-    url_gainers = f"https://financialmodelingprep.com/api/v3/stock_market/gainers?apikey={FMP_API_KEY}"
-    url_losers = f"https://financialmodelingprep.com/api/v3/stock_market/losers?apikey={FMP_API_KEY}"
     try:
-        gainers = requests.get(url_gainers)
-        losers = requests.get(url_losers)
-        gainers.raise_for_status()
-        losers.raise_for_status()
+        gainers, losers = run_parallel([
+            lambda: get_client().get_json("stock_market/gainers"),
+            lambda: get_client().get_json("stock_market/losers"),
+        ])
         return {
-            "top_gainers": gainers.json()[:5],
-            "top_losers": losers.json()[:5]
+            "top_gainers": project("movers", gainers[:5]),
+            "top_losers": project("movers", losers[:5])
         }
     except requests.exceptions.RequestException as e:
         return {"error": f"API request failed: {e}"}
@@ -52,42 +42,18 @@ def get_stock_news(ticker: str, limit: int = 5):
     input: ticker (str), limit (int)
     return: list of news articles
     '''
-    url = f"https://financialmodelingprep.com/api/v3/stock_news?tickers={ticker}&limit={limit}&apikey={FMP_API_KEY}"
     try:
-        response = requests.get(url)
-        response.raise_for_status()
-        return response.json()
+        return dedupe_news(get_client().get_json("stock_news", tickers=ticker, limit=limit))
     except requests.exceptions.RequestException as e:
         return {"error": f"API request failed: {e}"}
     
 
 
-agent_logs = []
-
-def capture_agent_output(callable_fn, *args, **kwargs):
-    buffer = io.StringIO()
-    try:
-        with redirect_stdout(buffer):
-            result = callable_fn(*args, **kwargs)
-        output = buffer.getvalue()
-        agent_logs.append(output)
-        return result
-    except Exception as e:
-        error_msg = f"[ERROR] {str(e)}"
-        agent_logs.append(error_msg)
-        return {"error": error_msg}
-    
-
+def build_executors():
+    llm = get_node_llm("agent", temperature=0)
+    websearch = get_shared_websearch()
 
-@tool
-def result(query: str):
-    '''
-    name: market_analysis_r_agent
-    main function for querying stock market data and company news
-    input: query (str)
-    output: captured logs and agent response
-    '''
-    prompt = ChatPromptTemplate.from_messages([
+    prompt = get_prompt("market_agent", [
         ("system",
          "you are being used as an info gatherer, You have access to tools to find a company's market-output data. "
          "You can infer company ticker symbols from their names (e.g., 'apple' means 'AAPL'). "
@@ -97,23 +63,68 @@ def result(query: str):
         ("placeholder", "{agent_scratchpad}"),
     ])
 
-    prompt_web = ChatPromptTemplate.from_messages([
+    prompt_web = get_prompt("market_agent_web", [
         ("system", "use tavilysearch tool to gather information about the company if mentioned name, in 10-20 phrases"),
         ("human", "{input}"),
         ("placeholder", "{agent_scratchpad}"),
     ])
 
-    tools = [get_market_movers, get_stock_news]
-    agent = create_tool_calling_agent(llm, tools, prompt)
-    agent_exec = AgentExecutor(agent=agent, tools=tools, verbose=True)
-    
+    tools = [limited_tool(get_market_movers, "fmp"), limited_tool(get_stock_news, "fmp")]
+    agent_exec = get_executor("market_agent", llm, tools, prompt)
+    agent_exec_w = get_executor("market_agent_web", llm, [websearch], prompt_web)
+    return agent_exec, agent_exec_w
+
+
+@tool
+def result(query: str):
+    '''
+    name: market_analysis_r_agent
+    main function for querying stock market data and company news
+    input: query (str)
+    output: captured logs and agent response
+    '''
+    agent_exec, agent_exec_w = build_executors()
+
+    # the tool agent and the web agent don't depend on each other
+    (response, log), (response_web, log_web) = run_parallel([
+        lambda: run_captured(agent_exec.invoke, {'input': query}),
+        lambda: run_captured(agent_exec_w.invoke, {'input': query}),
+    ])
+    return [record_log(log), record_log(log_web)]
+
+
+async def aresult(query: str):
+    agent_exec, agent_exec_w = build_executors()
+
+    (response, log), (response_web, log_web) = await arun_parallel([
+        arun_captured(agent_exec.ainvoke, {'input': query}),
+        arun_captured(agent_exec_w.ainvoke, {'input': query}),
+    ])
+    return [record_log(log), record_log(log_web)]
+
+
+result = with_coroutine(result, aresult, name="market_agent")
+
+
+def gather(ticker, query):
+    '''
+    market_output data fetched directly, no agent loop: market movers, the ticker's news and a web search
+    '''
+    calls = [
+        lambda: get_market_movers.invoke({}),
+        lambda: get_stock_news.invoke({"ticker": ticker}) if ticker else [],
+        lambda: web_search(web_query(query)),
+    ]
+    movers, news, web = run_parallel(calls)
+    return {"market_movers": movers, "stock_news": news, "web_search": web}
+
 
-    agent_web = create_tool_calling_agent(llm, tools=[websearch], prompt=prompt_web)
-    agent_exec_w = AgentExecutor(agent=agent_web, tools=[websearch], verbose=True)
+async def agather(ticker, query):
+    async def news():
+        return await limited("fmp", get_stock_news.ainvoke({"ticker": ticker})) if ticker else []
 
-    response = capture_agent_output(agent_exec.invoke, {'input': query})
-    response_web = capture_agent_output(agent_exec_w.invoke, {'input': query})
-    return agent_logs
+    movers, news, web = await arun_parallel([limited("fmp", get_market_movers.ainvoke({})), news(), aweb_search(web_query(query))])
+    return {"market_movers": movers, "stock_news": news, "web_search": web}
 
 
-# print(result('what is for google.'))
\ No newline at end of file
+# print(result('what is for google.'))
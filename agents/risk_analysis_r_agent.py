@@ -1,38 +1,33 @@
-import os
-import io
 import requests
-from contextlib import redirect_stdout
 from dotenv import load_dotenv
 
-from retriever.vectorstore import retriever_
 from langchain_core.tools import tool
-from langchain_groq import ChatGroq
-from langchain_core.prompts import ChatPromptTemplate
-from langchain.agents import AgentExecutor, create_tool_calling_agent
-from langchain_tavily import TavilySearch
+from core.registry import get_node_llm, get_prompt, get_executor
+from core.fmp import get_client
+from core.compaction import project
+from core import analytics
+from core.concurrency import run_parallel, arun_parallel, limited
+from core.tools import with_coroutine, limited_tool, get_shared_websearch, web_search, aweb_search
+from core.request_scope import web_query
+from agents.capture import run_captured, arun_captured, record_log
 
 load_dotenv()
 
-FMP_API_KEY = os.getenv("FMP_API_KEY")
-
-
-
-
-llm = ChatGroq(model="gemma2-9b-it", temperature=0)
-websearch = TavilySearch()
 
 @tool
 def get_financial_ratios(ticker: str):
     """
     Use this to get key financial ratios for a company. It includes crucial risk metrics
-    like debt-to-equity, current ratio (liquidity), and return on equity (profitability).
+    like debt-to-equity, current ratio (liquidity), and return on equity (profitability),
+    plus computed multi-year trends, z-scores and risk flags (use these, don't recompute them).
     """
-    url = f"https://financialmodelingprep.com/api/v3/ratios/{ticker}?limit=1&apikey={FMP_API_KEY}"
     try:
-        response = requests.get(url)
-        response.raise_for_status()
-        data = response.json()
-        return data[0] if data else {"error": "No ratio data found."}
+        data = get_client().get_json(f"ratios/{ticker}", limit=analytics.HISTORY_YEARS)
+        if not data:
+            return {"error": "No ratio data found."}
+        rating = analytics.fetch_records("rating", ticker)
+        result = analytics.compute({"ratios": {ticker: data}, "rating": {ticker: rating}})
+        return {"latest": project("ratios", data[0]), **analytics.ticker_tables(result, ticker)}
     except requests.exceptions.RequestException as e:
         return {"error": f"API request failed: {e}"}
 
@@ -42,40 +37,20 @@ def get_company_rating(ticker: str):
     Use this to get the analyst rating and recommendation for a stock (e.g., strong buy, hold, sell).
     This is a direct measure of market sentiment and perceived risk.
     """
-    url = f"https://financialmodelingprep.com/api/v3/rating/{ticker}?apikey={FMP_API_KEY}"
     try:
-        response = requests.get(url)
-        response.raise_for_status()
-        data = response.json()
-        return data[0] if data else {"error": "No rating data found."}
+        data = get_client().get_json(f"rating/{ticker}")
+        return project("rating", data[0]) if data else {"error": "No rating data found."}
     except requests.exceptions.RequestException as e:
         return {"error": f"API request failed: {e}"}
     
 
-agent_logs = []
 
-def capture_agent_output(callable_fn, *args, **kwargs):
-    buffer = io.StringIO()
-    try:
-        with redirect_stdout(buffer):
-            result = callable_fn(*args, **kwargs)
-        output = buffer.getvalue()
-        agent_logs.append(output)
-        return result
-    except Exception as e:
-        error_msg = f"[ERROR] {str(e)}"
-        agent_logs.append(error_msg)
-        return {"error": error_msg}
+def build_executors():
+    llm = get_node_llm("agent", temperature=0)
+    websearch = get_shared_websearch()
 
-@tool
-def result(query: str):
-    """
-    name : riskanalysis_r_agent
-    Main function to analyze company risk using financial tools and also gather web info.
-    Logs are captured in global `agent_logs` list.
-    """
     # Main analysis agent
-    prompt = ChatPromptTemplate.from_messages([
+    prompt = get_prompt("risk_agent", [
         ("system", 
          "you are being used as a risk analyser for companies. You have access to tools to find a company's rating and other data. "
          "You can infer company ticker symbols from their names (e.g., 'apple' means 'AAPL'). "
@@ -85,23 +60,69 @@ def result(query: str):
         ("placeholder", "{agent_scratchpad}"),
     ])
 
-    prompt_web = ChatPromptTemplate.from_messages([
+    prompt_web = get_prompt("risk_agent_web", [
         ("system", 
          "use tavilysearch tool to gather information about the company if mentioned name, in 10-20 phrases."),
         ("human", "{input}"),
         ("placeholder", "{agent_scratchpad}"),
     ])
 
-    tools = [get_company_rating, get_financial_ratios]
-    agent = create_tool_calling_agent(llm, tools, prompt)
-    agent_exec = AgentExecutor(agent=agent, tools=tools, verbose=True)
+    tools = [limited_tool(get_company_rating, "fmp"), limited_tool(get_financial_ratios, "fmp")]
+    agent_exec = get_executor("risk_agent", llm, tools, prompt)
 
     # web_agnet
-    agent_web = create_tool_calling_agent(llm, tools=[websearch], prompt=prompt_web)
-    agent_exec_w = AgentExecutor(agent=agent_web, tools=[websearch], verbose=True)
+    agent_exec_w = get_executor("risk_agent_web", llm, [websearch], prompt_web)
+    return agent_exec, agent_exec_w
 
-    capture_agent_output(agent_exec.invoke, {'input': query})
-    capture_agent_output(agent_exec_w.invoke, {'input': query})
-    
-    return agent_logs
 
+@tool
+def result(query: str):
+    """
+    name : riskanalysis_r_agent
+    Main function to analyze company risk using financial tools and also gather web info.
+    Returns the captured logs of this call only.
+    """
+    agent_exec, agent_exec_w = build_executors()
+
+    (_, log), (_, log_web) = run_parallel([
+        lambda: run_captured(agent_exec.invoke, {'input': query}),
+        lambda: run_captured(agent_exec_w.invoke, {'input': query}),
+    ])
+    return [record_log(log), record_log(log_web)]
+
+
+async def aresult(query: str):
+    agent_exec, agent_exec_w = build_executors()
+
+    (_, log), (_, log_web) = await arun_parallel([
+        arun_captured(agent_exec.ainvoke, {'input': query}),
+        arun_captured(agent_exec_w.ainvoke, {'input': query}),
+    ])
+    return [record_log(log), record_log(log_web)]
+
+
+result = with_coroutine(result, aresult, name="risk_agent")
+
+
+def gather(ticker, query):
+    '''
+    risk_analysis data fetched directly, no agent loop: ratios, analyst rating and a web search
+    '''
+    calls = [
+        lambda: get_financial_ratios.invoke({"ticker": ticker}) if ticker else {},
+        lambda: get_company_rating.invoke({"ticker": ticker}) if ticker else {},
+        lambda: web_search(web_query(query)),
+    ]
+    ratios, rating, web = run_parallel(calls)
+    return {"financial_ratios": ratios, "rating": rating, "web_search": web}
+
+
+async def agather(ticker, query):
+    async def ratios():
+        return await limited("fmp", get_financial_ratios.ainvoke({"ticker": ticker})) if ticker else {}
+
+    async def rating():
+        return await limited("fmp", get_company_rating.ainvoke({"ticker": ticker})) if ticker else {}
+
+    ratios, rating, web = await arun_parallel([ratios(), rating(), aweb_search(web_query(query))])
+    return {"financial_ratios": ratios, "rating": rating, "web_search": web}
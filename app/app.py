@@ -1,5 +1,80 @@
-from graphs.evalulator import final_result
+import argparse
 
-query = str(input("enter your query"))
+import graphs
 
-print(final_result(query))
+
+def print_stream(events):
+    """Prints report events as they arrive: plan, live section text, verdicts, final report."""
+    streaming = None
+    for event in events:
+        kind = event["type"]
+        if kind == "plan":
+            print("Plan:", ", ".join(s["name"] for s in event["sections"]), flush=True)
+        elif kind == "token":
+            if streaming != event["section"]:
+                streaming = event["section"]
+                print(f"\n[{streaming}] ", end="", flush=True)
+            print(event["text"], end="", flush=True)
+        elif kind == "section":
+            streaming = None
+            print(f"\n\n{event['markdown']}\n", flush=True)
+        elif kind == "verdict":
+            print(f"Evaluation (attempt {event['iteration']}): {event['grade']}", flush=True)
+            for name, grade in event["sections"].items():
+                print(f"  {name}: {grade['grade']} ({grade['score']}/10) {grade['feedback']}", flush=True)
+        elif kind == "result":
+            print("\n" + event["report"], flush=True)
+        elif kind == "metrics":
+            for s in event["metrics"]["spans"]:
+                print(f"  {s['kind']} {s['name']}: {s['count']}x p50 {s['p50']:.2f}s p95 {s['p95']:.2f}s", flush=True)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="FinsightAI")
+    parser.add_argument("--batch", help="watchlist file, one ticker or query per line")
+    parser.add_argument("--out", default="batch_results.jsonl", help="JSONL output, also the resume checkpoint")
+    parser.add_argument("--concurrency", type=int, default=None, help="analyses in flight at once")
+    parser.add_argument("--metrics-port", type=int, default=None, help="serve /metrics (prometheus) and /metrics.json on this port")
+    parser.add_argument("--metrics-out", default=None, help="write the run's latency/cost summary as JSON when done")
+    parser.add_argument("--serve", type=int, default=None, metavar="PORT", help="run the HTTP service (app/server.py) on this port")
+    args = parser.parse_args()
+
+    if args.serve:
+        from app.server import serve
+        serve(port=args.serve)
+        return
+
+    if args.metrics_port:
+        from core.metrics import serve_metrics
+        serve_metrics(args.metrics_port)
+
+    try:
+        run(args)
+    finally:
+        if args.metrics_out:
+            from core.metrics import write_metrics
+            write_metrics(args.metrics_out)
+
+
+def run(args):
+    # index the user's document while the first query is typed/planned, not inside the tool call
+    from retriever.ingest import start_ingest
+    start_ingest()
+    # keeps the watchlist (PREFETCH_WATCHLIST) warm and picks up documents added later
+    from core.prefetch import start_prefetch
+    start_prefetch()
+
+    if args.batch:
+        from graphs.batch import run_batch, BATCH_CONCURRENCY
+        with open(args.batch, encoding="utf-8") as f:
+            summary = run_batch(f.readlines(), args.out, concurrency=args.concurrency or BATCH_CONCURRENCY)
+        print(summary)
+        return
+
+    query = str(input("enter your query"))
+
+    print_stream(graphs.stream_final_result(query))
+
+
+if __name__ == "__main__":
+    main()
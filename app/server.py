@@ -0,0 +1,140 @@
+'''
+HTTP service around the generator/evaluator pipeline, for serving many users from one process.
+
+    python -m app.server --port 8000
+    curl -XPOST localhost:8000/analyze -H 'X-Client-Id: alice' -d '{"query": "risk analysis of Tesla"}'
+
+requests run on the event loop through aanalyze(). at most SERVER_MAX_RUNNING run at once, up to
+SERVER_MAX_QUEUED more wait, and one client (X-Client-Id header, else its address) holds at most
+SERVER_MAX_PER_CLIENT of them; past that the answer is 429 with a Retry-After estimate. every
+request has a deadline (REQUEST_TIMEOUT, or a shorter "timeout" in the body) covering queueing and
+the run; when it passes the graph run is cancelled and the answer is 504. calls to Groq, Tavily
+and FMP made for a request count against both the global and that client's provider limits.
+
+limits are per process, run a single uvicorn worker per deployment unit.
+'''
+import argparse
+import asyncio
+import os
+import time
+import traceback
+import uuid
+from contextlib import asynccontextmanager
+from typing import Optional
+
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse, PlainTextResponse
+from pydantic import BaseModel, Field
+
+from core.concurrency import AdmissionControl, Overloaded, set_client, reset_client
+from core.metrics import incr, run_metrics, to_prometheus
+
+SERVER_MAX_RUNNING = int(os.getenv("SERVER_MAX_RUNNING", "4"))
+SERVER_MAX_QUEUED = int(os.getenv("SERVER_MAX_QUEUED", "16"))
+SERVER_MAX_PER_CLIENT = int(os.getenv("SERVER_MAX_PER_CLIENT", "2"))
+REQUEST_TIMEOUT = float(os.getenv("REQUEST_TIMEOUT", "180"))
+
+admission = AdmissionControl(SERVER_MAX_RUNNING, SERVER_MAX_QUEUED, SERVER_MAX_PER_CLIENT, default_seconds=REQUEST_TIMEOUT / 4)
+
+
+class AnalyzeRequest(BaseModel):
+    query: str = Field(min_length=1)
+    timeout: Optional[float] = Field(default=None, gt=0, description="seconds, capped at REQUEST_TIMEOUT")
+
+
+@asynccontextmanager
+async def lifespan(app):
+    # index the corpus while the first requests come in, not inside the first retriever call
+    from retriever.ingest import start_ingest
+    start_ingest()
+    from core.prefetch import start_prefetch
+    prefetcher = start_prefetch()
+    yield
+    prefetcher.stop()
+
+
+app = FastAPI(title="FinsightAI", lifespan=lifespan)
+
+
+def client_id(request: Request):
+    return request.headers.get("x-client-id") or (request.client.host if request.client else "anonymous")
+
+
+def error(status, code, **fields):
+    return JSONResponse(status_code=status, content={"error": code, **fields})
+
+
+@app.post("/analyze")
+async def analyze(body: AnalyzeRequest, request: Request):
+    from graphs.evalulator import aanalyze
+
+    client = client_id(request)
+    request_id = uuid.uuid4().hex
+    timeout = min(body.timeout or REQUEST_TIMEOUT, REQUEST_TIMEOUT)
+    received = time.monotonic()
+    waited = {}
+
+    async def run():
+        async with admission.admit(client):
+            waited["queued_s"] = time.monotonic() - received
+            token = set_client(client)
+            try:
+                return await aanalyze(body.query)
+            finally:
+                reset_client(token)
+
+    try:
+        result = await asyncio.wait_for(run(), timeout)
+    except Overloaded as e:
+        incr("server_rejected", reason=e.reason)
+        response = error(429, "overloaded", reason=e.reason, retry_after=e.retry_after, request_id=request_id)
+        response.headers["Retry-After"] = str(e.retry_after)
+        return response
+    except asyncio.TimeoutError:
+        # wait_for has cancelled the graph run (or the wait for a slot) by now
+        incr("server_timeouts")
+        return error(504, "deadline_exceeded", timeout=timeout, request_id=request_id)
+    except Exception as e:
+        # the details stay in the log, clients get the request id to quote
+        incr("server_errors")
+        print(f"---REQUEST {request_id} FAILED: {e!r}---", flush=True)
+        traceback.print_exc()
+        return error(500, "internal", request_id=request_id)
+
+    return {
+        "request_id": request_id,
+        "client": client,
+        "queued_s": round(waited.get("queued_s", 0.0), 3),
+        "elapsed_s": round(time.monotonic() - received, 3),
+        **result,
+    }
+
+
+@app.get("/health")
+async def health():
+    from core.prefetch import current_prefetcher
+    prefetcher = current_prefetcher()
+    return {"status": "ok", **admission.stats(), "prefetch": dict(prefetcher.stats) if prefetcher else None}
+
+
+@app.get("/metrics")
+async def metrics():
+    return PlainTextResponse(to_prometheus(), media_type="text/plain; version=0.0.4")
+
+
+@app.get("/metrics.json")
+async def metrics_json():
+    return run_metrics.summary()
+
+
+def serve(host="127.0.0.1", port=8000):
+    import uvicorn
+    uvicorn.run(app, host=host, port=port, workers=1)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="FinsightAI HTTP service")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8000)
+    args = parser.parse_args()
+    serve(args.host, args.port)
@@ -0,0 +1,143 @@
+'''
+offline stand-ins for the three remote services, replaying the recorded responses in bench/fixtures:
+
+- FixtureServer (bench/fixture_server.py): local HTTP server answering FMP paths (point FMP_BASE_URL at it)
+- FakeChatModel: ChatGroq replacement; plans, picks tools, grades and writes sections from llm.json
+- FakeWebSearch: TavilySearch replacement returning tavily.json
+
+each one sleeps `latency` seconds per call so the suite can model slow upstreams.
+'''
+import asyncio
+import json
+import re
+import time
+import uuid
+
+from langchain_core.language_models.chat_models import BaseChatModel
+from langchain_core.messages import AIMessage, HumanMessage, ToolMessage
+from langchain_core.outputs import ChatGeneration, ChatResult
+from langchain_core.tools import BaseTool
+from langchain_core.utils.function_calling import convert_to_openai_tool
+from pydantic import BaseModel
+
+from bench.fixture_server import FixtureServer, RECORDED_SYMBOL, load_fixture
+
+
+def mentioned_ticker(text):
+    from core.tickers import resolve_ticker
+    return resolve_ticker(text) or RECORDED_SYMBOL
+
+
+def tool_args(tool, text):
+    '''fills a tool's required parameters from the request text: tickers get the resolved symbol, anything else the text'''
+    parameters = tool["function"].get("parameters", {})
+    required = parameters.get("required", list(parameters.get("properties", {})))
+    return {name: mentioned_ticker(text) if name == "ticker" else text for name in required}
+
+
+class FakeChatModel(BaseChatModel):
+    '''
+    deterministic chat model replaying llm.json. structured output requests (Sections, Feedback)
+    get the recorded plan/verdict, tool-bound calls first call the tools named in the request
+    (all of them when none is named) and then answer, plain calls get the recorded section text.
+    '''
+
+    latency: float = 0.0
+    responses: dict = {}
+    calls: int = 0
+
+    @property
+    def _llm_type(self):
+        return "fake-chat"
+
+    def bind_tools(self, tools, tool_choice=None, **kwargs):
+        return self.bind(tools=[convert_to_openai_tool(t) for t in tools], **kwargs)
+
+    def respond(self, messages, tools):
+        self.calls += 1
+        text = "\n".join(str(m.content) for m in messages if isinstance(m, HumanMessage))
+        names = [t["function"]["name"] for t in tools or []]
+        answered = any(isinstance(m, ToolMessage) for m in messages)
+
+        if "Sections" in names:
+            return self.tool_call("Sections", {"sections": [
+                {"name": s["name"], "description": s["description"].replace(RECORDED_SYMBOL, mentioned_ticker(text))}
+                for s in self.responses["sections"]
+            ]})
+        if "Feedback" in names:
+            return self.tool_call("Feedback", self.responses["feedback"])
+        if tools and not answered:
+            chosen = [t for t in tools if t["function"]["name"] in text] or tools
+            return AIMessage(content="", tool_calls=[
+                {"name": t["function"]["name"], "args": tool_args(t, text), "id": uuid.uuid4().hex}
+                for t in chosen
+            ])
+        summary = next(
+            (body for name, body in self.responses["summaries"].items() if name in text),
+            self.responses["default"],
+        )
+        return self.with_usage(AIMessage(content=summary), messages)
+
+    def tool_call(self, name, args):
+        return AIMessage(content="", tool_calls=[{"name": name, "args": args, "id": uuid.uuid4().hex}])
+
+    def with_usage(self, message, messages):
+        tokens_in = sum(len(re.findall(r"\w+", str(m.content))) for m in messages)
+        tokens_out = len(re.findall(r"\w+", message.content))
+        message.usage_metadata = {"input_tokens": tokens_in, "output_tokens": tokens_out, "total_tokens": tokens_in + tokens_out}
+        return message
+
+    def _generate(self, messages, stop=None, run_manager=None, **kwargs):
+        time.sleep(self.latency)
+        return ChatResult(generations=[ChatGeneration(message=self.respond(messages, kwargs.get("tools")))])
+
+    async def _agenerate(self, messages, stop=None, run_manager=None, **kwargs):
+        await asyncio.sleep(self.latency)
+        return ChatResult(generations=[ChatGeneration(message=self.respond(messages, kwargs.get("tools")))])
+
+
+class WebSearchInput(BaseModel):
+    query: str
+
+
+class FakeWebSearch(BaseTool):
+    name: str = "tavily_search"
+    description: str = "Web search returning recorded results."
+    args_schema: type = WebSearchInput
+    latency: float = 0.0
+    response: dict = {}
+    calls: int = 0
+    bytes_returned: int = 0
+
+    def search(self, query):
+        response = {**self.response, "query": query}
+        self.calls += 1
+        self.bytes_returned += len(json.dumps(response))
+        return response
+
+    def _run(self, query, **kwargs):
+        time.sleep(self.latency)
+        return self.search(query)
+
+    async def _arun(self, query, **kwargs):
+        await asyncio.sleep(self.latency)
+        return self.search(query)
+
+
+def install(llm_latency=0.0, search_latency=0.0):
+    '''
+    seeds the registry with the fakes (plus deterministic embeddings) before anything builds the real clients.
+    returns (llm, websearch).
+    '''
+    from langchain_core.embeddings import DeterministicFakeEmbedding
+    from core.registry import registry, NODES, EMBEDDING_MODEL, node_models
+
+    llm = FakeChatModel(latency=llm_latency, responses=load_fixture("llm.json"))
+    search = FakeWebSearch(latency=search_latency, response=load_fixture("tavily.json"))
+    # every model a node is configured with (MODEL_<NODE>) is answered by the same fake
+    for model in {m for node in NODES for m in node_models(node)}:
+        for temperature in (None, 0):
+            registry.get_or_create(("llm", model, temperature), lambda: llm)
+    registry.get_or_create(("websearch",), lambda: search)
+    registry.get_or_create(("embeddings", EMBEDDING_MODEL), lambda: DeterministicFakeEmbedding(size=384))
+    return llm, search
@@ -0,0 +1,116 @@
+'''
+FixtureServer: local HTTP server answering FMP paths from the recorded bench/fixtures/fmp.json
+(point FMP_BASE_URL at it). kept apart from the langchain fakes in bench/fakes.py so the suite's
+parent process and the FMP/cache tests run without langchain.
+'''
+import json
+import os
+import threading
+import time
+from collections import deque
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlparse, parse_qs
+
+FIXTURES_DIR = os.path.join(os.path.dirname(__file__), "fixtures")
+RECORDED_SYMBOL = "AAPL"
+
+
+def load_fixture(name):
+    with open(os.path.join(FIXTURES_DIR, name), encoding="utf-8") as f:
+        return json.load(f)
+
+
+def retarget(data, symbol):
+    '''the recorded AAPL payload relabelled for another symbol, so any watchlist can be replayed'''
+    if symbol == RECORDED_SYMBOL:
+        return data
+    return json.loads(json.dumps(data).replace(f'"{RECORDED_SYMBOL}"', f'"{symbol}"'))
+
+
+class FixtureServer:
+    '''
+    serves fmp.json over HTTP on localhost. paths are looked up with the symbol swapped for the
+    recorded one; comma separated symbols get one record each. counts requests and bytes sent.
+    fail_next() makes the next requests answer with error statuses, e.g. to exercise retries.
+    '''
+
+    def __init__(self, latency=0.0, port=0):
+        self.latency = latency
+        self.fixtures = load_fixture("fmp.json")
+        self.requests = 0
+        self.bytes_sent = 0
+        self.failures = deque()
+        self._lock = threading.Lock()
+        self.server = ThreadingHTTPServer(("127.0.0.1", port), self._handler())
+        self.server.daemon_threads = True
+
+    @property
+    def base_url(self):
+        return f"http://127.0.0.1:{self.server.server_address[1]}/api/v3"
+
+    def response(self, path, params):
+        if path == "stock_news":
+            symbols = (params.get("tickers") or [RECORDED_SYMBOL])[0].split(",")
+            return [item for s in symbols for item in retarget(self.fixtures["stock_news"], s)]
+        if path in self.fixtures:
+            return self.fixtures[path]
+        endpoint, _, symbols = path.rpartition("/")
+        records = []
+        for symbol in symbols.split(","):
+            records.extend(retarget(self.fixtures.get(f"{endpoint}/{RECORDED_SYMBOL}", []), symbol))
+        return records
+
+    def fail_next(self, *statuses, retry_after=None):
+        '''answers the next len(statuses) requests with these statuses, with a Retry-After header when given'''
+        with self._lock:
+            self.failures.extend((status, retry_after) for status in statuses)
+
+    def _handler(self):
+        fixture_server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def do_GET(self):
+                url = urlparse(self.path)
+                path = url.path.split("/api/v3/", 1)[-1].strip("/")
+                with fixture_server._lock:
+                    status, retry_after = fixture_server.failures.popleft() if fixture_server.failures else (200, None)
+                if status == 200:
+                    body = json.dumps(fixture_server.response(path, parse_qs(url.query))).encode()
+                else:
+                    body = json.dumps({"Error Message": f"status {status}"}).encode()
+                # counted before the body is written: a client that has read the response sees the count
+                with fixture_server._lock:
+                    fixture_server.requests += 1
+                    fixture_server.bytes_sent += len(body)
+                time.sleep(fixture_server.latency)
+                self.send_response(status)
+                if retry_after is not None:
+                    self.send_header("Retry-After", str(retry_after))
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                pass
+
+        return Handler
+
+    def reset(self):
+        with self._lock:
+            self.requests = 0
+            self.bytes_sent = 0
+            self.failures.clear()
+
+    def stats(self):
+        with self._lock:
+            return {"fmp_requests": self.requests, "fmp_bytes": self.bytes_sent}
+
+    def start(self):
+        threading.Thread(target=self.server.serve_forever, name="fmp-fixtures", daemon=True).start()
+        return self
+
+    def stop(self):
+        self.server.shutdown()
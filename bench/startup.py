@@ -0,0 +1,86 @@
+'''
+cold start benchmark: time to import the entry point and get a compiled graph in a fresh interpreter.
+
+    python -m bench.startup --runs 5
+    python -m bench.startup --runs 5 --rev <git-rev>    # same measurement on another revision
+
+also lists which heavy dependencies ended up imported, lazily loaded stacks should not appear.
+'''
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+
+HEAVY_MODULES = [
+    "langchain_groq",
+    "langchain_tavily",
+    "langchain_huggingface",
+    "sentence_transformers",
+    "chromadb",
+    "langchain_community.vectorstores",
+    "agents.fin_analysis_r_agent",
+]
+
+PROBE = """
+import json, sys, time
+t0 = time.perf_counter()
+import graphs.evalulator as ev
+t1 = time.perf_counter()
+ev.optimizer_workflow
+t2 = time.perf_counter()
+print(json.dumps({
+    "import_s": t1 - t0,
+    "ready_s": t2 - t0,
+    "loaded": [m for m in %r if m in sys.modules],
+}))
+"""
+
+
+def run_once(cwd):
+    env = dict(os.environ)
+    env.setdefault("GROQ_API_KEY", "bench")
+    env.setdefault("TAVILY_API_KEY", "bench")
+    out = subprocess.run(
+        [sys.executable, "-c", PROBE % (HEAVY_MODULES,)],
+        cwd=cwd, env=env, capture_output=True, text=True, check=True,
+    )
+    return json.loads(out.stdout.strip().splitlines()[-1])
+
+
+def measure(cwd, runs):
+    samples = [run_once(cwd) for _ in range(runs)]
+    return {
+        "import_s_median": statistics.median(s["import_s"] for s in samples),
+        "ready_s_median": statistics.median(s["ready_s"] for s in samples),
+        "loaded": samples[-1]["loaded"],
+    }
+
+
+def checkout(rev):
+    path = tempfile.mkdtemp(prefix="startup-bench-")
+    subprocess.run(["git", "worktree", "add", "--detach", path, rev], check=True, capture_output=True)
+    return path
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--rev", help="also measure this git revision for comparison")
+    args = parser.parse_args()
+
+    results = {"current": measure(os.getcwd(), args.runs)}
+    if args.rev:
+        path = checkout(args.rev)
+        try:
+            results[args.rev] = measure(path, args.runs)
+        finally:
+            subprocess.run(["git", "worktree", "remove", "--force", path], capture_output=True)
+
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,204 @@
+'''
+offline benchmark: every workload runs in a fresh interpreter against recorded fixtures
+(bench/fakes.py), so results only move when the code does.
+
+    python -m bench.suite                                   # all workloads, compared to bench/baseline.json
+    python -m bench.suite --workloads orchestrate tools --llm-latency 0.3 --fmp-latency 0.05
+    python -m bench.suite --save-baseline                   # accept the current numbers
+
+reports wall time, LLM calls and tokens, evaluator LLM grades, FMP requests and bytes, web
+searches and peak RSS per workload. exits 1 when a workload regresses past the baseline (wall time and RSS beyond
+--tolerance, call/byte counts by any amount), and when there is no baseline to compare against.
+'''
+import argparse
+import asyncio
+import json
+import os
+import resource
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+
+BASELINE_PATH = os.path.join(os.path.dirname(__file__), "baseline.json")
+QUERY = "Give a financial, market and risk analysis of Apple"
+WATCHLIST = ["AAPL", "MSFT", "NVDA", "TSLA", "AMZN", "GOOGL"]
+WORKLOADS = ["orchestrate", "final_result", "tools", "retriever", "concurrent", "batch"]
+# compared against the baseline with --tolerance; the rest must not grow at all
+TIMED = {"wall_s", "peak_rss_mb"}
+
+
+def workload_orchestrate(args):
+    from graphs.orchestrator import orchestrate
+    orchestrate(QUERY)
+
+
+def workload_final_result(args):
+    from graphs.evalulator import final_result
+    final_result(QUERY)
+
+
+def workload_tools(args):
+    from agents.fin_analysis_r_agent import fin_agent
+    from agents.market_output_r_agent import result as market_agent
+    from agents.risk_analysis_r_agent import result as risk_agent
+    for agent_tool in (fin_agent, market_agent, risk_agent):
+        agent_tool.invoke({"query": QUERY})
+
+
+def workload_retriever(args):
+    from retriever.vectorstore import retriever_
+    shutil.copy(os.path.join(os.path.dirname(__file__), "fixtures", "file.txt"), "file.txt")
+    for question in ("what was free cash flow", "key risks", "capital expenditure plans"):
+        retriever_.invoke({"input": question})
+
+
+def workload_concurrent(args):
+    from graphs.evalulator import aanalyze
+    from graphs.batch import TICKER_QUERY
+
+    async def run():
+        queries = [TICKER_QUERY.format(ticker=t) for t in WATCHLIST[:args.concurrency]]
+        await asyncio.gather(*(aanalyze(q) for q in queries))
+    asyncio.run(run())
+
+
+def workload_batch(args):
+    from graphs.batch import run_batch
+    run_batch(WATCHLIST, os.path.join(os.getcwd(), "batch.jsonl"), concurrency=args.concurrency)
+
+
+def peak_rss_mb():
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # kilobytes on linux, bytes on macOS
+    return peak / (1024 * 1024) if sys.platform == "darwin" else peak / 1024
+
+
+def run_child(args):
+    '''runs one workload in this process (already pointed at the fixture server) and prints its numbers'''
+    from bench.fakes import install
+    from core.metrics import run_metrics
+
+    llm, search = install(args.llm_latency, args.search_latency)
+    started = time.perf_counter()
+    globals()[f"workload_{args.child}"](args)
+    wall = time.perf_counter() - started
+
+    summary = run_metrics.summary()
+    llm_spans = [s for s in summary["spans"] if s["kind"] == "llm"]
+    tokens = sum(c["value"] for c in summary["counters"] if c["name"] == "llm_tokens")
+    remote_grades = sum(
+        c["value"] for c in summary["counters"]
+        if c["name"] == "cascade_resolved" and c["labels"].get("node") == "evaluator" and c["labels"].get("tier") == "remote"
+    )
+    print(json.dumps({
+        "wall_s": round(wall, 3),
+        "llm_calls": sum(s["count"] for s in llm_spans),
+        "llm_tokens": tokens,
+        "remote_grades": remote_grades,
+        "web_searches": search.calls,
+        "web_bytes": search.bytes_returned,
+        "peak_rss_mb": round(peak_rss_mb(), 1),
+    }))
+
+
+def run_workload(name, args, server):
+    workdir = tempfile.mkdtemp(prefix=f"bench-{name}-")
+    root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    env = dict(os.environ)
+    env.update({
+        "PYTHONPATH": os.pathsep.join(filter(None, [root, env.get("PYTHONPATH")])),
+        "FMP_BASE_URL": server.base_url,
+        "FMP_API_KEY": "bench",
+        "GROQ_API_KEY": "bench",
+        "TAVILY_API_KEY": "bench",
+        "LANGCHAIN_TRACING_V2": "false",
+        "RETRIEVER_INDEX_DIR": os.path.join(workdir, ".retriever_index"),
+    })
+    env.pop("FMP_CACHE_PATH", None)
+    command = [
+        sys.executable, "-m", "bench.suite", "--child", name,
+        "--llm-latency", str(args.llm_latency), "--search-latency", str(args.search_latency),
+        "--concurrency", str(args.concurrency),
+    ]
+    server.reset()
+    try:
+        out = subprocess.run(command, cwd=workdir, env=env, capture_output=True, text=True)
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+    if out.returncode != 0:
+        raise RuntimeError(f"workload {name} failed:\n{out.stderr[-4000:]}")
+    result = json.loads(out.stdout.strip().splitlines()[-1])
+    result.update(server.stats())
+    return result
+
+
+def compare(results, baseline, tolerance):
+    '''list of "workload.metric: baseline -> current" lines for every regression'''
+    regressions = []
+    for name, current in results.items():
+        for metric, value in current.items():
+            before = baseline.get(name, {}).get(metric)
+            if before is None:
+                continue
+            limit = before * (1 + tolerance) if metric in TIMED else before
+            if value > limit:
+                regressions.append(f"{name}.{metric}: {before} -> {value}")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--workloads", nargs="+", choices=WORKLOADS, default=WORKLOADS)
+    parser.add_argument("--llm-latency", type=float, default=0.2, help="seconds per fake LLM call")
+    parser.add_argument("--search-latency", type=float, default=0.3, help="seconds per fake web search")
+    parser.add_argument("--fmp-latency", type=float, default=0.05, help="seconds per fixture server response")
+    parser.add_argument("--concurrency", type=int, default=4)
+    parser.add_argument("--baseline", default=BASELINE_PATH)
+    parser.add_argument("--tolerance", type=float, default=0.25, help="allowed relative growth of wall time and RSS")
+    parser.add_argument("--save-baseline", action="store_true")
+    parser.add_argument("--child", choices=WORKLOADS, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        run_child(args)
+        return
+
+    from bench.fixture_server import FixtureServer
+    server = FixtureServer(latency=args.fmp_latency).start()
+    try:
+        results = {name: run_workload(name, args, server) for name in args.workloads}
+    finally:
+        server.stop()
+    print(json.dumps(results, indent=2))
+
+    if args.save_baseline:
+        baseline = {}
+        if os.path.exists(args.baseline):
+            with open(args.baseline, encoding="utf-8") as f:
+                baseline = json.load(f)
+        baseline.update(results)
+        with open(args.baseline, "w", encoding="utf-8") as f:
+            json.dump(baseline, f, indent=2)
+        print(f"baseline saved to {args.baseline}")
+        return
+
+    if not os.path.exists(args.baseline):
+        print(f"NO BASELINE at {args.baseline}, record one with --save-baseline")
+        sys.exit(1)
+    with open(args.baseline, encoding="utf-8") as f:
+        baseline = json.load(f)
+    missing = [name for name in results if name not in baseline]
+    if missing:
+        print(f"NO BASELINE for {', '.join(missing)}, record it with --save-baseline")
+        sys.exit(1)
+    regressions = compare(results, baseline, args.tolerance)
+    if regressions:
+        print("REGRESSIONS:\n  " + "\n  ".join(regressions))
+        sys.exit(1)
+    print("no regressions against baseline")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,222 @@
+'''
+local numeric analytics over FMP fundamentals (income statements, ratios, ratings), so the LLM
+gets computed trends instead of doing the arithmetic itself.
+
+every function works on all tickers at once: records are loaded into one (symbol, period) indexed
+frame per endpoint and growth, margins, trends and z-scores come out of grouped column operations,
+so a watchlist costs one pass rather than one per ticker.
+'''
+import numpy as np
+import pandas as pd
+import requests
+
+from core.concurrency import run_parallel
+from core.fmp import get_client
+
+HISTORY_YEARS = 5
+INCOME_FIELDS = ["revenue", "grossProfit", "operatingIncome", "netIncome", "ebitda", "eps", "interestExpense"]
+RATIO_FIELDS = [
+    "currentRatio", "quickRatio", "debtRatio", "debtEquityRatio", "interestCoverage",
+    "grossProfitMargin", "netProfitMargin", "returnOnAssets", "returnOnEquity", "priceEarningsRatio",
+]
+RATING_FIELDS = ["ratingScore"]
+
+# endpoint -> (path template, params, fields)
+ENDPOINTS = {
+    "income": ("income-statement/{ticker}", {"period": "annual", "limit": HISTORY_YEARS}, INCOME_FIELDS),
+    "ratios": ("ratios/{ticker}", {"limit": HISTORY_YEARS}, RATIO_FIELDS),
+    # daily entries, the recent ones are enough for a trend
+    "rating": ("historical-rating/{ticker}", {"limit": 60}, RATING_FIELDS),
+}
+
+# thresholds for the risk flags
+MIN_CURRENT_RATIO = 1.0
+MIN_INTEREST_COVERAGE = 3.0
+Z_ALERT = 1.5
+
+
+def fetch_records(kind, ticker):
+    path, params, _ = ENDPOINTS[kind]
+    try:
+        data = get_client().get_json(path.format(ticker=ticker), **params)
+    except requests.exceptions.RequestException:
+        return []
+    return data if isinstance(data, list) else []
+
+
+def fetch_fundamentals(tickers, kinds=tuple(ENDPOINTS)):
+    '''{kind: {ticker: records}} for every ticker, fetched concurrently (and cached by the FMP client)'''
+    jobs = [(kind, ticker) for kind in kinds for ticker in dict.fromkeys(tickers)]
+    results = run_parallel([lambda kind=kind, ticker=ticker: fetch_records(kind, ticker) for kind, ticker in jobs])
+    fundamentals = {kind: {} for kind in kinds}
+    for (kind, ticker), records in zip(jobs, results):
+        fundamentals[kind][ticker] = records
+    return fundamentals
+
+
+def record_period(record):
+    '''fiscal year for annual records, fractional year of the date otherwise (daily ratings)'''
+    year = str(record.get("calendarYear") or "")
+    if year.isdigit():
+        return int(year)
+    date = pd.to_datetime(record.get("date"), errors="coerce")
+    if pd.isna(date):
+        return None
+    return round(date.year + (date.dayofyear - 1) / 365.25, 4)
+
+
+def to_frame(records_by_ticker, fields):
+    '''numeric frame indexed by (symbol, period), oldest first'''
+    rows = []
+    for ticker, records in records_by_ticker.items():
+        for record in records or []:
+            period = record_period(record) if isinstance(record, dict) else None
+            if period is not None:
+                rows.append({"symbol": ticker, "period": period, **{f: record.get(f) for f in fields}})
+    frame = pd.DataFrame(rows, columns=["symbol", "period", *fields])
+    frame[fields] = frame[fields].apply(pd.to_numeric, errors="coerce")
+    frame = frame.drop_duplicates(["symbol", "period"], keep="first")
+    return frame.set_index(["symbol", "period"]).sort_index()
+
+
+def slopes(frame):
+    '''least squares slope per year of every column, per symbol'''
+    periods = pd.Series(frame.index.get_level_values("period"), index=frame.index, dtype=float)
+    groups = frame.groupby(level="symbol")
+    dx = periods - periods.groupby(level="symbol").transform("mean")
+    dy = frame - groups.transform("mean")
+    var = (dx ** 2).groupby(level="symbol").sum()
+    return dy.mul(dx, axis=0).groupby(level="symbol").sum().div(var.replace(0, np.nan), axis=0)
+
+
+def zscores(frame):
+    '''how far the latest value of every column sits from its own history, in standard deviations'''
+    groups = frame.groupby(level="symbol")
+    std = groups.std(ddof=0).replace(0, np.nan)
+    return ((groups.last() - groups.mean()) / std).fillna(0.0)
+
+
+def income_trends(income):
+    '''per year: revenue, growth rates and margins'''
+    groups = income.groupby(level="symbol")
+    revenue = income["revenue"].replace(0, np.nan)
+    return pd.DataFrame({
+        "revenue": income["revenue"],
+        "revenue_growth": income["revenue"] / groups["revenue"].shift(1) - 1,
+        "net_income_growth": income["netIncome"] / groups["netIncome"].shift(1).abs() - np.sign(groups["netIncome"].shift(1)),
+        "eps_growth": income["eps"] / groups["eps"].shift(1).abs() - np.sign(groups["eps"].shift(1)),
+        "gross_margin": income["grossProfit"] / revenue,
+        "operating_margin": income["operatingIncome"] / revenue,
+        "net_margin": income["netIncome"] / revenue,
+        "ebitda_margin": income["ebitda"] / revenue,
+    })
+
+
+def growth_summary(income, trends):
+    '''per symbol: years covered, revenue/net income CAGR and margin change over the period'''
+    groups = income.groupby(level="symbol")
+    years = groups.size() - 1
+    first, last = groups.first(), groups.last()
+
+    def cagr(column):
+        # one year of data has no rate; its ratio is 1 and 1 ** nan is 1, so it is masked explicitly
+        ratio = (last[column] / first[column]).where((first[column] > 0) & (last[column] > 0) & (years > 0))
+        return ratio ** (1 / years.replace(0, np.nan)) - 1
+
+    margins = trends.groupby(level="symbol")
+    return pd.DataFrame({
+        "years": years + 1,
+        "revenue_cagr": cagr("revenue"),
+        "net_income_cagr": cagr("netIncome"),
+        "net_margin_change": margins["net_margin"].last() - margins["net_margin"].first(),
+        "operating_margin_change": margins["operating_margin"].last() - margins["operating_margin"].first(),
+    })
+
+
+def risk_indicators(ratios, rating=None):
+    '''per symbol: latest ratios, their trend and z-score, and the resulting risk flags'''
+    latest = ratios.groupby(level="symbol").last()
+    trend = slopes(ratios)
+    z = zscores(ratios)
+    risk = pd.DataFrame({
+        "current_ratio": latest["currentRatio"],
+        "debt_equity": latest["debtEquityRatio"],
+        "debt_equity_trend": trend["debtEquityRatio"],
+        "debt_equity_z": z["debtEquityRatio"],
+        "interest_coverage": latest["interestCoverage"],
+        "net_margin_trend": trend["netProfitMargin"],
+        "roe_z": z["returnOnEquity"],
+        "pe_z": z["priceEarningsRatio"],
+    })
+    risk["flag_liquidity"] = risk["current_ratio"] < MIN_CURRENT_RATIO
+    risk["flag_leverage_rising"] = (risk["debt_equity_trend"] > 0) & (risk["debt_equity_z"] > Z_ALERT)
+    risk["flag_coverage"] = risk["interest_coverage"] < MIN_INTEREST_COVERAGE
+    risk["flag_margin_declining"] = risk["net_margin_trend"] < 0
+    risk["flag_valuation_stretched"] = risk["pe_z"] > Z_ALERT
+    if rating is not None and not rating.empty:
+        risk["rating_score"] = rating.groupby(level="symbol")["ratingScore"].last()
+        risk["rating_trend"] = slopes(rating)["ratingScore"]
+        risk["flag_rating_falling"] = risk["rating_trend"] < 0
+    flags = [c for c in risk.columns if c.startswith("flag_")]
+    risk["risk_score"] = risk[flags].sum(axis=1)
+    return risk
+
+
+def compute(fundamentals):
+    '''
+    {"income": per-year trends, "growth": per-symbol summary, "risk": per-symbol indicators}
+    from fetch_fundamentals() output; kinds without data are left out
+    '''
+    result = {}
+    if fundamentals.get("income"):
+        income = to_frame(fundamentals["income"], INCOME_FIELDS)
+        trends = income_trends(income)
+        result["income"] = trends
+        result["growth"] = growth_summary(income, trends)
+    if fundamentals.get("ratios"):
+        ratios = to_frame(fundamentals["ratios"], RATIO_FIELDS)
+        rating = to_frame(fundamentals["rating"], RATING_FIELDS) if fundamentals.get("rating") else None
+        result["risk"] = risk_indicators(ratios, rating)
+    return result
+
+
+def table(frame):
+    '''compact text table for the LLM: ratios as rounded decimals, large amounts in millions'''
+    if frame is None or frame.empty:
+        return "no data"
+    frame = frame.copy()
+    for column in frame.columns:
+        if frame[column].dtype == bool:
+            continue
+        if frame[column].abs().max() >= 1e6:
+            frame[column] = (frame[column] / 1e6).round(1)
+            frame = frame.rename(columns={column: f"{column}_m"})
+        else:
+            frame[column] = frame[column].round(3)
+    return frame.to_string(na_rep="-")
+
+
+def ticker_tables(result, ticker):
+    '''the tables of compute() restricted to one ticker'''
+    tables = {}
+    for name, frame in result.items():
+        if ticker in frame.index.get_level_values(0):
+            # per-symbol frames read better as one column of name/value rows
+            tables[name] = table(frame.xs(ticker, level=0, drop_level=False) if frame.index.nlevels > 1 else frame.loc[[ticker]].T)
+    return tables
+
+
+def ticker_summary(result, ticker):
+    '''json friendly {"growth": {...}, "risk": {...}} row of one ticker from the per-symbol frames'''
+    summary = {}
+    for name in ("growth", "risk"):
+        frame = result.get(name)
+        if frame is not None and ticker in frame.index:
+            row = frame.loc[ticker]
+            summary[name] = {k: (None if pd.isna(v) else v.item() if hasattr(v, "item") else v) for k, v in row.items()}
+    return summary
+
+
+def analyze_tickers(tickers):
+    '''fetches and computes every table for a list of tickers in one vectorized pass'''
+    return compute(fetch_fundamentals(tickers))
@@ -0,0 +1,176 @@
+import asyncio
+import json
+import os
+import sqlite3
+import threading
+import time
+from collections import Counter, OrderedDict
+from concurrent.futures import Future
+
+from core.metrics import incr
+
+
+class TTLCache:
+    '''
+    two tier cache: an in-memory LRU in front of an optional sqlite file that survives restarts.
+    get_or_fetch()/aget_or_fetch() are stampede safe: while one caller fetches a key, every other
+    thread or task asking for the same key waits on that fetch instead of issuing its own.
+    values must be json serialisable when the disk tier is enabled.
+    a named cache also reports its lookups to core.metrics as cache_requests{cache=name}.
+    '''
+
+    def __init__(self, max_entries=1024, path=None, name=None):
+        self.max_entries = max_entries
+        self.path = path
+        self.name = name
+        self._memory = OrderedDict()
+        self._inflight = {}
+        self._lock = threading.Lock()
+        self.metrics = Counter()
+        self._db = None
+        if path:
+            os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+            self._db = sqlite3.connect(path, check_same_thread=False)
+            self._db.execute("CREATE TABLE IF NOT EXISTS cache (key TEXT PRIMARY KEY, expires REAL, value TEXT)")
+            self._db.commit()
+
+    def _get_memory(self, key, now):
+        entry = self._memory.get(key)
+        if entry is None:
+            return None
+        if entry[0] <= now:
+            del self._memory[key]
+            return None
+        self._memory.move_to_end(key)
+        return entry
+
+    def _put_memory(self, key, expires, value):
+        self._memory[key] = (expires, value)
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.max_entries:
+            self._memory.popitem(last=False)
+            self.metrics["evictions"] += 1
+
+    def _count(self, result):
+        self.metrics[result] += 1
+        if self.name:
+            incr("cache_requests", cache=self.name, result=result)
+
+    def get(self, key):
+        '''returns (found, value)'''
+        found, value = self._lookup(key)
+        if not found:
+            with self._lock:
+                self._count("misses")
+        return found, value
+
+    def _lookup(self, key):
+        now = time.time()
+        with self._lock:
+            entry = self._get_memory(key, now)
+            if entry is not None:
+                self._count("hits_memory")
+                return True, entry[1]
+            if self._db is not None:
+                row = self._db.execute("SELECT expires, value FROM cache WHERE key = ?", (key,)).fetchone()
+                if row and row[0] > now:
+                    value = json.loads(row[1])
+                    self._put_memory(key, row[0], value)
+                    self._count("hits_disk")
+                    return True, value
+            return False, None
+
+    def set(self, key, value, ttl):
+        expires = time.time() + ttl
+        with self._lock:
+            self._put_memory(key, expires, value)
+            if self._db is not None:
+                self._db.execute(
+                    "INSERT OR REPLACE INTO cache (key, expires, value) VALUES (?, ?, ?)",
+                    (key, expires, json.dumps(value)),
+                )
+                self._db.commit()
+
+    def _claim(self, key):
+        '''(future, leader): the in-flight fetch of key, started by this caller if leader'''
+        with self._lock:
+            future = self._inflight.get(key)
+            leader = future is None
+            if leader:
+                future = Future()
+                self._inflight[key] = future
+                self._count("misses")
+            else:
+                self._count("coalesced")
+        return future, leader
+
+    def _settle(self, key, future, ttl, value=None, error=None):
+        try:
+            if error is not None:
+                future.set_exception(error)
+                return
+            try:
+                self.set(key, value, ttl)
+            finally:
+                future.set_result(value)
+        finally:
+            with self._lock:
+                self._inflight.pop(key, None)
+
+    def get_or_fetch(self, key, ttl, fetch):
+        found, value = self._lookup(key)
+        if found:
+            return value
+
+        future, leader = self._claim(key)
+        if not leader:
+            return future.result()
+
+        try:
+            value = fetch()
+        except BaseException as e:
+            self._settle(key, future, ttl, error=e)
+            raise
+        self._settle(key, future, ttl, value)
+        return value
+
+    async def aget_or_fetch(self, key, ttl, fetch):
+        '''
+        get_or_fetch() for coroutines: fetch() returns an awaitable. async and threaded callers share
+        the same in-flight fetches, a waiter awaits the leader's future instead of blocking the loop.
+        '''
+        found, value = self._lookup(key)
+        if found:
+            return value
+
+        future, leader = self._claim(key)
+        if not leader:
+            # shielded: a cancelled waiter must not cancel the fetch the others are waiting on
+            return await asyncio.shield(asyncio.wrap_future(future))
+
+        try:
+            value = await fetch()
+        except BaseException as e:
+            self._settle(key, future, ttl, error=e)
+            raise
+        self._settle(key, future, ttl, value)
+        return value
+
+    def purge_expired(self):
+        now = time.time()
+        with self._lock:
+            for key in [k for k, (expires, _) in self._memory.items() if expires <= now]:
+                del self._memory[key]
+            if self._db is not None:
+                self._db.execute("DELETE FROM cache WHERE expires <= ?", (now,))
+                self._db.commit()
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self.metrics)
+            stats["entries_memory"] = len(self._memory)
+        # a coalesced lookup was answered by another caller's fetch, not by upstream: a hit
+        hits = stats.get("hits_memory", 0) + stats.get("hits_disk", 0) + stats.get("coalesced", 0)
+        total = hits + stats.get("misses", 0)
+        stats["hit_rate"] = hits / total if total else 0.0
+        return stats
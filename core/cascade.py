@@ -0,0 +1,161 @@
+'''
+cheap-first model routing. a section grade comes from the first tier that is sure of it:
+
+    rules   structural checks: the section is there, not empty, long enough, not an error message
+    local   a small lexical classifier, no network: figures, the section's vocabulary, structure, hedging
+    remote  the evaluator LLM
+
+the rules and the local classifier only reject: their weights are hand set, not calibrated
+against the evaluator, so a section they pass still goes to the next tier.
+EVALUATOR_TIERS picks and orders them (default "rules,local,remote"). when no tier is sure the
+section is accepted. section summaries use the same rule checks to decide whether the answer of a
+cheap summary model (MODEL_SUMMARY, cheapest first) is kept or the next model is asked.
+
+which tier settled each call is counted as cascade_resolved{node,tier} in core.metrics and in
+tier_stats().
+'''
+import math
+import os
+import re
+import threading
+from collections import Counter
+
+from core.metrics import incr
+
+EVALUATOR_TIERS = [t.strip() for t in os.getenv("EVALUATOR_TIERS", "rules,local,remote").split(",") if t.strip()]
+MIN_SECTION_CHARS = int(os.getenv("CASCADE_MIN_SECTION_CHARS", "120"))
+# the local classifier rejects a section it scores at or below this
+LOCAL_REJECT = float(os.getenv("CASCADE_LOCAL_REJECT", "0.25"))
+
+# words a useful section of each kind mentions (plural s stripped)
+SECTION_TERMS = {
+    "fin_analysis": {"revenue", "income", "margin", "profit", "profitability", "growth", "eps", "earning", "cash"},
+    "market_output": {"news", "stock", "price", "market", "gainer", "loser", "share", "trade", "investor", "earning"},
+    "risk_analysis": {"risk", "debt", "ratio", "liquidity", "leverage", "rating", "coverage", "valuation", "volatility"},
+}
+_FAILURE = re.compile(
+    r"api request failed|\berror\b|unable to (?:retrieve|access|find|fetch)|no data (?:was )?(?:available|provided)"
+    r"|i (?:don't|do not|cannot|can't) (?:have|access|find)",
+    re.IGNORECASE,
+)
+_HEDGES = re.compile(r"\b(?:may|might|could|unclear|unknown|not available|n/a|insufficient)\b", re.IGNORECASE)
+_FIGURE = re.compile(r"\d[\d,.]*%?")
+
+# weights of the local classifier: figures, vocabulary coverage, structure, length; minus hedging
+_WEIGHTS = (2.0, 2.0, 1.0, 1.5)
+_BIAS = -3.5
+_HEDGE_PENALTY = 0.5
+
+_lock = threading.Lock()
+_resolved = Counter()
+
+
+def record(node, tier):
+    with _lock:
+        _resolved[(node, tier)] += 1
+    incr("cascade_resolved", node=node, tier=tier)
+
+
+def tier_stats():
+    '''{node: {tier: count, ..., "total": n}} since start'''
+    stats = {}
+    with _lock:
+        for (node, tier), count in _resolved.items():
+            stats.setdefault(node, {"total": 0})[tier] = count
+            stats[node]["total"] += count
+    return stats
+
+
+def section_body(content):
+    '''section text without the "## Name" heading section_markdown() puts on top'''
+    lines = (content or "").strip().splitlines()
+    if lines and lines[0].startswith("#"):
+        lines = lines[1:]
+    return "\n".join(lines).strip()
+
+
+def rule_verdict(name, content):
+    '''(grade, score, feedback) when a structural check fails, None when the section looks complete'''
+    body = section_body(content)
+    if not body:
+        return "bad", 1, f"The {name} section is empty. Write it from the data the tools return."
+    if _FAILURE.search(body) and len(body) < 2 * MIN_SECTION_CHARS:
+        return "bad", 2, f"The {name} section reports an error or missing data instead of an analysis. Fetch the data again and summarize it."
+    if len(body) < MIN_SECTION_CHARS:
+        return "bad", 3, f"The {name} section is too short. Cover the points in its description with concrete figures."
+    return None
+
+
+def local_features(name, content):
+    body = section_body(content)
+    words = [w.rstrip("s") for w in re.findall(r"[a-z]+", body.lower())]
+    terms = SECTION_TERMS.get(name, set())
+    lines = [l for l in body.splitlines() if l.strip()]
+    return {
+        "figures": min(1.0, len(_FIGURE.findall(body)) / 5),
+        "coverage": min(1.0, len(terms & set(words)) / 4) if terms else 1.0,
+        "structure": 1.0 if len(lines) >= 3 else 0.5 if len(lines) == 2 else 0.0,
+        "length": min(1.0, len(words) / 150),
+        "hedges": min(6, len(_HEDGES.findall(body))),
+    }
+
+
+def local_score(name, content):
+    '''0..1 estimate that the evaluator would accept the section'''
+    f = local_features(name, content)
+    z = _BIAS - _HEDGE_PENALTY * f["hedges"] + sum(
+        w * f[k] for w, k in zip(_WEIGHTS, ("figures", "coverage", "structure", "length"))
+    )
+    return 1 / (1 + math.exp(-z))
+
+
+def local_verdict(name, content):
+    '''(grade, score, feedback) for a section the classifier is sure is bad, None otherwise'''
+    p = local_score(name, content)
+    if p > LOCAL_REJECT:
+        return None
+    f = local_features(name, content)
+    missing = [hint for key, hint in (
+        ("figures", "concrete figures"), ("coverage", "the points in its description"), ("structure", "a clear structure"),
+    ) if f[key] < 0.5]
+    score = max(1, min(10, round(1 + 9 * p)))
+    return "bad", score, f"The {name} section is vague. Add {', '.join(missing) or 'more substance'}."
+
+
+CHEAP_TIERS = {"rules": rule_verdict, "local": local_verdict}
+
+
+def cheap_verdict(name, content, tiers=None):
+    '''(verdict, tier) from the first non-remote tier that decides, (None, None) otherwise'''
+    for tier in tiers or EVALUATOR_TIERS:
+        check = CHEAP_TIERS.get(tier)
+        verdict = check(name, content) if check else None
+        if verdict is not None:
+            return verdict, tier
+    return None, None
+
+
+def grade(name, content, remote, tiers=None):
+    '''
+    (grade, score, feedback) for a section, cheapest tier first. `remote()` runs the evaluator and
+    returns the same triple; it is only called when "remote" is a tier and the others were unsure.
+    '''
+    tiers = tiers or EVALUATOR_TIERS
+    verdict, tier = cheap_verdict(name, content, tiers)
+    if verdict is None and "remote" in tiers:
+        verdict, tier = remote(), "remote"
+    if verdict is None:
+        verdict, tier = ("good", 5, ""), "default"
+    record("evaluator", tier)
+    return verdict
+
+
+async def agrade(name, content, aremote, tiers=None):
+    tiers = tiers or EVALUATOR_TIERS
+    verdict, tier = cheap_verdict(name, content, tiers)
+    if verdict is None and "remote" in tiers:
+        verdict, tier = await aremote(), "remote"
+    if verdict is None:
+        verdict, tier = ("good", 5, ""), "default"
+    record("evaluator", tier)
+    return verdict
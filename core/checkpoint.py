@@ -0,0 +1,51 @@
+import os
+import threading
+import time
+from collections import OrderedDict
+
+from langgraph.checkpoint.memory import InMemorySaver
+
+CHECKPOINT_MAX_THREADS = int(os.getenv("CHECKPOINT_MAX_THREADS", "256"))
+CHECKPOINT_MAX_AGE = float(os.getenv("CHECKPOINT_MAX_AGE", "3600"))
+
+
+class BoundedMemorySaver(InMemorySaver):
+    '''
+    InMemorySaver that forgets whole threads once there are more than `max_threads` of them
+    or a thread hasn't been written to for `max_age` seconds. least recently written goes first.
+    '''
+
+    def __init__(self, max_threads=CHECKPOINT_MAX_THREADS, max_age=CHECKPOINT_MAX_AGE, **kwargs):
+        super().__init__(**kwargs)
+        self.max_threads = max_threads
+        self.max_age = max_age
+        self._touched = OrderedDict()
+        self._evict_lock = threading.Lock()
+
+    def _touch(self, config):
+        thread_id = config["configurable"]["thread_id"]
+        now = time.monotonic()
+        with self._evict_lock:
+            self._touched[thread_id] = now
+            self._touched.move_to_end(thread_id)
+            evict = []
+            for old_id, touched in self._touched.items():
+                if old_id == thread_id:
+                    break
+                if len(self._touched) - len(evict) > self.max_threads or now - touched > self.max_age:
+                    evict.append(old_id)
+                else:
+                    break
+            for old_id in evict:
+                del self._touched[old_id]
+        for old_id in evict:
+            self.delete_thread(old_id)
+
+    def put(self, config, checkpoint, metadata, new_versions):
+        result = super().put(config, checkpoint, metadata, new_versions)
+        self._touch(config)
+        return result
+
+    def stats(self):
+        with self._evict_lock:
+            return {"threads": len(self._touched)}
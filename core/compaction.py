@@ -0,0 +1,134 @@
+import os
+import re
+
+from core.registry import registry
+
+# token budgets; a section can be overridden with e.g. COMPACT_BUDGET_MARKET_OUTPUT=800
+DEFAULT_TOOL_BUDGET = int(os.getenv("COMPACT_BUDGET_DEFAULT", "1500"))
+EVALUATOR_BUDGET = int(os.getenv("COMPACT_BUDGET_EVALUATOR", "3000"))
+NEWS_TEXT_CHARS = 300
+
+TRUNCATION_MARKER = "\n...[truncated {} tokens]"
+
+_ANSI = re.compile(r"\x1b\[[0-9;]*m")
+_TOKEN = re.compile(r"\w+|[^\w\s]")
+# boilerplate printed by verbose AgentExecutor runs, the data around it is kept
+_CHAIN_NOISE = re.compile(r"^\s*(> Entering new .*chain\.*|> Finished chain\.?|Invoking: `.*` with `.*`|responded: ?)\s*$")
+
+# fields worth sending to the LLM for each FMP endpoint
+FMP_FIELDS = {
+    "profile": ["symbol", "companyName", "price", "mktCap", "beta", "lastDiv", "range", "changes",
+                "currency", "exchangeShortName", "industry", "sector", "country", "ceo",
+                "fullTimeEmployees", "ipoDate", "description"],
+    "income-statement": ["date", "symbol", "calendarYear", "period", "revenue", "costOfRevenue",
+                         "grossProfit", "grossProfitRatio", "researchAndDevelopmentExpenses",
+                         "operatingExpenses", "operatingIncome", "operatingIncomeRatio", "ebitda",
+                         "ebitdaratio", "interestExpense", "incomeBeforeTax", "netIncome",
+                         "netIncomeRatio", "eps", "epsdiluted"],
+    "ratios": ["date", "symbol", "period", "currentRatio", "quickRatio", "cashRatio",
+               "grossProfitMargin", "operatingProfitMargin", "netProfitMargin", "returnOnAssets",
+               "returnOnEquity", "debtRatio", "debtEquityRatio", "interestCoverage",
+               "priceEarningsRatio", "priceToBookRatio", "dividendYield"],
+    "rating": ["symbol", "date", "rating", "ratingScore", "ratingRecommendation",
+               "ratingDetailsDCFRecommendation", "ratingDetailsROERecommendation",
+               "ratingDetailsROARecommendation", "ratingDetailsDERecommendation",
+               "ratingDetailsPERecommendation", "ratingDetailsPBRecommendation"],
+    "movers": ["symbol", "name", "price", "change", "changesPercentage"],
+    "news": ["symbol", "publishedDate", "title", "site", "text", "url"],
+}
+
+def _load_encoding():
+    try:
+        import tiktoken
+        return tiktoken.get_encoding("cl100k_base")
+    except Exception:
+        # not installed, or its BPE file can't be fetched: fall back to the approximation
+        return False
+
+
+def token_encoding():
+    '''the cl100k_base encoding, loaded on first use rather than at import; None without tiktoken'''
+    return registry.get_or_create(("tiktoken", "cl100k_base"), _load_encoding) or None
+
+
+def count_tokens(text):
+    '''local token count: tiktoken when it is installed, otherwise a word/punctuation approximation'''
+    encoding = token_encoding()
+    if encoding is not None:
+        return len(encoding.encode(text, disallowed_special=()))
+    return len(_TOKEN.findall(text))
+
+
+def truncate_tokens(text, budget):
+    total = count_tokens(text)
+    if total <= budget:
+        return text
+    encoding = token_encoding()
+    if encoding is not None:
+        kept = encoding.decode(encoding.encode(text, disallowed_special=())[:budget])
+    else:
+        # cut at the end of the budget-th approximate token
+        matches = list(_TOKEN.finditer(text))
+        kept = text[:matches[budget - 1].end()] if budget > 0 else ""
+    return kept + TRUNCATION_MARKER.format(total - budget)
+
+
+def strip_chain_logs(text):
+    text = _ANSI.sub("", text)
+    lines = [line.rstrip() for line in text.splitlines() if not _CHAIN_NOISE.match(line)]
+    text = "\n".join(lines)
+    return re.sub(r"\n{3,}", "\n\n", text).strip()
+
+
+def project(kind, data):
+    '''keeps only FMP_FIELDS[kind] of a record (or of every record in a list)'''
+    fields = FMP_FIELDS[kind]
+    if isinstance(data, list):
+        return [project(kind, item) for item in data]
+    if not isinstance(data, dict) or "error" in data:
+        return data
+    return {k: data[k] for k in fields if k in data and data[k] not in (None, "")}
+
+
+def dedupe_news(items):
+    '''drops repeated articles (same url or same normalised title) and shortens article text'''
+    if not isinstance(items, list):
+        return items
+    seen = set()
+    unique = []
+    for item in items:
+        title = re.sub(r"\W+", " ", str(item.get("title", ""))).strip().lower()
+        keys = {k for k in (item.get("url"), title) if k}
+        if keys & seen:
+            continue
+        seen |= keys
+        item = project("news", item)
+        if len(item.get("text", "")) > NEWS_TEXT_CHARS:
+            item["text"] = item["text"][:NEWS_TEXT_CHARS].rstrip() + "..."
+        unique.append(item)
+    return unique
+
+
+def compact_web_results(response, max_results=5):
+    '''title, url and a short snippet of each Tavily hit'''
+    if not isinstance(response, dict):
+        return response
+    return [
+        {"title": r.get("title"), "url": r.get("url"), "content": (r.get("content") or "")[:NEWS_TEXT_CHARS]}
+        for r in (response.get("results") or [])[:max_results]
+    ]
+
+
+def section_budget(section_name):
+    value = os.getenv(f"COMPACT_BUDGET_{section_name.upper()}")
+    return int(value) if value else DEFAULT_TOOL_BUDGET
+
+
+def compact_tool_output(output, budget=DEFAULT_TOOL_BUDGET):
+    '''turns an agent tool result (usually a list of captured transcripts) into a bounded string'''
+    if isinstance(output, (list, tuple)):
+        parts = [strip_chain_logs(str(part)) for part in output]
+        text = "\n\n".join(part for part in parts if part)
+    else:
+        text = strip_chain_logs(str(output))
+    return truncate_tokens(text, budget)
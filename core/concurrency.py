@@ -0,0 +1,195 @@
+import asyncio
+import contextvars
+import math
+import os
+import time
+import weakref
+from collections import Counter, deque
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import asynccontextmanager
+
+MAX_FANOUT = 8
+
+
+def run_parallel(fns, max_workers=MAX_FANOUT):
+    '''
+    runs independent zero-argument callables on a bounded thread pool and returns their
+    results in the same order as `fns`. each call runs in a copy of the caller's context so
+    contextvars (request scoped state) are visible inside the workers.
+    the first exception (in input order) is re-raised after all calls have finished.
+    '''
+    fns = list(fns)
+    if len(fns) <= 1:
+        return [fn() for fn in fns]
+    # a pool per fan-out keeps nested fan-outs (worker -> tool -> agents) from starving each other
+    with ThreadPoolExecutor(max_workers=min(max_workers, len(fns))) as pool:
+        futures = [pool.submit(contextvars.copy_context().run, fn) for fn in fns]
+    return [f.result() for f in futures]
+
+
+# max in-flight calls per upstream provider on one event loop
+PROVIDER_LIMITS = {
+    "groq": int(os.getenv("GROQ_MAX_CONCURRENCY", "8")),
+    "tavily": int(os.getenv("TAVILY_MAX_CONCURRENCY", "4")),
+    "fmp": int(os.getenv("FMP_MAX_CONCURRENCY", "10")),
+}
+
+# max in-flight calls per upstream provider for a single client (see set_client), 0 = no own limit
+PROVIDER_CLIENT_LIMITS = {
+    "groq": int(os.getenv("GROQ_MAX_CONCURRENCY_PER_CLIENT", "4")),
+    "tavily": int(os.getenv("TAVILY_MAX_CONCURRENCY_PER_CLIENT", "2")),
+    "fmp": int(os.getenv("FMP_MAX_CONCURRENCY_PER_CLIENT", "5")),
+}
+
+_semaphores = weakref.WeakKeyDictionary()
+# per loop, (provider, client) -> semaphore; an entry lives while some call of that client holds it
+_client_semaphores = weakref.WeakKeyDictionary()
+_client = contextvars.ContextVar("client", default=None)
+
+
+def set_client(client):
+    '''tags the current context (and the tasks it spawns) with the caller provider_limit() counts against'''
+    return _client.set(client)
+
+
+def reset_client(token):
+    _client.reset(token)
+
+
+class _Limits:
+    '''holds several semaphores as one `async with`, acquired in order and released in reverse'''
+
+    def __init__(self, *semaphores):
+        self.semaphores = semaphores
+
+    async def __aenter__(self):
+        acquired = []
+        try:
+            for semaphore in self.semaphores:
+                await semaphore.acquire()
+                acquired.append(semaphore)
+        except BaseException:
+            for semaphore in reversed(acquired):
+                semaphore.release()
+            raise
+
+    async def __aexit__(self, *exc):
+        for semaphore in reversed(self.semaphores):
+            semaphore.release()
+
+
+def provider_limit(name):
+    '''
+    asyncio semaphore for an upstream provider, use as `async with provider_limit("groq"):`.
+    semaphores are bound to the running loop, so a new loop (e.g. a second asyncio.run) gets its own.
+    inside a context tagged with set_client() the client's own share of the provider is taken first,
+    so one caller can't hold every global slot.
+    '''
+    loop = asyncio.get_running_loop()
+    per_loop = _semaphores.setdefault(loop, {})
+    if name not in per_loop:
+        per_loop[name] = asyncio.Semaphore(PROVIDER_LIMITS.get(name, MAX_FANOUT))
+    client = _client.get()
+    client_limit = PROVIDER_CLIENT_LIMITS.get(name, 0)
+    if client is None or not client_limit:
+        return per_loop[name]
+    per_client = _client_semaphores.setdefault(loop, weakref.WeakValueDictionary())
+    semaphore = per_client.get((name, client))
+    if semaphore is None:
+        semaphore = per_client[(name, client)] = asyncio.Semaphore(client_limit)
+    return _Limits(semaphore, per_loop[name])
+
+
+async def limited(name, coro):
+    '''awaits `coro` under provider_limit(name)'''
+    async with provider_limit(name):
+        return await coro
+
+
+def limited_runnable(runnable, name):
+    '''
+    wraps a runnable (e.g. an agent's prompt | llm step) so each async call takes its own
+    provider_limit(name) slot, held for that call only and not while the agent's tools run
+    '''
+    from langchain_core.runnables import RunnableLambda
+
+    async def acall(inputs, config):
+        async with provider_limit(name):
+            return await runnable.ainvoke(inputs, config)
+
+    def call(inputs, config):
+        return runnable.invoke(inputs, config)
+
+    return RunnableLambda(call, afunc=acall, name=f"limited_{name}")
+
+
+class Overloaded(Exception):
+    '''raised by AdmissionControl.admit() when a request is refused; retry_after is in seconds'''
+
+    def __init__(self, reason, retry_after):
+        super().__init__(f"{reason} at capacity, retry in {retry_after}s")
+        self.reason = reason
+        self.retry_after = retry_after
+
+
+class AdmissionControl:
+    '''
+    bounds the work an asyncio server takes on: `max_running` requests run at once, up to `max_queued`
+    more wait for a slot, and one client holds at most `per_client` of either. anything past that is
+    refused straight away with Overloaded instead of piling up. all state lives on one event loop.
+    '''
+
+    def __init__(self, max_running, max_queued, per_client, default_seconds=30.0):
+        self.max_running = max_running
+        self.max_queued = max_queued
+        self.per_client = per_client
+        self.default_seconds = default_seconds
+        self.running = 0
+        self.queued = 0
+        self.clients = Counter()
+        self._slots = None
+        self._durations = deque(maxlen=50)
+
+    def retry_after(self):
+        '''seconds until a slot is likely free: recent mean run time times the queue ahead, over the slots'''
+        mean = sum(self._durations) / len(self._durations) if self._durations else self.default_seconds
+        return max(1, math.ceil(mean * (self.queued + 1) / self.max_running))
+
+    def stats(self):
+        return {
+            "running": self.running, "queued": self.queued, "clients": len(self.clients),
+            "max_running": self.max_running, "max_queued": self.max_queued, "per_client": self.per_client,
+        }
+
+    @asynccontextmanager
+    async def admit(self, client):
+        if self.clients[client] >= self.per_client:
+            raise Overloaded("client", self.retry_after())
+        if self.running + self.queued >= self.max_running + self.max_queued:
+            raise Overloaded("server", self.retry_after())
+        if self._slots is None:
+            self._slots = asyncio.Semaphore(self.max_running)
+        self.clients[client] += 1
+        self.queued += 1
+        started = None
+        try:
+            await self._slots.acquire()
+            self.queued -= 1
+            self.running += 1
+            started = time.monotonic()
+            yield
+        finally:
+            if started is None:
+                self.queued -= 1
+            else:
+                self.running -= 1
+                self._durations.append(time.monotonic() - started)
+                self._slots.release()
+            self.clients[client] -= 1
+            if not self.clients[client]:
+                del self.clients[client]
+
+
+async def arun_parallel(coros):
+    '''async counterpart of run_parallel: awaits all coroutines concurrently, results in input order'''
+    return list(await asyncio.gather(*coros))
@@ -0,0 +1,233 @@
+import contextvars
+import os
+import random
+import threading
+import time
+from contextlib import contextmanager
+
+import requests
+from requests.adapters import HTTPAdapter
+from dotenv import load_dotenv
+
+from core.cache import TTLCache
+from core.concurrency import PROVIDER_LIMITS
+from core.metrics import incr, span
+from core.registry import registry
+from core.request_scope import shared
+
+load_dotenv()
+
+FMP_API_KEY = os.getenv("FMP_API_KEY")
+# point this at a local stub server to run the tools offline
+FMP_BASE_URL = os.getenv("FMP_BASE_URL", "https://financialmodelingprep.com/api/v3")
+# requests per minute allowed by our plan
+FMP_RATE_LIMIT = int(os.getenv("FMP_RATE_LIMIT", "300"))
+
+# set to a file path (e.g. .cache/fmp.sqlite) to keep cached responses across restarts
+FMP_CACHE_PATH = os.getenv("FMP_CACHE_PATH")
+FMP_CACHE_SIZE = int(os.getenv("FMP_CACHE_SIZE", "2048"))
+
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+
+# seconds a response stays fresh, matched on the first path segment(s) of the endpoint
+ENDPOINT_TTLS = {
+    "profile": 24 * 3600,
+    "income-statement": 12 * 3600,
+    "ratios": 12 * 3600,
+    "rating": 6 * 3600,
+    "historical-rating": 6 * 3600,
+    "quote": 60,
+    "stock_market/gainers": 5 * 60,
+    "stock_market/losers": 5 * 60,
+    "stock_news": 10 * 60,
+}
+DEFAULT_TTL = 5 * 60
+
+
+def ttl_for(path):
+    path = path.strip("/")
+    for prefix, ttl in ENDPOINT_TTLS.items():
+        if path == prefix or path.startswith(prefix + "/"):
+            return ttl
+    return DEFAULT_TTL
+
+
+def endpoint_name(path):
+    '''the ENDPOINT_TTLS entry (or first path segment) of a request path, used as a metrics label'''
+    path = path.strip("/")
+    for prefix in ENDPOINT_TTLS:
+        if path == prefix or path.startswith(prefix + "/"):
+            return prefix
+    return path.split("/", 1)[0]
+
+
+def cache_key(path, params):
+    query = "&".join(f"{k}={params[k]}" for k in sorted(params) if k != "apikey")
+    return f"{path.strip('/')}?{query}"
+
+
+_pinned = contextvars.ContextVar("fmp_pinned", default=None)
+
+
+@contextmanager
+def pinned_responses(responses):
+    '''
+    serves {cache_key: value} to every get_json made inside the block (including threads and tasks
+    started from it) regardless of ttl, e.g. market movers fetched once for a whole batch
+    '''
+    token = _pinned.set({**(_pinned.get() or {}), **responses})
+    try:
+        yield
+    finally:
+        _pinned.reset(token)
+
+
+class RateLimiter:
+    '''
+    token bucket shared by every thread in the process.
+    acquire() blocks until a token is free, so bursts above the quota are smoothed instead of rejected.
+    '''
+
+    def __init__(self, rate_per_minute, burst=None):
+        self.rate = rate_per_minute / 60.0
+        self.capacity = burst or max(1, rate_per_minute // 10)
+        self.tokens = float(self.capacity)
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+
+    def acquire(self):
+        while True:
+            with self.lock:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                wait = (1 - self.tokens) / self.rate
+            time.sleep(wait)
+
+    def try_acquire(self, n=1):
+        '''takes n tokens if they are there right now, never waits'''
+        with self.lock:
+            now = time.monotonic()
+            self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+            self.updated = now
+            if self.tokens >= n:
+                self.tokens -= n
+                return True
+            return False
+
+
+class FMPClient:
+    '''
+    keep-alive session for financialmodelingprep with timeouts, bounded retries and a global rate limit.
+    get_json raises requests.exceptions.RequestException once retries are exhausted.
+    '''
+
+    def __init__(self, api_key=FMP_API_KEY, base_url=FMP_BASE_URL, rate_per_minute=FMP_RATE_LIMIT,
+                 timeout=(3.05, 15), max_retries=3, backoff=0.5, max_backoff=8.0, pool_size=20,
+                 cache=None):
+        self.api_key = api_key
+        self.base_url = base_url.rstrip("/")
+        self.timeout = timeout
+        self.max_retries = max_retries
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self.limiter = RateLimiter(rate_per_minute)
+        self.cache = cache
+        # caps concurrent upstream requests from sync callers and from async tools run on executor threads
+        self.inflight = threading.BoundedSemaphore(PROVIDER_LIMITS["fmp"])
+        self.retries = 0
+        self._stats_lock = threading.Lock()
+
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+        self.session.mount("https://", adapter)
+        self.session.mount("http://", adapter)
+
+    def _sleep_before_retry(self, attempt, response=None):
+        with self._stats_lock:
+            self.retries += 1
+        incr("http_retries", provider="fmp")
+        delay = None
+        if response is not None:
+            retry_after = response.headers.get("Retry-After")
+            if retry_after and retry_after.isdigit():
+                delay = float(retry_after)
+        if delay is None:
+            # full jitter so concurrent workers don't retry in lockstep
+            delay = random.uniform(0, min(self.max_backoff, self.backoff * (2 ** attempt)))
+        time.sleep(min(delay, self.max_backoff))
+
+    def get_json(self, path, timeout=None, **params):
+        '''
+        cached GET; identical (path, params) requests inside the endpoint's ttl are served from
+        the cache and concurrent identical requests share one upstream call. within one request
+        (core.request_scope) a key is looked up once, so every section sees the same response.
+        '''
+        key = cache_key(path, params)
+        pinned = _pinned.get()
+        if pinned and key in pinned:
+            incr("cache_requests", cache="fmp", result="pinned")
+            return pinned[key]
+        if self.cache is None:
+            return shared(("fmp", key), lambda: self.fetch_json(path, timeout=timeout, **params))
+        return shared(("fmp", key), lambda: self.cache.get_or_fetch(
+            key,
+            ttl_for(path),
+            lambda: self.fetch_json(path, timeout=timeout, **params),
+        ))
+
+    def fetch_json(self, path, timeout=None, **params):
+        url = f"{self.base_url}/{path.lstrip('/')}"
+        params["apikey"] = self.api_key
+
+        for attempt in range(self.max_retries + 1):
+            self.limiter.acquire()
+            try:
+                with self.inflight, span("http", f"fmp:{endpoint_name(path)}"):
+                    response = self.session.get(url, params=params, timeout=timeout or self.timeout)
+            except (requests.exceptions.ConnectionError, requests.exceptions.Timeout):
+                if attempt == self.max_retries:
+                    raise
+                self._sleep_before_retry(attempt)
+                continue
+
+            if response.status_code in RETRY_STATUSES and attempt < self.max_retries:
+                self._sleep_before_retry(attempt, response)
+                continue
+
+            response.raise_for_status()
+            return response.json()
+
+    def get_many(self, endpoint, symbols, chunk_size=50):
+        '''
+        multi-symbol lookup (profile/AAPL,MSFT,...) in chunks, returns {symbol: record}.
+        each record is also cached under the single-symbol key the tools read, so later
+        per-ticker calls are cache hits. chunks the plan rejects are skipped, not raised.
+        '''
+        records = {}
+        symbols = list(dict.fromkeys(symbols))
+        for i in range(0, len(symbols), chunk_size):
+            chunk = symbols[i:i + chunk_size]
+            try:
+                data = self.fetch_json(f"{endpoint}/{','.join(chunk)}")
+            except requests.exceptions.RequestException:
+                continue
+            for record in data or []:
+                symbol = record.get("symbol")
+                if not symbol:
+                    continue
+                records[symbol] = record
+                if self.cache is not None:
+                    self.cache.set(cache_key(f"{endpoint}/{symbol}", {}), [record], ttl_for(endpoint))
+        return records
+
+
+def get_cache():
+    return registry.get_or_create(("fmp_cache",), lambda: TTLCache(max_entries=FMP_CACHE_SIZE, path=FMP_CACHE_PATH, name="fmp"))
+
+
+def get_client():
+    return registry.get_or_create(("fmp",), lambda: FMPClient(cache=get_cache()))
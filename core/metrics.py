@@ -0,0 +1,189 @@
+import importlib.util
+import json
+import math
+import os
+import threading
+import time
+from collections import Counter, defaultdict, deque
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from core.request_context import current_request
+
+# durations kept per (kind, name) for percentiles; older samples drop out of the window
+METRICS_MAX_SAMPLES = int(os.getenv("METRICS_MAX_SAMPLES", "10000"))
+# set METRICS_ENABLED=false to stop attaching the callback handler to every langchain run
+METRICS_ENABLED = os.getenv("METRICS_ENABLED", "true").lower() in ("1", "true", "yes")
+METRICS_PREFIX = os.getenv("METRICS_PREFIX", "finsight")
+QUANTILES = (0.5, 0.95, 0.99)
+
+
+def percentile(sorted_values, q):
+    '''nearest-rank percentile of an already sorted list'''
+    if not sorted_values:
+        return 0.0
+    return sorted_values[max(0, math.ceil(q * len(sorted_values)) - 1)]
+
+
+def label_key(name, labels):
+    return (name, tuple(sorted(labels.items())))
+
+
+class Recorder:
+    '''
+    timing spans grouped by (kind, name) plus labelled counters, thread safe.
+    kinds used here: node (graph nodes), llm, tool, http, embedding, request.
+    '''
+
+    def __init__(self, max_samples=METRICS_MAX_SAMPLES):
+        self.max_samples = max_samples
+        self._lock = threading.Lock()
+        self.clear()
+
+    def clear(self):
+        with self._lock:
+            self._durations = defaultdict(lambda: deque(maxlen=self.max_samples))
+            self._totals = defaultdict(lambda: {"count": 0, "errors": 0, "sum": 0.0})
+            self.counters = Counter()
+
+    def observe(self, kind, name, seconds, ok=True):
+        with self._lock:
+            self._durations[(kind, name)].append(seconds)
+            total = self._totals[(kind, name)]
+            total["count"] += 1
+            total["sum"] += seconds
+            if not ok:
+                total["errors"] += 1
+
+    def incr(self, name, value=1, **labels):
+        with self._lock:
+            self.counters[label_key(name, labels)] += value
+
+    def summary(self):
+        '''{"spans": [...], "counters": [...]} with p50/p95/p99 per span group'''
+        with self._lock:
+            durations = {key: sorted(values) for key, values in self._durations.items()}
+            totals = {key: dict(total) for key, total in self._totals.items()}
+            counters = dict(self.counters)
+        spans = []
+        for (kind, name), values in sorted(durations.items()):
+            span = {"kind": kind, "name": name, **totals[(kind, name)]}
+            for q in QUANTILES:
+                span[f"p{int(q * 100)}"] = percentile(values, q)
+            span["max"] = values[-1] if values else 0.0
+            spans.append(span)
+        return {
+            "spans": spans,
+            "counters": [
+                {"name": name, "labels": dict(labels), "value": value}
+                for (name, labels), value in sorted(counters.items())
+            ],
+        }
+
+
+# everything recorded by this process; a request also records into its own (core.request_context)
+run_metrics = Recorder()
+
+
+def request_metrics():
+    '''summary() of the current request's recorder, None outside a request'''
+    request = current_request()
+    return request.metrics.summary() if request is not None else None
+
+
+def _recorders():
+    request = current_request()
+    return (run_metrics, request.metrics) if request is not None else (run_metrics,)
+
+
+def observe(kind, name, seconds, ok=True):
+    for recorder in _recorders():
+        recorder.observe(kind, name, seconds, ok)
+
+
+def incr(name, value=1, **labels):
+    for recorder in _recorders():
+        recorder.incr(name, value, **labels)
+
+
+@contextmanager
+def span(kind, name):
+    started = time.perf_counter()
+    ok = False
+    try:
+        yield
+        ok = True
+    finally:
+        observe(kind, name, time.perf_counter() - started, ok)
+
+
+# the langchain callback lives in core/metrics_callback.py so caches, the FMP client and the bench's
+# fixture server record metrics without langchain installed; it hooks into langchain when present
+if importlib.util.find_spec("langchain_core") is not None:
+    import core.metrics_callback  # noqa: F401
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _labels(labels):
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{k}="{_escape(v)}"' for k, v in labels.items()) + "}"
+
+
+def to_prometheus(summary=None):
+    '''prometheus text exposition of a summary() (the whole run by default)'''
+    summary = summary or run_metrics.summary()
+    seconds = f"{METRICS_PREFIX}_span_seconds"
+    errors = f"{METRICS_PREFIX}_span_errors_total"
+    lines = [f"# TYPE {seconds} summary"]
+    for s in summary["spans"]:
+        labels = {"kind": s["kind"], "name": s["name"]}
+        for q in QUANTILES:
+            lines.append(f"{seconds}{_labels({**labels, 'quantile': q})} {s[f'p{int(q * 100)}']}")
+        lines.append(f"{seconds}_sum{_labels(labels)} {s['sum']}")
+        lines.append(f"{seconds}_count{_labels(labels)} {s['count']}")
+    lines.append(f"# TYPE {errors} counter")
+    for s in summary["spans"]:
+        lines.append(f"{errors}{_labels({'kind': s['kind'], 'name': s['name']})} {s['errors']}")
+    declared = set()
+    for c in summary["counters"]:
+        name = f"{METRICS_PREFIX}_{c['name']}_total"
+        if name not in declared:
+            declared.add(name)
+            lines.append(f"# TYPE {name} counter")
+        lines.append(f"{name}{_labels(c['labels'])} {c['value']}")
+    return "\n".join(lines) + "\n"
+
+
+def write_metrics(path, summary=None):
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(summary or run_metrics.summary(), f, indent=2)
+
+
+class _MetricsRequestHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        if self.path == "/metrics":
+            body, content_type = to_prometheus().encode(), "text/plain; version=0.0.4"
+        elif self.path == "/metrics.json":
+            body, content_type = json.dumps(run_metrics.summary()).encode(), "application/json"
+        else:
+            self.send_error(404)
+            return
+        self.send_response(200)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def serve_metrics(port, host="127.0.0.1"):
+    '''serves /metrics (prometheus text) and /metrics.json from a daemon thread, returns the server'''
+    server = ThreadingHTTPServer((host, port), _MetricsRequestHandler)
+    threading.Thread(target=server.serve_forever, name="metrics", daemon=True).start()
+    return server
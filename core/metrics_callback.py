@@ -0,0 +1,104 @@
+'''
+the langchain side of core.metrics: a callback handler timing every graph node, LLM call and tool
+call and counting LLM tokens, registered as a configure hook on import (core.metrics imports this
+module whenever langchain is installed).
+'''
+import contextvars
+import threading
+import time
+
+from langchain_core.callbacks import BaseCallbackHandler
+from langchain_core.tracers.context import register_configure_hook
+
+from core.metrics import METRICS_ENABLED, incr, observe
+
+
+def token_usage(response):
+    '''(input, output) tokens of an LLMResult, from the provider's usage or the message metadata'''
+    usage = (response.llm_output or {}).get("token_usage") or {}
+    if usage:
+        return usage.get("prompt_tokens", 0), usage.get("completion_tokens", 0)
+    for generations in response.generations:
+        for generation in generations:
+            metadata = getattr(getattr(generation, "message", None), "usage_metadata", None)
+            if metadata:
+                return metadata.get("input_tokens", 0), metadata.get("output_tokens", 0)
+    return 0, 0
+
+
+class MetricsCallbackHandler(BaseCallbackHandler):
+    '''
+    langchain callback timing every graph node, LLM call and tool call it sees, and counting LLM tokens.
+    runs inline so it records into the recorder of the context that made the call.
+    '''
+
+    run_inline = True
+
+    def __init__(self):
+        self._started = {}
+        self._lock = threading.Lock()
+
+    def _start(self, run_id, kind, name):
+        with self._lock:
+            self._started[run_id] = (kind, name, time.perf_counter())
+
+    def _end(self, run_id, ok=True):
+        with self._lock:
+            started = self._started.pop(run_id, None)
+        if started is None:
+            return None
+        kind, name, t0 = started
+        observe(kind, name, time.perf_counter() - t0, ok)
+        return name
+
+    def on_chat_model_start(self, serialized, messages, *, run_id, metadata=None, **kwargs):
+        self._start(run_id, "llm", (metadata or {}).get("ls_model_name") or kwargs.get("name") or "chat_model")
+
+    def on_llm_start(self, serialized, prompts, *, run_id, metadata=None, **kwargs):
+        self._start(run_id, "llm", (metadata or {}).get("ls_model_name") or kwargs.get("name") or "llm")
+
+    def on_llm_end(self, response, *, run_id, **kwargs):
+        model = self._end(run_id)
+        if model is None:
+            return
+        tokens_in, tokens_out = token_usage(response)
+        if tokens_in:
+            incr("llm_tokens", tokens_in, model=model, type="input")
+        if tokens_out:
+            incr("llm_tokens", tokens_out, model=model, type="output")
+
+    def on_llm_error(self, error, *, run_id, **kwargs):
+        self._end(run_id, ok=False)
+
+    def on_tool_start(self, serialized, input_str, *, run_id, **kwargs):
+        self._start(run_id, "tool", kwargs.get("name") or (serialized or {}).get("name") or "tool")
+
+    def on_tool_end(self, output, *, run_id, **kwargs):
+        self._end(run_id)
+
+    def on_tool_error(self, error, *, run_id, **kwargs):
+        self._end(run_id, ok=False)
+
+    def on_chain_start(self, serialized, inputs, *, run_id, parent_run_id=None, metadata=None, **kwargs):
+        # only the run of the node itself: its name is the node's name and its parent isn't that node already
+        node = (metadata or {}).get("langgraph_node")
+        if not node or kwargs.get("name") != node:
+            return
+        with self._lock:
+            parent = self._started.get(parent_run_id)
+        if parent is None or parent[:2] != ("node", node):
+            self._start(run_id, "node", node)
+
+    def on_chain_end(self, outputs, *, run_id, **kwargs):
+        self._end(run_id)
+
+    def on_chain_error(self, error, *, run_id, **kwargs):
+        self._end(run_id, ok=False)
+
+
+metrics_handler = MetricsCallbackHandler()
+
+# langchain adds the handler held by this var to every callback manager it configures, so every run
+# (graph nodes, agents on worker threads, direct tool calls) is measured without passing callbacks around
+_active_handler = contextvars.ContextVar("metrics_handler", default=metrics_handler if METRICS_ENABLED else None)
+register_configure_hook(_active_handler, inheritable=True)
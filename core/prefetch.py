@@ -0,0 +1,202 @@
+'''
+background warm-up of everything a query about a watched ticker reads, so the agents answer from
+cache instead of waiting on FMP:
+
+- market movers, and per watched ticker its quote, profile, statements, ratios, ratings and news,
+  each refreshed once PREFETCH_REFRESH_AT of its ENDPOINT_TTLS entry has passed, i.e. before a
+  reader could find it expired. profiles and quotes go out as one comma separated lookup.
+- documents dropped into the corpus, handed to the background ingestion as soon as they appear.
+
+prefetching spends at most PREFETCH_BUDGET_PER_MINUTE FMP requests a minute (and
+PREFETCH_DAILY_BUDGET a day when set); what doesn't fit waits for the next tick, so user
+traffic keeps the rest of the plan's quota.
+
+    PREFETCH_WATCHLIST=AAPL,MSFT,nvidia python -m core.prefetch
+
+runs it in the foreground, which with FMP_CACHE_PATH set keeps a shared disk cache warm for
+other processes. the app and the HTTP service start it on a background thread.
+'''
+import os
+import threading
+import time
+from collections import Counter
+
+import requests
+
+from core import analytics
+from core.concurrency import run_parallel
+from core.fmp import FMP_RATE_LIMIT, RateLimiter, cache_key, get_client, ttl_for
+from core.metrics import incr
+from core.tickers import resolve_ticker
+
+# comma separated symbols or company names, and/or a file with one per line
+PREFETCH_WATCHLIST = os.getenv("PREFETCH_WATCHLIST", "")
+PREFETCH_WATCHLIST_FILE = os.getenv("PREFETCH_WATCHLIST_FILE")
+PREFETCH_BUDGET_PER_MINUTE = int(os.getenv("PREFETCH_BUDGET_PER_MINUTE", str(max(1, FMP_RATE_LIMIT // 4))))
+PREFETCH_DAILY_BUDGET = int(os.getenv("PREFETCH_DAILY_BUDGET", "0"))
+PREFETCH_REFRESH_AT = float(os.getenv("PREFETCH_REFRESH_AT", "0.8"))
+PREFETCH_TICK = float(os.getenv("PREFETCH_TICK", "10"))
+# a failed refresh is retried after this many seconds (or the ttl, if shorter)
+PREFETCH_RETRY = 60
+# same limit get_stock_news uses by default, so the cache key matches
+NEWS_LIMIT = 5
+# symbols per comma separated lookup, as in FMPClient.get_many
+MULTI_CHUNK = 50
+
+MARKET_REQUESTS = [("stock_market/gainers", {}), ("stock_market/losers", {})]
+# endpoints fetched for many symbols in one request
+MULTI_ENDPOINTS = ("profile", "quote")
+
+_state_lock = threading.Lock()
+_prefetcher = None
+
+
+def watchlist(entries=None):
+    if entries is None:
+        entries = PREFETCH_WATCHLIST.split(",")
+        if PREFETCH_WATCHLIST_FILE and os.path.exists(PREFETCH_WATCHLIST_FILE):
+            with open(PREFETCH_WATCHLIST_FILE, encoding="utf-8") as f:
+                entries += f.readlines()
+    tickers = []
+    for entry in entries:
+        entry = entry.strip()
+        if entry and not entry.startswith("#"):
+            tickers.append(resolve_ticker(entry) or entry.upper().lstrip("$"))
+    return list(dict.fromkeys(tickers))
+
+
+def ticker_requests(ticker):
+    '''(path, params) of the single symbol requests the agent tools make, with the params they use'''
+    requests_ = [(path.format(ticker=ticker), dict(params)) for path, params, _ in analytics.ENDPOINTS.values()]
+    requests_.append((f"rating/{ticker}", {}))
+    requests_.append(("stock_news", {"tickers": ticker, "limit": NEWS_LIMIT}))
+    return requests_
+
+
+def warm_documents():
+    '''starts the background ingestion when a corpus file is new or changed since it was indexed'''
+    from retriever.ingest import is_current, start_ingest
+    from retriever.vectorstore import corpus_files
+    if not all(is_current(path, metadata) for path, _, metadata in corpus_files()):
+        start_ingest()
+        return True
+    return False
+
+
+class Prefetcher:
+    '''
+    keeps the FMP cache warm for `tickers`. run_once() refreshes every job that is due and fits in
+    the budget; run() calls it every PREFETCH_TICK seconds until stop().
+    a job is ("get", path, params) or ("many", endpoint, symbols).
+    '''
+
+    def __init__(self, tickers, budget_per_minute=PREFETCH_BUDGET_PER_MINUTE, daily_budget=PREFETCH_DAILY_BUDGET,
+                 refresh_at=PREFETCH_REFRESH_AT, tick=PREFETCH_TICK, documents=True):
+        self.tickers = list(tickers)
+        self.limiter = RateLimiter(budget_per_minute)
+        self.daily_budget = daily_budget
+        self.refresh_at = refresh_at
+        self.tick = tick
+        self.documents = documents
+        self.due = {}
+        self.spent = Counter()
+        self.stats = Counter()
+        self._stop = threading.Event()
+
+    def jobs(self):
+        jobs = {}
+        if not self.tickers:
+            return jobs
+        for path, params in MARKET_REQUESTS:
+            jobs[cache_key(path, params)] = ("get", path, params)
+        for endpoint in MULTI_ENDPOINTS:
+            for i in range(0, len(self.tickers), MULTI_CHUNK):
+                chunk = tuple(self.tickers[i:i + MULTI_CHUNK])
+                jobs[f"{endpoint}/{','.join(chunk)}"] = ("many", endpoint, chunk)
+        for ticker in self.tickers:
+            for path, params in ticker_requests(ticker):
+                jobs[cache_key(path, params)] = ("get", path, params)
+        return jobs
+
+    def spend(self):
+        '''takes one request from the budget, False when the minute's or the day's share is used up'''
+        today = time.strftime("%Y-%m-%d")
+        if self.daily_budget and self.spent[today] >= self.daily_budget:
+            return False
+        if not self.limiter.try_acquire():
+            return False
+        self.spent = Counter({today: self.spent[today] + 1})
+        return True
+
+    def run_job(self, job):
+        kind, path, params = job
+        client = get_client()
+        try:
+            if kind == "many":
+                # get_many caches each record under the single symbol key
+                if not client.get_many(path, params, chunk_size=MULTI_CHUNK):
+                    incr("prefetch_requests", result="error")
+                    return False
+            else:
+                client.cache.set(cache_key(path, params), client.fetch_json(path, **params), ttl_for(path))
+        except requests.exceptions.RequestException:
+            incr("prefetch_requests", result="error")
+            return False
+        incr("prefetch_requests", result="ok")
+        return True
+
+    def run_once(self):
+        '''refreshes the due jobs the budget allows, most overdue first; returns how many ran'''
+        now = time.monotonic()
+        jobs = self.jobs()
+        due = sorted((self.due.get(key, 0.0), key) for key in jobs if self.due.get(key, 0.0) <= now)
+        work = []
+        for _, key in due:
+            if not self.spend():
+                self.stats["deferred"] += len(due) - len(work)
+                incr("prefetch_deferred", len(due) - len(work))
+                break
+            work.append(key)
+
+        results = run_parallel([lambda job=jobs[key]: self.run_job(job) for key in work])
+        for key, ok in zip(work, results):
+            ttl = ttl_for(jobs[key][1])
+            self.due[key] = now + (ttl * self.refresh_at if ok else min(ttl, PREFETCH_RETRY))
+            self.stats["refreshed" if ok else "failed"] += 1
+        # forget jobs of tickers no longer watched
+        self.due = {key: due_at for key, due_at in self.due.items() if key in jobs}
+        return len(work)
+
+    def run(self):
+        while not self._stop.is_set():
+            try:
+                self.run_once()
+                if self.documents:
+                    warm_documents()
+            except Exception as e:
+                print(f"---PREFETCH FAILED: {e}---", flush=True)
+            self._stop.wait(self.tick)
+
+    def stop(self):
+        self._stop.set()
+
+
+def start_prefetch(tickers=None):
+    '''runs a Prefetcher for the configured watchlist on a daemon thread; returns it, or the one already running'''
+    global _prefetcher
+    with _state_lock:
+        if _prefetcher is None:
+            _prefetcher = Prefetcher(watchlist() if tickers is None else tickers)
+            threading.Thread(target=_prefetcher.run, name="prefetch", daemon=True).start()
+        return _prefetcher
+
+
+def current_prefetcher():
+    '''the Prefetcher start_prefetch() started, None before that'''
+    return _prefetcher
+
+
+if __name__ == "__main__":
+    tickers = watchlist()
+    print(f"---PREFETCH {', '.join(tickers) or 'documents only'}---", flush=True)
+    Prefetcher(tickers).run()
@@ -0,0 +1,128 @@
+import os
+import threading
+from collections import Counter
+
+from dotenv import load_dotenv
+
+load_dotenv()
+
+DEFAULT_MODEL = "gemma2-9b-it"
+EMBEDDING_MODEL = "sentence-transformers/all-MiniLM-L6-v2"
+
+
+class Registry:
+    '''
+    process wide store of expensive objects (llm clients, embeddings, prompts, executors).
+    each key is built once; concurrent first calls for the same key wait on a per key lock
+    so the factory never runs twice. hits/misses are counted per key.
+    '''
+
+    def __init__(self):
+        self._items = {}
+        self._locks = {}
+        self._lock = threading.Lock()
+        self.hits = Counter()
+        self.misses = Counter()
+
+    def get_or_create(self, key, factory):
+        item = self._items.get(key)
+        if item is not None:
+            with self._lock:
+                self.hits[key] += 1
+            return item
+
+        with self._lock:
+            key_lock = self._locks.setdefault(key, threading.Lock())
+
+        with key_lock:
+            item = self._items.get(key)
+            if item is not None:
+                with self._lock:
+                    self.hits[key] += 1
+                return item
+            item = factory()
+            self._items[key] = item
+            with self._lock:
+                self.misses[key] += 1
+            return item
+
+    def stats(self):
+        with self._lock:
+            return {
+                str(key): {"hits": self.hits[key], "builds": self.misses[key]}
+                for key in self._items
+            }
+
+    def clear(self):
+        with self._lock:
+            self._items.clear()
+            self._locks.clear()
+            self.hits.clear()
+            self.misses.clear()
+
+
+registry = Registry()
+
+
+def get_llm(model=DEFAULT_MODEL, temperature=None):
+    def build():
+        from langchain_groq import ChatGroq
+        if temperature is None:
+            return ChatGroq(model=model)
+        return ChatGroq(model=model, temperature=temperature)
+    return registry.get_or_create(("llm", model, temperature), build)
+
+
+# graph nodes whose model can be chosen with MODEL_<NODE>, e.g. MODEL_SUMMARY="llama-3.1-8b-instant,gemma2-9b-it"
+NODES = ("planner", "router", "summary", "agent", "evaluator")
+
+
+def node_models(node):
+    '''models configured for a node, cheapest first (later ones are fallbacks); DEFAULT_MODEL when unset'''
+    value = os.getenv(f"MODEL_{node.upper()}")
+    models = [m.strip() for m in value.split(",") if m.strip()] if value else []
+    return models or [DEFAULT_MODEL]
+
+
+def get_node_llm(node, tier=0, temperature=None):
+    models = node_models(node)
+    return get_llm(models[min(tier, len(models) - 1)], temperature)
+
+
+def get_websearch():
+    def build():
+        from langchain_tavily import TavilySearch
+        return TavilySearch()
+    return registry.get_or_create(("websearch",), build)
+
+
+def get_embeddings(model_name=EMBEDDING_MODEL):
+    def build():
+        from langchain_huggingface import HuggingFaceEmbeddings
+        return HuggingFaceEmbeddings(model_name=model_name)
+    return registry.get_or_create(("embeddings", model_name), build)
+
+
+def get_prompt(name, messages):
+    '''
+    messages are only used the first time `name` is requested
+    '''
+    def build():
+        from langchain_core.prompts import ChatPromptTemplate
+        return ChatPromptTemplate.from_messages(messages)
+    return registry.get_or_create(("prompt", name), build)
+
+
+def get_executor(name, llm, tools, prompt, verbose=True, provider="groq"):
+    '''
+    AgentExecutor for a fixed (llm, tools, prompt) combination, keyed by `name`.
+    executors hold no per call state so one instance can serve concurrent invokes.
+    each of the agent's async LLM calls takes a provider_limit(provider) slot of its own.
+    '''
+    def build():
+        from langchain.agents import AgentExecutor, create_tool_calling_agent
+        from langchain.agents.agent import RunnableMultiActionAgent
+        from core.concurrency import limited_runnable
+        agent = limited_runnable(create_tool_calling_agent(llm, tools, prompt), provider)
+        return AgentExecutor(agent=RunnableMultiActionAgent(runnable=agent), tools=tools, verbose=verbose)
+    return registry.get_or_create(("executor", name), build)
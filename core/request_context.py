@@ -0,0 +1,99 @@
+'''
+everything one request owns, in a single contextvar. the section workers, the evaluator's reruns
+and the agents run in copies of the request's context (threads through run_parallel, tasks through
+asyncio), so what is set at the start of a request is visible to all of them:
+
+    scope    core.request_scope.RequestScope: the ticker and the FMP/web fetches the workers share
+    metrics  core.metrics.Recorder: the request's own timings and counters
+    logs     the agents' captured transcripts (agents.capture), the last AGENT_LOG_MAX_ENTRIES
+'''
+import asyncio
+import contextvars
+import os
+from collections import deque
+from contextlib import contextmanager
+
+AGENT_LOG_MAX_ENTRIES = int(os.getenv("AGENT_LOG_MAX_ENTRIES", "50"))
+
+
+class RequestContext:
+
+    def __init__(self, topic=None):
+        from core.metrics import Recorder
+        from core.request_scope import RequestScope
+
+        self.topic = topic
+        self.scope = RequestScope(topic)
+        self.metrics = Recorder()
+        self.logs = deque(maxlen=AGENT_LOG_MAX_ENTRIES)
+
+
+_request = contextvars.ContextVar("request", default=None)
+
+
+def start_request(topic=None):
+    '''
+    gives the current context (and every thread/task spawned from it) a RequestContext, unless it
+    already has one, e.g. orchestrate() running inside the evaluator's request.
+    returns a token for end_request().
+    '''
+    if _request.get() is not None:
+        return None
+    return _request.set(RequestContext(topic))
+
+
+def end_request(token):
+    if token is not None:
+        _request.reset(token)
+
+
+def current_request():
+    return _request.get()
+
+
+@contextmanager
+def request_context(topic=None):
+    '''start_request() ... end_request() around a block; yields the RequestContext'''
+    token = start_request(topic)
+    try:
+        yield _request.get()
+    finally:
+        end_request(token)
+
+
+def request_stream(topic, events):
+    '''
+    yields from the generator `events` inside a request of its own. every step runs in a private copy
+    of the caller's context, so the request never lands in the caller's context, however far the
+    stream is consumed; closing the stream closes `events` in that copy too.
+    '''
+    context = contextvars.copy_context()
+    context.run(start_request, topic)
+    try:
+        while True:
+            try:
+                event = context.run(next, events)
+            except StopIteration:
+                return
+            yield event
+    finally:
+        context.run(events.close)
+
+
+async def arequest_stream(topic, events):
+    '''request_stream() for async generators, each step is awaited as a task bound to the private context'''
+    context = contextvars.copy_context()
+    context.run(start_request, topic)
+
+    async def step():
+        return await events.__anext__()
+
+    try:
+        while True:
+            try:
+                event = await asyncio.create_task(step(), context=context)
+            except StopAsyncIteration:
+                return
+            yield event
+    finally:
+        await asyncio.create_task(events.aclose(), context=context)
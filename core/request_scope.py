@@ -0,0 +1,113 @@
+'''
+data shared by every worker of one analysis, held by the request's RequestContext
+(core.request_context) so the three section workers and the evaluator's reruns of rejected
+sections all see it:
+
+- the ticker is resolved once from the request topic
+- identical FMP and web search calls are made once per request; a worker asking for something
+  another worker is still fetching waits for that fetch instead of repeating it, and every
+  section sees the same snapshot of the data
+'''
+import asyncio
+import json
+import threading
+from collections import Counter
+from concurrent.futures import Future
+
+from core.metrics import incr
+from core.request_context import current_request
+from core.tickers import resolve_ticker
+
+
+class RequestScope:
+    '''
+    per request memo of fetched values keyed by any hashable. fetch() and afetch() can be mixed:
+    the first caller of a key runs it, everyone else (thread or task) waits on its future.
+    a failed fetch is not remembered, the next caller tries again.
+    '''
+
+    def __init__(self, topic=None):
+        self.topic = topic
+        self._futures = {}
+        self._lock = threading.Lock()
+        self.stats = Counter()
+
+    def _claim(self, key):
+        '''(future, leader); counts the lookup'''
+        with self._lock:
+            future = self._futures.get(key)
+            if future is None:
+                future = self._futures[key] = Future()
+                result = "miss"
+            else:
+                result = "hit" if future.done() else "merged"
+            self.stats[result] += 1
+        incr("shared_fetches", result=result)
+        return future, result == "miss"
+
+    def _fail(self, key, future, error):
+        with self._lock:
+            self._futures.pop(key, None)
+        future.set_exception(error)
+
+    def fetch(self, key, fn):
+        future, leader = self._claim(key)
+        if not leader:
+            return future.result()
+        try:
+            value = fn()
+        except BaseException as e:
+            self._fail(key, future, e)
+            raise
+        future.set_result(value)
+        return value
+
+    async def afetch(self, key, fn):
+        '''async fetch(); `fn` returns an awaitable'''
+        future, leader = self._claim(key)
+        if not leader:
+            # shielded so a cancelled waiter doesn't cancel the fetch the others are waiting on
+            return await asyncio.shield(asyncio.wrap_future(future))
+        try:
+            value = await fn()
+        except BaseException as e:
+            self._fail(key, future, e)
+            raise
+        future.set_result(value)
+        return value
+
+
+def current_scope():
+    request = current_request()
+    return request.scope if request is not None else None
+
+
+def shared(key, fn):
+    '''fn() made at most once per request for `key`; just fn() outside a request'''
+    scope = current_scope()
+    return fn() if scope is None else scope.fetch(key, fn)
+
+
+async def ashared(key, fn):
+    scope = current_scope()
+    return await fn() if scope is None else await scope.afetch(key, fn)
+
+
+def request_ticker(text):
+    '''the ticker of the request topic, resolved once per request, else whatever `text` names'''
+    scope = current_scope()
+    ticker = shared("ticker", lambda: resolve_ticker(scope.topic)) if scope and scope.topic else None
+    return ticker or resolve_ticker(text)
+
+
+def web_query(query):
+    '''
+    the query a section's web search runs: the request topic when there is one, so the market and
+    risk sections share a single search, else `query` itself
+    '''
+    scope = current_scope()
+    return scope.topic if scope is not None and scope.topic else query
+
+
+def args_key(name, args):
+    return (name, json.dumps(args, sort_keys=True, default=str))
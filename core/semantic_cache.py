@@ -0,0 +1,121 @@
+import hashlib
+import math
+import os
+import re
+import threading
+import time
+
+from core.cache import TTLCache
+from core.fmp import ttl_for
+from core.metrics import incr, span
+from core.registry import get_embeddings, registry
+from core.tickers import find_tickers, company_words
+
+SIMILARITY_THRESHOLD = float(os.getenv("SEMANTIC_CACHE_THRESHOLD", "0.88"))
+SEMANTIC_CACHE_SIZE = int(os.getenv("SEMANTIC_CACHE_SIZE", "512"))
+# a report is only as fresh as the fastest-moving data in it (movers/news)
+REPORT_TTL = float(os.getenv("SEMANTIC_CACHE_TTL", min(ttl_for("stock_market/gainers"), ttl_for("stock_news"))))
+GRADE_TTL = float(os.getenv("GRADE_CACHE_TTL", 24 * 3600))
+
+_FILLER = {
+    "a", "an", "the", "of", "for", "on", "about", "me", "give", "please", "can", "you", "i", "want",
+    "analyze", "analyse", "analysis", "report", "tell", "show", "do", "and", "company", "stock",
+    "what", "is", "how", "s", "provide", "run", "full",
+}
+
+
+def normalize_query(query):
+    '''
+    lower-cases, drops filler words and replaces the company names with their tickers.
+    returns (tickers, normalized); tickers is "AAPL", "NVDA,AMD" or None when no company resolves.
+    '''
+    tickers = find_tickers(query)
+    skip = set(_FILLER)
+    for ticker in tickers:
+        skip |= company_words(ticker)
+    words = [w for w in re.findall(r"[a-z0-9&.\-]+", query.lower()) if w not in skip]
+    text = " ".join(words)
+    key = ",".join(tickers) or None
+    return key, f"{key} {text}".strip() if key else text
+
+
+def cosine(a, b):
+    dot = sum(x * y for x, y in zip(a, b))
+    norm = math.sqrt(sum(x * x for x in a)) * math.sqrt(sum(y * y for y in b))
+    return dot / norm if norm else 0.0
+
+
+class SemanticCache:
+    '''
+    caches finished reports by query meaning. a lookup only matches entries for the same resolved
+    tickers that are younger than their ttl and whose normalised query embedding is within the
+    similarity threshold, so "analyze apple" and "give me an analysis of AAPL" share a report.
+    queries naming no known company only match the exact same normalised query: without a ticker
+    "financial rivian" and "financial lucid" are too close to tell apart by embedding.
+    '''
+
+    def __init__(self, threshold=SIMILARITY_THRESHOLD, ttl=REPORT_TTL, max_entries=SEMANTIC_CACHE_SIZE):
+        self.threshold = threshold
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._entries = []
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def _embed(self, text):
+        with span("embedding", "query"):
+            return get_embeddings().embed_query(text)
+
+    def lookup(self, query):
+        ticker, normalized = normalize_query(query)
+        now = time.time()
+        with self._lock:
+            self._entries = [e for e in self._entries if e["expires"] > now]
+            candidates = [e for e in self._entries if e["ticker"] == ticker]
+            exact = next((e for e in candidates if e["normalized"] == normalized), None)
+        if exact is None and candidates and ticker is not None:
+            vector = self._embed(normalized)
+            scored = [(cosine(vector, e["vector"]), e) for e in candidates]
+            score, best = max(scored, key=lambda pair: pair[0])
+            exact = best if score >= self.threshold else None
+        with self._lock:
+            if exact is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+        incr("cache_requests", cache="semantic", result="misses" if exact is None else "hits")
+        return exact["report"] if exact is not None else None
+
+    def store(self, query, report, ttl=None):
+        ticker, normalized = normalize_query(query)
+        vector = self._embed(normalized) if ticker is not None else None
+        entry = {
+            "ticker": ticker,
+            "normalized": normalized,
+            "vector": vector,
+            "report": report,
+            "expires": time.time() + (ttl or self.ttl),
+        }
+        with self._lock:
+            self._entries = [e for e in self._entries if e["normalized"] != normalized]
+            self._entries.append(entry)
+            if len(self._entries) > self.max_entries:
+                self._entries = self._entries[-self.max_entries:]
+
+    def stats(self):
+        with self._lock:
+            return {"entries": len(self._entries), "hits": self.hits, "misses": self.misses}
+
+
+def get_semantic_cache():
+    return registry.get_or_create(("semantic_cache",), SemanticCache)
+
+
+def get_grade_cache():
+    '''evaluator verdicts keyed by report hash, an identical report is graded once'''
+    return registry.get_or_create(("grade_cache",), lambda: TTLCache(max_entries=SEMANTIC_CACHE_SIZE, name="grade"))
+
+
+def report_hash(report):
+    return hashlib.sha256(report.encode("utf-8")).hexdigest()
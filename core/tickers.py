@@ -0,0 +1,154 @@
+import csv
+import os
+import re
+import threading
+
+from core.registry import registry
+
+# optional csv with `symbol,name` rows (e.g. an export of FMP's /stock/list) to extend the built-in index
+TICKER_INDEX_PATH = os.getenv("TICKER_INDEX_PATH")
+
+# common names and aliases -> symbol; enough for the usual large caps without any network call
+BUILTIN_TICKERS = {
+    "apple": "AAPL", "microsoft": "MSFT", "google": "GOOGL", "alphabet": "GOOGL", "amazon": "AMZN",
+    "meta": "META", "facebook": "META", "tesla": "TSLA", "nvidia": "NVDA", "netflix": "NFLX",
+    "intel": "INTC", "amd": "AMD", "advanced micro devices": "AMD", "ibm": "IBM", "oracle": "ORCL",
+    "salesforce": "CRM", "adobe": "ADBE", "cisco": "CSCO", "qualcomm": "QCOM", "broadcom": "AVGO",
+    "paypal": "PYPL", "uber": "UBER", "airbnb": "ABNB", "spotify": "SPOT", "shopify": "SHOP",
+    "berkshire hathaway": "BRK-B", "berkshire": "BRK-B", "jpmorgan": "JPM", "jp morgan": "JPM",
+    "goldman sachs": "GS", "morgan stanley": "MS", "bank of america": "BAC", "wells fargo": "WFC",
+    "citigroup": "C", "visa": "V", "mastercard": "MA", "american express": "AXP",
+    "johnson & johnson": "JNJ", "johnson and johnson": "JNJ", "pfizer": "PFE", "moderna": "MRNA",
+    "merck": "MRK", "eli lilly": "LLY", "abbvie": "ABBV", "unitedhealth": "UNH",
+    "walmart": "WMT", "costco": "COST", "target": "TGT", "home depot": "HD", "mcdonalds": "MCD",
+    "mcdonald's": "MCD", "starbucks": "SBUX", "nike": "NKE", "coca cola": "KO", "coca-cola": "KO",
+    "pepsi": "PEP", "pepsico": "PEP", "procter & gamble": "PG", "procter and gamble": "PG",
+    "disney": "DIS", "walt disney": "DIS", "boeing": "BA", "exxon": "XOM", "exxon mobil": "XOM",
+    "chevron": "CVX", "ford": "F", "general motors": "GM", "at&t": "T", "verizon": "VZ",
+    "comcast": "CMCSA", "caterpillar": "CAT", "3m": "MMM", "palantir": "PLTR", "snowflake": "SNOW",
+    "tsmc": "TSM", "taiwan semiconductor": "TSM", "alibaba": "BABA", "sony": "SONY", "toyota": "TM",
+    "infosys": "INFY", "asml": "ASML", "samsung": "005930.KS",
+}
+
+# names that are also everyday words ("price target", "a travel visa"), only matched when capitalised
+_CAPITALISED_ONLY = {"target", "visa", "meta", "ford", "oracle", "intel", "caterpillar", "snowflake"}
+
+# upper-case words that look like symbols but aren't
+_NOT_TICKERS = {"A", "I", "AI", "CEO", "CFO", "USA", "US", "EPS", "PE", "FY", "Q1", "Q2", "Q3", "Q4",
+                "ETF", "IPO", "ROE", "ROA", "EBIT", "EBITDA", "GDP", "SEC"}
+
+
+# legal suffixes dropped from FMP company names, "Rivian Automotive, Inc." is matched as "rivian automotive"
+_NAME_SUFFIXES = re.compile(r"[,.]?\s+(?:inc|corp|corporation|co|company|ltd|limited|plc|ag|sa|nv|se|holdings?|group|class [a-c])\.?$")
+
+_index_lock = threading.Lock()
+
+
+def _build_index():
+    names = dict(BUILTIN_TICKERS)
+    if TICKER_INDEX_PATH and os.path.exists(TICKER_INDEX_PATH):
+        with open(TICKER_INDEX_PATH, newline='', encoding='utf-8') as f:
+            for row in csv.DictReader(f):
+                symbol, name = row.get("symbol"), row.get("name")
+                if symbol and name:
+                    names.setdefault(name.strip().lower(), symbol.strip().upper())
+    return _index_of(names, set(names.values()))
+
+
+def _index_of(names, symbols):
+    # longest names first so "bank of america" wins over "america"
+    return names, frozenset(symbols), sorted(names, key=len, reverse=True)
+
+
+def _current():
+    # a one slot holder: add_companies() swaps in a new index, readers keep the one they loaded
+    return registry.get_or_create(("ticker_index",), lambda: [_build_index()])
+
+
+def load_index():
+    '''(names, symbols, ordered); a snapshot that is never changed in place'''
+    return _current()[0]
+
+
+def short_name(name):
+    name = name.strip().lower()
+    while True:
+        shorter = _NAME_SUFFIXES.sub("", name).strip(" ,.")
+        if shorter == name:
+            return name
+        name = shorter
+
+
+def add_companies(companies):
+    '''
+    adds {symbol: company name or None} to the index for the rest of the process, e.g. symbols FMP
+    confirmed with a profile, so they resolve like the built-in ones
+    '''
+    current = _current()
+    with _index_lock:
+        names, symbols, _ = current[0]
+        names, symbols = dict(names), set(symbols)
+        for symbol, name in companies.items():
+            symbol = symbol.strip().upper()
+            symbols.add(symbol)
+            if name and short_name(name):
+                names.setdefault(short_name(name), symbol)
+        current[0] = _index_of(names, symbols)
+
+
+def find_tickers(text):
+    '''
+    every company symbol named in free text, in the order they appear: explicit symbols ("AAPL",
+    "$aapl"), known company names and lower-case symbols of 4+ letters. where names overlap the
+    longest one wins ("bank of america" over "america").
+    '''
+    names, symbols, ordered = load_index()
+    found = []
+    taken = []
+
+    def free(start, end):
+        return all(end <= s or start >= e for s, e in taken)
+
+    for m in re.finditer(r"\$?[A-Za-z][A-Za-z0-9.\-]{0,9}", text):
+        # "AAPL." at the end of a sentence
+        token = m.group().lstrip("$").rstrip(".-")
+        explicit = m.group().startswith("$")
+        if (explicit or token.isupper()) and token.upper() in symbols and token.upper() not in _NOT_TICKERS:
+            found.append((m.start(), token.upper()))
+            taken.append(m.span())
+
+    lowered = text.lower()
+    for name in ordered:
+        if name in _CAPITALISED_ONLY:
+            pattern, haystack = re.escape(name[0].upper() + name[1:]), text
+        else:
+            pattern, haystack = re.escape(name), lowered
+        for m in re.finditer(rf"(?<![\w]){pattern}(?![\w])", haystack):
+            if free(*m.span()):
+                found.append((m.start(), names[name]))
+                taken.append(m.span())
+
+    # lower-case symbols ("analyze aapl"), short ones are too likely to be ordinary words
+    for m in re.finditer(r"[A-Za-z][A-Za-z0-9.\-]{3,9}", text):
+        token = m.group().rstrip(".-")
+        if token.upper() in symbols and token.lower() not in _CAPITALISED_ONLY and free(*m.span()):
+            found.append((m.start(), token.upper()))
+            taken.append(m.span())
+
+    return list(dict.fromkeys(symbol for _, symbol in sorted(found)))
+
+
+def resolve_ticker(text):
+    '''the first company named in free text (see find_tickers), None when nothing matches'''
+    tickers = find_tickers(text)
+    return tickers[0] if tickers else None
+
+
+def company_words(ticker):
+    '''words of every known name for `ticker`, plus the symbol itself, lower-cased'''
+    names, _, _ = load_index()
+    words = {ticker.lower()}
+    for name, symbol in names.items():
+        if symbol == ticker:
+            words.update(re.findall(r"[a-z0-9&.\-]+", name))
+    return words
@@ -0,0 +1,75 @@
+from langchain_core.tools import StructuredTool
+
+from core.compaction import compact_web_results
+from core.concurrency import provider_limit
+from core.registry import get_websearch, registry
+from core.request_scope import shared, ashared, args_key
+
+
+def with_coroutine(sync_tool, coroutine, name=None):
+    '''
+    returns a copy of a @tool decorated function that also has a native async implementation,
+    so `ainvoke` awaits `coroutine` instead of pushing the sync body onto a thread.
+    description and args schema are kept; `name` renames the tool the LLM sees.
+    '''
+    return StructuredTool.from_function(
+        func=sync_tool.func,
+        coroutine=coroutine,
+        name=name or sync_tool.name,
+        description=sync_tool.description,
+        args_schema=sync_tool.args_schema,
+    )
+
+
+def limited_tool(base_tool, provider):
+    '''copy of a tool whose async calls each take a provider_limit(provider) slot, e.g. inside an agent loop'''
+    def func(**kwargs):
+        return base_tool.invoke(kwargs)
+
+    async def coroutine(**kwargs):
+        async with provider_limit(provider):
+            return await base_tool.ainvoke(kwargs)
+
+    return StructuredTool.from_function(
+        func=func,
+        coroutine=coroutine,
+        name=base_tool.name,
+        description=base_tool.description,
+        args_schema=base_tool.args_schema,
+    )
+
+
+def shared_tool(base_tool):
+    '''
+    copy of a tool whose calls with identical arguments are made once per request (core.request_scope),
+    e.g. the same web search asked for by two section agents
+    '''
+    def func(**kwargs):
+        return shared(args_key(base_tool.name, kwargs), lambda: base_tool.invoke(kwargs))
+
+    async def coroutine(**kwargs):
+        return await ashared(args_key(base_tool.name, kwargs), lambda: base_tool.ainvoke(kwargs))
+
+    return StructuredTool.from_function(
+        func=func,
+        coroutine=coroutine,
+        name=base_tool.name,
+        description=base_tool.description,
+        args_schema=base_tool.args_schema,
+    )
+
+
+def get_shared_websearch():
+    return registry.get_or_create(("websearch", "shared"), lambda: shared_tool(limited_tool(get_websearch(), "tavily")))
+
+
+def web_search(query):
+    '''compacted web results for `query`, searched once per request'''
+    return shared(args_key("web_search", {"query": query}), lambda: compact_web_results(get_websearch().invoke({"query": query})))
+
+
+async def aweb_search(query):
+    async def search():
+        async with provider_limit("tavily"):
+            return compact_web_results(await get_websearch().ainvoke({"query": query}))
+    return await ashared(args_key("web_search", {"query": query}), search)
@@ -0,0 +1,17 @@
+import importlib
+
+# entry points resolved on first attribute access, `import graphs` alone loads nothing heavy
+_LAZY = {
+    "final_result": "graphs.evalulator",
+    "afinal_result": "graphs.evalulator",
+    "stream_final_result": "graphs.evalulator",
+    "astream_final_result": "graphs.evalulator",
+    "orchestrate": "graphs.orchestrator",
+    "aorchestrate": "graphs.orchestrator",
+}
+
+
+def __getattr__(name):
+    if name in _LAZY:
+        return getattr(importlib.import_module(_LAZY[name]), name)
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
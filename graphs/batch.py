@@ -0,0 +1,150 @@
+import contextvars
+import json
+import os
+import re
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+import requests
+
+from core import analytics
+from core.fmp import get_client, pinned_responses, cache_key
+from core.tickers import resolve_ticker, add_companies, company_words
+
+BATCH_CONCURRENCY = int(os.getenv("BATCH_CONCURRENCY", "4"))
+TICKER_QUERY = "Give a financial, market and risk analysis of {ticker}"
+# an upper-case (or $-prefixed) entry shaped like this that the local index doesn't resolve is taken
+# as a symbol anyway; prefetch_shared() checks it against FMP profiles
+SYMBOL_SHAPE = re.compile(r"\$?[A-Za-z][A-Za-z0-9]{0,5}(?:[.\-][A-Za-z0-9]{1,2})?")
+
+
+def bare_company(entry, ticker):
+    """True when the entry is nothing but the symbol or a name of `ticker` ("TESLA", "bank of america")."""
+    words = re.findall(r"[a-z0-9&.\-]+", entry.lower().lstrip("$"))
+    return bool(words) and set(words) <= company_words(ticker)
+
+
+def batch_items(entries):
+    """
+    Turns watchlist lines into work items. A bare symbol or company name ("AAPL", "RIVN", "$sofi",
+    "TESLA") becomes the standard analysis query for it, anything else is used as a free text query.
+    """
+    items = []
+    for entry in entries:
+        entry = entry.strip()
+        if not entry or entry.startswith("#"):
+            continue
+        ticker = resolve_ticker(entry)
+        if ticker is None and SYMBOL_SHAPE.fullmatch(entry) and (entry.isupper() or entry.startswith("$")):
+            ticker = entry.lstrip("$").upper()
+        if ticker and bare_company(entry, ticker):
+            items.append({"id": ticker, "ticker": ticker, "query": TICKER_QUERY.format(ticker=ticker)})
+        else:
+            items.append({"id": entry, "ticker": ticker, "query": entry})
+    return list({item["id"]: item for item in items}.values())
+
+
+def completed_ids(out_path):
+    """Ids already written successfully by a previous (possibly crashed) run of the same batch."""
+    done = set()
+    if not os.path.exists(out_path):
+        return done
+    with open(out_path, encoding="utf-8") as f:
+        for line in f:
+            try:
+                row = json.loads(line)
+            except json.JSONDecodeError:
+                # a crash mid-write leaves at most one partial last line
+                continue
+            if row.get("status") == "ok":
+                done.add(row["id"])
+    return done
+
+
+def ends_with_newline(path):
+    with open(path, "rb") as f:
+        f.seek(-1, os.SEEK_END)
+        return f.read(1) == b"\n"
+
+
+def prefetch_shared(items):
+    """
+    Data every item needs or that FMP serves for many symbols in one request: profiles and
+    quotes via comma separated lookups, market movers once for the whole batch, and the
+    fundamentals analytics of every symbol in one vectorized pass (which also warms the cache
+    the statement and ratio tools read).
+    symbols FMP has a profile for are added to the ticker index, so the analysis resolves them
+    too; when the profile lookup answers at all, symbols it doesn't know are returned as unknown.
+    returns (quotes by symbol, pinned responses for the batch, analytics result, unknown symbols)
+    """
+    client = get_client()
+    symbols = list(dict.fromkeys(item["ticker"] for item in items if item["ticker"]))
+    profiles = client.get_many("profile", symbols)
+    add_companies({symbol: record.get("companyName") for symbol, record in profiles.items()})
+    unknown = {s for s in symbols if s not in profiles} if profiles else set()
+    symbols = [s for s in symbols if s not in unknown]
+    quotes = client.get_many("quote", symbols)
+
+    pinned = {}
+    for path in ("stock_market/gainers", "stock_market/losers"):
+        try:
+            pinned[cache_key(path, {})] = client.get_json(path)
+        except requests.exceptions.RequestException:
+            # workers fall back to fetching (and caching) movers themselves
+            pass
+    return quotes, pinned, analytics.analyze_tickers(symbols) if symbols else {}, unknown
+
+
+def run_batch(entries, out_path, concurrency=BATCH_CONCURRENCY, analyze=None):
+    """
+    Analyzes every watchlist entry with at most `concurrency` analyses in flight and appends one JSON
+    line per item to out_path as it finishes. Items already in out_path with status "ok" are skipped,
+    so rerunning after a crash resumes where it stopped. Returns a summary dict.
+    """
+    if analyze is None:
+        from graphs.evalulator import analyze
+
+    items = batch_items(entries)
+    done = completed_ids(out_path)
+    pending = [item for item in items if item["id"] not in done]
+    print(f"---BATCH: {len(items)} items, {len(done)} already done, {len(pending)} to run---", flush=True)
+    if not pending:
+        return {"total": len(items), "skipped": len(done), "ok": 0, "error": 0}
+
+    quotes, pinned, fundamentals, unknown = prefetch_shared(pending)
+    for item in pending:
+        if item["ticker"] in unknown:
+            print(f"---BATCH {item['id']}: no FMP profile for {item['ticker']}, running as free text---", flush=True)
+            item["ticker"] = None
+    counts = {"ok": 0, "error": 0}
+
+    def run_item(item):
+        started = time.monotonic()
+        row = {"id": item["id"], "ticker": item["ticker"], "query": item["query"]}
+        if item["ticker"] in quotes:
+            row["quote"] = quotes[item["ticker"]]
+        if item["ticker"]:
+            row["analytics"] = analytics.ticker_summary(fundamentals, item["ticker"])
+        try:
+            row.update(analyze(item["query"]))
+            row["status"] = "ok"
+        except Exception as e:
+            row["status"] = "error"
+            row["error"] = str(e)
+        row["seconds"] = round(time.monotonic() - started, 3)
+        return row
+
+    with open(out_path, "a", encoding="utf-8") as out, pinned_responses(pinned):
+        if out.tell() and not ends_with_newline(out_path):
+            out.write("\n")
+        with ThreadPoolExecutor(max_workers=concurrency) as pool:
+            futures = [pool.submit(contextvars.copy_context().run, run_item, item) for item in pending]
+            for future in as_completed(futures):
+                row = future.result()
+                out.write(json.dumps(row, default=str) + "\n")
+                out.flush()
+                os.fsync(out.fileno())
+                counts[row["status"]] += 1
+                print(f"---BATCH {row['id']}: {row['status']} ({sum(counts.values())}/{len(pending)})---", flush=True)
+
+    return {"total": len(items), "skipped": len(done), **counts}
@@ -1,16 +1,25 @@
-from graphs.orchestrator import orchestrate
-from langgraph.checkpoint.memory import InMemorySaver
+from graphs.orchestrator import orchestrate, aorchestrate, stream_event, new_config, Section
+from core.concurrency import provider_limit, run_parallel, arun_parallel
+from core.compaction import truncate_tokens, EVALUATOR_BUDGET
+from core.semantic_cache import get_semantic_cache, get_grade_cache, report_hash, GRADE_TTL
+from core.metrics import incr, span, request_metrics
+from core.request_context import request_context, request_stream, arequest_stream
+from agents.capture import request_logs
+from langchain_core.runnables import RunnableLambda
 
+import asyncio
 import os
+import time
+import uuid
 from dotenv import load_dotenv
 load_dotenv()
 
 
-from langchain_groq import ChatGroq
+from core.registry import get_llm, node_models, registry
+from core import cascade
 
 os.environ["GROQ_API_KEY"] = os.getenv("GROQ_API_KEY")
 
-llm = ChatGroq(model="gemma2-9b-it")
 
 
 from typing import Annotated, List
@@ -21,11 +30,24 @@ from langchain_core.messages import HumanMessage, SystemMessage
 
 
 
+# stop regenerating after this many attempts or seconds and return the best attempt so far
+MAX_ITERATIONS = int(os.getenv("EVALUATOR_MAX_ITERATIONS", "3"))
+LATENCY_BUDGET = float(os.getenv("EVALUATOR_LATENCY_BUDGET", "120"))
+
+
 class State(TypedDict):
     result: str
     topic: str
     feedback: str
     good_or_bad: str
+    request_id: str
+    iterations: int
+    started_at: float
+    plan: list
+    section_results: dict
+    section_grades: dict
+    best_result: str
+    best_score: float
 
 
 
@@ -33,62 +55,200 @@ class Feedback(BaseModel):
     grade: Literal["good", "bad"] = Field(
         description="Decide if the result is good or bad according to the query asked. also consider this in a chain, so someexchanges might be not related to input, act accordingly."
     )
+    score: int = Field(
+        default=5,
+        description="Quality of the result from 1 (unusable) to 10 (excellent)."
+    )
     feedback: str = Field(
         description="If the result is bad, provide feedback on how to improve it."
     )
 
-evaluator = llm.with_structured_output(Feedback)
+def get_evaluator(model=None):
+    model = model or node_models("evaluator")[0]
+    return registry.get_or_create(("evaluator", model), lambda: get_llm(model).with_structured_output(Feedback))
+
+
+
+def rejected_sections(state: State):
+    """Plan entries the evaluator rejected last round, with its feedback folded into the description."""
+    grades = state.get("section_grades") or {}
+    return [
+        Section(name=s.name, description=f"{s.description}. Improve on this feedback: {grades[s.name]['feedback']}")
+        for s in state["plan"]
+        if grades.get(s.name, {}).get("grade") == "bad"
+    ]
+
+
+def generator_inputs(state: State):
+    # first pass plans and runs every section, later passes rerun only the rejected ones
+    if not state.get("plan"):
+        return state["topic"], None
+    return state["topic"], rejected_sections(state)
+
+
+def generator_config(state: State, config=None):
+    # one checkpointer thread per attempt: reusing a thread would resume the previous run and
+    # append its completed_sections onto the new ones. the rest of the node's config is kept, so
+    # the orchestrator runs as a subgraph and its events reach a stream of the workflow
+    thread = new_config(f"{state['request_id']}:{state.get('iterations', 0)}")
+    if not config:
+        return thread
+    return {**config, "configurable": {**(config.get("configurable") or {}), **thread["configurable"]}}
+
+
+def join_sections(plan, results):
+    names = dict.fromkeys(s.name for s in plan)
+    return "\n\n---\n\n".join(results[name] for name in names if name in results)
 
 
-config = {"configurable": {"thread_id": "user-thread-123"}}
+def generator_result(state: State, msg):
+    for k, v in msg.items():
+        print(f"{k}: {v}", flush=True)
 
+    plan = state.get("plan") or list(msg.get("sections") or [])
+    results = {**(state.get("section_results") or {}), **(msg.get("section_outputs") or {})}
+    report = join_sections(plan, results) or msg.get("final_report") or str(msg)
+    incr("evaluator_iterations")
+    return {
+        "plan": plan,
+        "section_results": results,
+        "result": report,
+        "iterations": state.get("iterations", 0) + 1,
+    }
 
 
-def llm_call_generator(state: State):
+def llm_call_generator(state: State, config=None):
     """
     Generates verbose output from orchestrator, including tool outputs.
     """
-    if state.get("feedback"):
-        msg = orchestrate(
-            f"{state['topic']} but take into account the feedback: {state['feedback']}",
-            config
-        )
-    else:
-        msg = orchestrate(f"{state['topic']}",config)
-
-    if isinstance(msg, dict):
-        
-        for k, v in msg.items():
-            print(f"{k}: {v}", flush=True)
-        return {"result": str(msg)}
-    
-    if hasattr(msg, "content"):
-        print(msg.content, flush=True)
-        return {"result": msg.content}
-    print(msg, flush=True)
-    return {"result": str(msg)}
+    topic, sections = generator_inputs(state)
+    msg = orchestrate(topic, generator_config(state, config), sections=sections)
+    return generator_result(state, msg)
+
+
+async def allm_call_generator(state: State, config=None):
+    topic, sections = generator_inputs(state)
+    msg = await aorchestrate(topic, generator_config(state, config), sections=sections)
+    return generator_result(state, msg)
+
+
+def evaluator_prompt(topic, name, content):
+    return (
+        f"Grade this '{name}' section of a financial analysis written for the query: {topic}\n\n"
+        f"{truncate_tokens(content, EVALUATOR_BUDGET)}"
+    )
+
+
+def remote_grade(topic, name, content):
+    """(grade, score, feedback) from the evaluator LLM; the MODEL_EVALUATOR models are tried in order until one answers."""
+    models = node_models("evaluator")
+    for tier, model in enumerate(models):
+        try:
+            g = get_evaluator(model).invoke(evaluator_prompt(topic, name, content))
+            return g.grade, g.score, g.feedback
+        except Exception:
+            if tier == len(models) - 1:
+                raise
+
+
+async def aremote_grade(topic, name, content):
+    models = node_models("evaluator")
+    for tier, model in enumerate(models):
+        try:
+            async with provider_limit("groq"):
+                g = await get_evaluator(model).ainvoke(evaluator_prompt(topic, name, content))
+            return g.grade, g.score, g.feedback
+        except Exception:
+            if tier == len(models) - 1:
+                raise
+
+
+def to_feedback(verdict):
+    grade, score, feedback = verdict
+    return Feedback(grade=grade, score=score, feedback=feedback)
+
+
+def grade_section(topic, name, content):
+    """
+    Verdict for one section from the cheapest tier that can decide it (rule checks, local classifier,
+    then the evaluator LLM, see core/cascade.py); identical section text is only graded once.
+    """
+    return get_grade_cache().get_or_fetch(
+        report_hash(content), GRADE_TTL,
+        lambda: to_feedback(cascade.grade(name, content, lambda: remote_grade(topic, name, content))),
+    )
+
+
+async def agrade_feedback(topic, name, content):
+    return to_feedback(await cascade.agrade(name, content, lambda: aremote_grade(topic, name, content)))
+
+
+async def agrade_section(topic, name, content):
+    return await get_grade_cache().aget_or_fetch(
+        report_hash(content), GRADE_TTL,
+        lambda: agrade_feedback(topic, name, content),
+    )
+
+
+def evaluation_update(state: State, names, grades):
+    section_grades = {
+        name: {"grade": g.grade, "score": max(1, min(10, int(g.score))), "feedback": g.feedback}
+        for name, g in zip(names, grades)
+    }
+    print("Evaluation:", section_grades, flush=True)
+
+    scores = [g["score"] for g in section_grades.values()]
+    score = sum(scores) / len(scores) if scores else 0.0
+    rejected = {name: g for name, g in section_grades.items() if g["grade"] == "bad"}
+    update = {
+        "section_grades": section_grades,
+        "good_or_bad": "bad" if rejected or not section_grades else "good",
+        "feedback": "; ".join(f"{name}: {g['feedback']}" for name, g in rejected.items()),
+    }
+    if score > state.get("best_score", -1):
+        update["best_score"] = score
+        update["best_result"] = state["result"]
+    return update
 
 
 def llm_call_evaluator(state: State):
     """
-    Evaluates the result using LLM with structured output.
+    Evaluates every section separately using LLM with structured output.
     """
-    grade = evaluator.invoke(f"Grade the result {state['result']}")
+    results = state["section_results"]
+    names = list(dict.fromkeys(s.name for s in state["plan"] if s.name in results))
+    grades = run_parallel([
+        lambda name=name: grade_section(state["topic"], name, results[name]) for name in names
+    ])
+    return evaluation_update(state, names, grades)
+
+
+async def allm_call_evaluator(state: State):
+    results = state["section_results"]
+    names = list(dict.fromkeys(s.name for s in state["plan"] if s.name in results))
+    grades = await arun_parallel([agrade_section(state["topic"], name, results[name]) for name in names])
+    return evaluation_update(state, names, grades)
 
-    print("Evaluation:", grade, flush=True)
-    return {"good_or_bad": grade.grade, "feedback": grade.feedback}
 
 def route_result(state: State):
     if state["good_or_bad"] == "good":
         return "Accepted"
-    elif state["good_or_bad"] == "bad":
-        return "Rejected + Feedback"
+    if state["iterations"] >= MAX_ITERATIONS or time.monotonic() - state["started_at"] >= LATENCY_BUDGET:
+        return "Budget exhausted"
+    return "Rejected + Feedback"
+
+
+def return_best(state: State):
+    """Out of attempts or time: hand back the highest scoring report seen."""
+    print(f"---EVALUATOR BUDGET EXHAUSTED AFTER {state['iterations']} ATTEMPTS---", flush=True)
+    return {"result": state.get("best_result") or state["result"]}
 
 from langgraph.graph import StateGraph, START, END
 
 optimizer_builder = StateGraph(State)
-optimizer_builder.add_node("llm_call_generator", llm_call_generator)
-optimizer_builder.add_node("llm_call_evaluator", llm_call_evaluator)
+optimizer_builder.add_node("llm_call_generator", RunnableLambda(llm_call_generator, afunc=allm_call_generator))
+optimizer_builder.add_node("llm_call_evaluator", RunnableLambda(llm_call_evaluator, afunc=allm_call_evaluator))
+optimizer_builder.add_node("return_best", return_best)
 optimizer_builder.add_edge(START, "llm_call_generator")
 optimizer_builder.add_edge("llm_call_generator", "llm_call_evaluator")
 optimizer_builder.add_conditional_edges(
@@ -97,12 +257,183 @@ optimizer_builder.add_conditional_edges(
     {
         "Accepted": END,
         "Rejected + Feedback": "llm_call_generator",
+        "Budget exhausted": "return_best",
     },
 )
+optimizer_builder.add_edge("return_best", END)
 
 optimizer_workflow = optimizer_builder.compile()
 
+def initial_state(query):
+    return {"topic": query, "request_id": uuid.uuid4().hex, "iterations": 0, "started_at": time.monotonic()}
+
+
+def cached_analysis(report):
+    return {"report": report, "grade": "good", "cached": True, "iterations": 0, "sections": {}, "logs": []}
+
+
+def analysis(state):
+    """Structured outcome of one query, with the agent transcripts the request recorded; call it inside the request."""
+    return {
+        "report": state["result"],
+        "grade": state.get("good_or_bad"),
+        "cached": False,
+        "iterations": state.get("iterations", 0),
+        "sections": state.get("section_grades") or {},
+        "logs": request_logs(),
+    }
+
+
+def result_event(outcome):
+    return {"type": "result", **outcome}
+
+
+def cacheable(state):
+    return state.get("good_or_bad") == "good"
+
+
+def verdict_event(state: State):
+    return {
+        "type": "verdict",
+        "iteration": state["iterations"],
+        "grade": state["good_or_bad"],
+        "sections": state["section_grades"],
+    }
+
+
+# "messages" adds the section summaries token by token
+STREAM_MODES = ["updates", "messages"]
+
+
+def workflow_events(state, namespace, mode, chunk):
+    """
+    Maps one (namespace, mode, chunk) of optimizer_workflow.stream(subgraphs=True) onto report events.
+    Updates of the workflow's own nodes are folded into `state`, which ends up as the run's end state.
+    """
+    if namespace or mode == "messages":
+        # the orchestrator running inside llm_call_generator
+        return stream_event(mode, chunk, generator_inputs(state)[1])
+    events = []
+    for node, update in chunk.items():
+        state.update(update or {})
+        if node == "llm_call_evaluator":
+            events.append(verdict_event(state))
+    return events
+
+
+def stream_analysis(query, stream_mode=STREAM_MODES):
+    """
+    Runs the generator/evaluator workflow (or serves it from the semantic cache) and yields dict events:
+    plan -> token* / section* (as each worker finishes) -> verdict, repeated per attempt, then
+    result with the analysis(). The request lives in the stream's own context (request_stream), so a
+    stream the caller stops reading leaves nothing behind.
+    """
+    return request_stream(query, analysis_events(query, stream_mode))
+
+
+def astream_analysis(query, stream_mode=STREAM_MODES):
+    return arequest_stream(query, aanalysis_events(query, stream_mode))
+
+
+def analysis_events(query, stream_mode):
+    cache = get_semantic_cache()
+    cached = cache.lookup(query)
+    if cached is not None:
+        yield result_event(cached_analysis(cached))
+        return
+
+    state = initial_state(query)
+    # rejected sections are rerun against the data the first attempt fetched
+    for namespace, mode, chunk in optimizer_workflow.stream(dict(state), stream_mode=stream_mode, subgraphs=True):
+        yield from workflow_events(state, namespace, mode, chunk)
+    result = analysis(state)
+    if cacheable(state):
+        cache.store(query, state["result"])
+    yield result_event(result)
+
+
+async def aanalysis_events(query, stream_mode):
+    cache = get_semantic_cache()
+    cached = await asyncio.to_thread(cache.lookup, query)
+    if cached is not None:
+        yield result_event(cached_analysis(cached))
+        return
+
+    state = initial_state(query)
+    async for namespace, mode, chunk in optimizer_workflow.astream(dict(state), stream_mode=stream_mode, subgraphs=True):
+        for event in workflow_events(state, namespace, mode, chunk):
+            yield event
+    result = analysis(state)
+    if cacheable(state):
+        await asyncio.to_thread(cache.store, query, state["result"])
+    yield result_event(result)
+
+
+def outcome(event):
+    return {k: v for k, v in event.items() if k != "type"}
+
+
+def run_analysis(query):
+    *_, result = stream_analysis(query, stream_mode=["updates"])
+    return outcome(result)
+
+
+async def arun_analysis(query):
+    async for event in astream_analysis(query, stream_mode=["updates"]):
+        result = event
+    return outcome(result)
+
+
+def analyze(query):
+    """
+    Runs the full generator/evaluator loop (or serves it from the semantic cache) and returns analysis()
+    plus this request's timings and counters under "metrics".
+    """
+    with request_context(query):
+        with span("request", "analyze"):
+            result = run_analysis(query)
+        return {**result, "metrics": request_metrics()}
+
+
+async def aanalyze(query):
+    with request_context(query):
+        with span("request", "analyze"):
+            result = await arun_analysis(query)
+        return {**result, "metrics": request_metrics()}
+
+
 def final_result(query):
+    report = analyze(query)["report"]
+    print(report)
+    return report
+
+
+async def afinal_result(query):
+    report = (await aanalyze(query))["report"]
+    print(report)
+    return report
+
+
+def stream_final_result(query):
+    """
+    Streaming counterpart of final_result(): the events of stream_analysis(), then this request's
+    timings and counters as {"type": "metrics"}.
+    """
+    return request_stream(query, final_result_events(query))
+
+
+def astream_final_result(query):
+    return arequest_stream(query, afinal_result_events(query))
+
+
+def final_result_events(query):
+    with span("request", "analyze"):
+        yield from stream_analysis(query)
+    yield {"type": "metrics", "metrics": request_metrics()}
+
 
-    state = optimizer_workflow.invoke({"topic": query})
-    print(state["result"])
+async def afinal_result_events(query):
+    with span("request", "analyze"):
+        async for event in astream_analysis(query):
+            yield event
+    yield {"type": "metrics", "metrics": request_metrics()}
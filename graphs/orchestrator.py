@@ -1,34 +1,61 @@
+import importlib
+import json
 import operator
 import os
+import re
 from typing import Annotated, List
 
 from dotenv import load_dotenv
 from langchain_core.messages import HumanMessage, SystemMessage
-from langchain_groq import ChatGroq
 from langgraph.constants import END, START, Send
 from langgraph.graph import StateGraph
 from pydantic import BaseModel, Field
 from typing_extensions import TypedDict
-from langgraph.checkpoint.memory import InMemorySaver
-from retriever.vectorstore import retriever_
+import uuid
+from core.checkpoint import BoundedMemorySaver
+from core.registry import get_llm, get_node_llm, node_models, registry
+from core.cascade import rule_verdict, record
+from core.tickers import resolve_ticker, find_tickers, company_words
+from core.request_context import request_context
+from core.request_scope import request_ticker
+from core.concurrency import run_parallel, arun_parallel, provider_limit
+from core.compaction import compact_tool_output, section_budget
+from langchain_core.runnables import RunnableLambda
 
 
 
-checkpointer = InMemorySaver()
-
-
-from agents.fin_analysis_r_agent import fin_agent
-from agents.market_output_r_agent import result as market_agent
-from agents.risk_analysis_r_agent import result as risk_agent
+checkpointer = BoundedMemorySaver()
 
 
 load_dotenv()
-os.environ["LANGCHAIN_TRACING_V2"] = "true"
-os.environ["LANGCHAIN_PROJECT"] = "Orchestrator"
-
-llm = ChatGroq(model = 'gemma2-9b-it')
-tools = [fin_agent, market_agent, risk_agent]
-llm_with_tools = llm.bind_tools(tools)
+# LangSmith tracing sends every run upstream; it is off unless the environment sets LANGCHAIN_TRACING_V2=true
+os.environ.setdefault("LANGCHAIN_PROJECT", "Orchestrator")
+
+def get_tool_map():
+    '''
+    the agent modules (and the retriever's loaders) are imported on first use rather than with
+    this module, so importing the graph doesn't pay for clients a query may never touch
+    '''
+    def build():
+        from agents.fin_analysis_r_agent import fin_agent
+        from agents.market_output_r_agent import result as market_agent
+        from agents.risk_analysis_r_agent import result as risk_agent
+        from retriever.vectorstore import retriever_
+        return {
+            "fin_agent": fin_agent,
+            "market_agent": market_agent,
+            "risk_agent": risk_agent,
+            "retriever": retriever_
+        }
+    return registry.get_or_create(("tool_map", "orchestrator"), build)
+
+
+def get_llm_with_tools():
+    def build():
+        tool_map = get_tool_map()
+        tools = [tool_map["fin_agent"], tool_map["market_agent"], tool_map["risk_agent"]]
+        return get_node_llm("router").bind_tools(tools)
+    return registry.get_or_create(("llm_with_tools", "orchestrator"), build)
 
 
 
@@ -39,76 +66,354 @@ class Section(BaseModel):
 class Sections(BaseModel):
     sections: List[Section] = Field(description="List of sections for the analysis. Must include fin_analysis, market_output, and risk_analysis.")
 
-planner = llm.with_structured_output(Sections)
+def get_planner():
+    model = node_models("planner")[0]
+    return registry.get_or_create(("planner", model), lambda: get_llm(model).with_structured_output(Sections))
 
 
 
+def merge_dicts(left, right):
+    return {**(left or {}), **(right or {})}
+
+
 class State(TypedDict):
     topic: str
     sections: list[Section]
     completed_sections: Annotated[list, operator.add]
+    section_outputs: Annotated[dict, merge_dicts]
     final_report: str
 
 class WorkerState(TypedDict):
     section: Section
     completed_sections: Annotated[list, operator.add]
+    section_outputs: Annotated[dict, merge_dicts]
+
+
+def planner_messages(topic):
+    return [
+        SystemMessage(content="You are a financial planning assistant. Generate a plan for the analysis of an organization based on the user's topic. You must create exactly three sections: one for fin_analysis, one for market_output, and one for risk_analysis."),
+        HumanMessage(content=f"Here is the topic: {topic}"),
+    ]
+
+
+# auto: rule based plan whenever the company can be resolved locally, LLM planner otherwise
+# rules / llm: always use that planner
+PLANNER_MODE = os.getenv("PLANNER_MODE", "auto")
+
+SECTION_TEMPLATES = {
+    "fin_analysis": "Financial analysis of {ticker} (use tool fin_agent): company profile and annual financial statements, covering revenue, profitability and growth. User request: {topic}",
+    "market_output": "Market output of {ticker} (use tool market_agent): recent stock news for {ticker} and how it sits among today's market gainers and losers. User request: {topic}",
+    "risk_analysis": "Risk analysis of {ticker} (use tool risk_agent): key financial ratios (leverage, liquidity, returns) and the analyst rating. User request: {topic}",
+}
+
+
+# what a request for the standard analysis of one company is made of, besides the company's name
+TEMPLATE_WORDS = {
+    "a", "an", "the", "of", "for", "on", "about", "me", "my", "us", "give", "please", "can", "could", "you",
+    "i", "want", "need", "would", "like", "to", "do", "run", "provide", "show", "tell", "write", "prepare",
+    "and", "with", "its", "company", "company's", "stock", "share", "shares", "inc", "corp", "corporation",
+    "analyze", "analyse", "analysis", "analyses", "report", "overview", "review", "summary", "breakdown",
+    "full", "complete", "detailed", "quick", "brief", "general", "overall", "standard", "deep", "dive",
+    "financial", "financials", "finance", "finances", "fundamental", "fundamentals",
+    "market", "markets", "performance", "risk", "risks",
+}
+
+
+def fits_template(topic, ticker):
+    """True when the topic asks for nothing beyond the standard analysis of `ticker`."""
+    skip = TEMPLATE_WORDS | company_words(ticker)
+    words = (w.strip(".'-") for w in re.findall(r"[a-z0-9&'.\-]+", topic.lower().replace("$", "")))
+    # "apple's market performance"
+    return all(not word or word in skip or word.removesuffix("'s") in skip for word in words)
+
+
+def rule_plan(topic):
+    """
+    The fixed three-section plan built from templates; None (use the LLM planner) when the topic
+    names no known company, names several, or asks for something the templates don't cover.
+    """
+    tickers = find_tickers(topic)
+    if len(tickers) != 1 or not fits_template(topic, tickers[0]):
+        return None
+    ticker = tickers[0]
+    return [
+        Section(name=name, description=template.format(ticker=ticker, topic=topic))
+        for name, template in SECTION_TEMPLATES.items()
+    ]
+
+
+def normalize_plan(sections, topic):
+    """Drops duplicate or unknown sections from an LLM plan and fills in any required one it missed."""
+    ticker = resolve_ticker(topic) or "the company"
+    by_name = {}
+    for section in sections or []:
+        name = section.name.strip().lower().replace(" ", "_")
+        if name in SECTION_TEMPLATES and name not in by_name:
+            by_name[name] = Section(name=name, description=section.description)
+    return [
+        by_name.get(name) or Section(name=name, description=template.format(ticker=ticker, topic=topic))
+        for name, template in SECTION_TEMPLATES.items()
+    ]
+
+
+def local_plan(topic):
+    if PLANNER_MODE == "llm":
+        return None
+    plan = rule_plan(topic)
+    if plan is None and PLANNER_MODE == "rules":
+        plan = normalize_plan([], topic)
+    return plan
 
 
 def orchestrator(state: State):
     """Orchestrator that generates a plan for the report."""
     print("---EXECUTING ORCHESTRATOR NODE---")
-    report_sections = planner.invoke(
-        [
-            SystemMessage(content="You are a financial planning assistant. Generate a plan for the analysis of an organization based on the user's topic. You must create exactly three sections: one for fin_analysis, one for market_output, and one for risk_analysis."),
-            HumanMessage(content=f"Here is the topic: {state['topic']}"),
-        ]
-    )
+    if state.get("sections"):
+        # plan handed in by the caller (e.g. only the sections the evaluator rejected)
+        return {}
+    plan = local_plan(state['topic'])
+    if plan is None:
+        report_sections = get_planner().invoke(planner_messages(state['topic']))
+        plan = normalize_plan(report_sections.sections, state['topic'])
+    print("---ORCHESTRATOR PLAN CREATED---")
+    return {"sections": plan}
+
+
+async def aorchestrator(state: State):
+    """Async orchestrator, same plan as orchestrator()."""
+    print("---EXECUTING ORCHESTRATOR NODE---")
+    if state.get("sections"):
+        return {}
+    plan = local_plan(state['topic'])
+    if plan is None:
+        async with provider_limit("groq"):
+            report_sections = await get_planner().ainvoke(planner_messages(state['topic']))
+        plan = normalize_plan(report_sections.sections, state['topic'])
     print("---ORCHESTRATOR PLAN CREATED---")
-    return {"sections": report_sections.sections}
+    return {"sections": plan}
 
 from langchain_core.messages import AIMessage, ToolMessage
 
+def worker_messages(section):
+    return [
+        SystemMessage(
+            content="You are a financial analyst. Use the provided tools to gather details based on the section description. Then, write a concise summary based on the tool's output. Include no preamble. Use markdown formatting."
+        ),
+        HumanMessage(
+            content=f"Here is the section name: {section.name} and description: {section.description}"
+        ),
+    ]
+
+
+def resolve_tool_calls(ai_response):
+    tool_map = get_tool_map()
+    calls = [(tool_call, tool_map.get(tool_call['name'])) for tool_call in ai_response.tool_calls]
+    return [(tool_call, fn) for tool_call, fn in calls if fn]
+
+
+# tags the section-writing LLM call so streams can tell its tokens from the inner agents' ones
+SUMMARY_TAG = "section_summary"
+
+
+def summary_config(section_name):
+    return {"tags": [SUMMARY_TAG, f"section:{section_name}"]}
+
+
+def section_markdown(section_name, content):
+    return f"## {section_name.replace('_', ' ').title()}\n\n{content}"
+
+
+def summarize(messages, section_name):
+    """
+    The section summary from the cheapest MODEL_SUMMARY model whose answer passes the rule checks
+    of core/cascade.py; the last model's answer is kept whatever it is.
+    """
+    models = node_models("summary")
+    for tier, model in enumerate(models):
+        response = get_llm(model).invoke(messages, config=summary_config(section_name))
+        if tier == len(models) - 1 or rule_verdict(section_name, response.content) is None:
+            record("summary", model)
+            return response
+
 
-tool_map = {
-    "fin_agent": fin_agent,
-    "market_agent": market_agent,
-    "risk_agent": risk_agent,
-    "retriever": retriever_
+async def asummarize(messages, section_name):
+    models = node_models("summary")
+    for tier, model in enumerate(models):
+        async with provider_limit("groq"):
+            response = await get_llm(model).ainvoke(messages, config=summary_config(section_name))
+        if tier == len(models) - 1 or rule_verdict(section_name, response.content) is None:
+            record("summary", model)
+            return response
+
+
+# direct: each section's data is fetched by its module's gather()/agather() and summarized in one LLM call
+# agent: the LLM picks an agent tool which runs its own ReAct loop (the older, much chattier path)
+WORKER_MODE = os.getenv("WORKER_MODE", "direct")
+# in direct mode, retry a section through its agent when the direct fetch raises
+WORKER_AGENT_FALLBACK = os.getenv("WORKER_AGENT_FALLBACK", "false").lower() in ("1", "true", "yes")
+
+# the section name already decides which data a worker needs
+SECTION_ROUTES = {
+    "fin_analysis": "agents.fin_analysis_r_agent",
+    "market_output": "agents.market_output_r_agent",
+    "risk_analysis": "agents.risk_analysis_r_agent",
 }
 
-def llm_call(state: WorkerState):
-    """Worker that calls tools AND summarizes the result to write a section."""
-    section_name = state['section'].name
-    print(f"---EXECUTING WORKER NODE: {section_name}---")
+
+def direct_route(section):
+    '''the agent module serving `section`, or None when it should go through the agent path'''
+    if WORKER_MODE != "direct" or section.name not in SECTION_ROUTES:
+        return None
+    return registry.get_or_create(
+        ("section_route", section.name), lambda: importlib.import_module(SECTION_ROUTES[section.name])
+    )
+
+
+def section_ticker(section):
+    return request_ticker(section.description)
 
 
-    messages = [
+# payloads gather() returns whatever company the request is about
+GENERIC_PAYLOADS = {"market_movers", "web_search"}
+
+
+def has_company_data(data):
+    '''False when every company payload of a gather() result is empty or an error'''
+    return any(
+        value and not (isinstance(value, dict) and "error" in value)
+        for key, value in data.items() if key not in GENERIC_PAYLOADS
+    )
+
+
+def direct_messages(section, data):
+    payload = compact_tool_output(json.dumps(data, default=str, indent=1), section_budget(section.name))
+    return [
         SystemMessage(
-            content="You are a financial analyst. Use the provided tools to gather details based on the section description. Then, write a concise summary based on the tool's output. Include no preamble. Use markdown formatting."
+            content="You are a financial analyst. Write a concise summary for the section below based only on the data provided. Include no preamble. Use markdown formatting."
         ),
         HumanMessage(
-            content=f"Here is the section name: {state['section'].name} and description: {state['section'].description}"
+            content=f"Here is the section name: {section.name} and description: {section.description}\n\nData:\n{payload}"
         ),
     ]
 
 
-    ai_response = llm_with_tools.invoke(messages)
+def llm_call(state: WorkerState):
+    """Worker that fetches the section's data directly and summarizes it with one LLM call."""
+    section = state['section']
+    route = direct_route(section)
+    if route is None:
+        return agent_llm_call(state)
+    ticker = section_ticker(section)
+    if ticker is None:
+        # nothing to fetch directly, the agent can still look the company up
+        print(f"---WORKER {section.name}: no ticker, using agent---")
+        return agent_llm_call(state)
+    print(f"---EXECUTING WORKER NODE: {section.name}---")
+    try:
+        data = route.gather(ticker, section.description)
+    except Exception as e:
+        if WORKER_AGENT_FALLBACK:
+            print(f"---WORKER {section.name}: direct fetch failed ({e}), using agent---")
+            return agent_llm_call(state)
+        data = {"error": str(e)}
+    if not has_company_data(data):
+        print(f"---WORKER {section.name}: no FMP data for {ticker}, using agent---")
+        return agent_llm_call(state)
+
+    final_response = summarize(direct_messages(section, data), section.name)
+    print(f"---WORKER {section.name} FINISHED---")
+
+    markdown = section_markdown(section.name, final_response.content)
+    return {"completed_sections": [markdown], "section_outputs": {section.name: markdown}}
+
+
+async def allm_call(state: WorkerState):
+    """Async worker, same steps as llm_call()."""
+    section = state['section']
+    route = direct_route(section)
+    if route is None:
+        return await aagent_llm_call(state)
+    ticker = section_ticker(section)
+    if ticker is None:
+        # nothing to fetch directly, the agent can still look the company up
+        print(f"---WORKER {section.name}: no ticker, using agent---")
+        return await aagent_llm_call(state)
+    print(f"---EXECUTING WORKER NODE: {section.name}---")
+    try:
+        data = await route.agather(ticker, section.description)
+    except Exception as e:
+        if WORKER_AGENT_FALLBACK:
+            print(f"---WORKER {section.name}: direct fetch failed ({e}), using agent---")
+            return await aagent_llm_call(state)
+        data = {"error": str(e)}
+    if not has_company_data(data):
+        print(f"---WORKER {section.name}: no FMP data for {ticker}, using agent---")
+        return await aagent_llm_call(state)
+
+    final_response = await asummarize(direct_messages(section, data), section.name)
+    print(f"---WORKER {section.name} FINISHED---")
+
+    markdown = section_markdown(section.name, final_response.content)
+    return {"completed_sections": [markdown], "section_outputs": {section.name: markdown}}
+
+
+def agent_llm_call(state: WorkerState):
+    """Worker that calls tools AND summarizes the result to write a section."""
+    section_name = state['section'].name
+    print(f"---EXECUTING WORKER NODE: {section_name}---")
+
+    messages = worker_messages(state['section'])
+
+    ai_response = get_llm_with_tools().invoke(messages)
     messages.append(ai_response)
 
     if ai_response.tool_calls:
-        for tool_call in ai_response.tool_calls:
-            tool_function = tool_map.get(tool_call['name'])
-            if tool_function:
-
-                tool_output = tool_function.invoke(tool_call['args'])
-                messages.append(
-                    ToolMessage(content=str(tool_output), tool_call_id=tool_call['id'])
+        calls = resolve_tool_calls(ai_response)
+        outputs = run_parallel([
+            lambda fn=fn, args=tool_call['args']: fn.invoke(args) for tool_call, fn in calls
+        ])
+        for (tool_call, _), tool_output in zip(calls, outputs):
+            messages.append(
+                ToolMessage(
+                    content=compact_tool_output(tool_output, section_budget(section_name)),
+                    tool_call_id=tool_call['id'],
                 )
+            )
 
-    final_response = llm.invoke(messages)
+    final_response = summarize(messages, section_name)
     print(f"---WORKER {section_name} FINISHED---")
     
-    return {"completed_sections": [f"## {section_name.replace('_', ' ').title()}\n\n{final_response.content}"]}
+    markdown = section_markdown(section_name, final_response.content)
+    return {"completed_sections": [markdown], "section_outputs": {section_name: markdown}}
+
+
+async def aagent_llm_call(state: WorkerState):
+    """Async worker, same steps as agent_llm_call() with the tool calls awaited concurrently."""
+    section_name = state['section'].name
+    print(f"---EXECUTING WORKER NODE: {section_name}---")
+
+    messages = worker_messages(state['section'])
+
+    async with provider_limit("groq"):
+        ai_response = await get_llm_with_tools().ainvoke(messages)
+    messages.append(ai_response)
+
+    if ai_response.tool_calls:
+        calls = resolve_tool_calls(ai_response)
+        outputs = await arun_parallel([fn.ainvoke(tool_call['args']) for tool_call, fn in calls])
+        for (tool_call, _), tool_output in zip(calls, outputs):
+            messages.append(
+                ToolMessage(
+                    content=compact_tool_output(tool_output, section_budget(section_name)),
+                    tool_call_id=tool_call['id'],
+                )
+            )
+
+    final_response = await asummarize(messages, section_name)
+    print(f"---WORKER {section_name} FINISHED---")
+
+    markdown = section_markdown(section_name, final_response.content)
+    return {"completed_sections": [markdown], "section_outputs": {section_name: markdown}}
 
 def assign_workers(state: State):
     """Assign a worker to each section in the plan."""
@@ -118,7 +423,10 @@ def assign_workers(state: State):
 def synthesizer(state: State):
     """Synthesize the full report from all the completed sections."""
     print("---EXECUTING SYNTHESIZER NODE---")
-    completed_report_sections = "\n\n---\n\n".join(state["completed_sections"])
+    outputs = state.get("section_outputs") or {}
+    # plan order rather than completion order, so the same plan always reads the same way
+    ordered = [outputs[s.name] for s in state["sections"] if s.name in outputs] or state["completed_sections"]
+    completed_report_sections = "\n\n---\n\n".join(dict.fromkeys(ordered))
     print("---SYNTHESIZER FINISHED---")
     return {"final_report": completed_report_sections}
 
@@ -126,8 +434,9 @@ def synthesizer(state: State):
 orchestrator_worker_builder = StateGraph(State)
 
 
-orchestrator_worker_builder.add_node("orchestrator", orchestrator)
-orchestrator_worker_builder.add_node("llm_call", llm_call)
+# each node carries a sync and an async implementation, invoke() uses the first and ainvoke() the second
+orchestrator_worker_builder.add_node("orchestrator", RunnableLambda(orchestrator, afunc=aorchestrator))
+orchestrator_worker_builder.add_node("llm_call", RunnableLambda(llm_call, afunc=allm_call))
 orchestrator_worker_builder.add_node("synthesizer", synthesizer)
 
 orchestrator_worker_builder.add_edge(START, "orchestrator")
@@ -140,10 +449,52 @@ orchestrator_worker_builder.add_edge("synthesizer", END)
 
 
 
-config = {"configurable": {"thread_id": "user-thread-123"}}
+def new_config(thread_id=None):
+    """Checkpointer config with its own thread, so runs never share or resume each other's state."""
+    return {"configurable": {"thread_id": thread_id or uuid.uuid4().hex}}
+
+
+# compiled once at import; compiling is pure graph validation and the result is reusable
+orchestrator_worker = orchestrator_worker_builder.compile(checkpointer=checkpointer)
+
+
+def orchestrate_input(input_str, sections=None):
+    state = {"topic": input_str}
+    if sections:
+        state["sections"] = sections
+    return state
+
+
+def orchestrate(input_str: str, config=None, sections=None):
+    """
+    Runs the plan -> workers -> synthesizer graph; pass `sections` to skip planning and run only those.
+    The workers share one request scope: one ticker lookup and one fetch per distinct FMP/web call.
+    """
+    with request_context(input_str):
+        return orchestrator_worker.invoke(orchestrate_input(input_str, sections), config or new_config())
+
 
+async def aorchestrate(input_str: str, config=None, sections=None):
+    with request_context(input_str):
+        return await orchestrator_worker.ainvoke(orchestrate_input(input_str, sections), config or new_config())
 
 
-def orchestrate(input_str: str,config):
-    orchestrator_worker = orchestrator_worker_builder.compile(checkpointer= checkpointer)
-    return orchestrator_worker.invoke({"topic": input_str},config)
+def stream_event(mode, chunk, sections=None):
+    """Maps one LangGraph (mode, chunk) pair onto the report events: plan, section, token."""
+    if mode == "messages":
+        message, metadata = chunk
+        tags = metadata.get("tags") or []
+        if SUMMARY_TAG in tags and message.content:
+            section = next((t.split(":", 1)[1] for t in tags if t.startswith("section:")), None)
+            return [{"type": "token", "section": section, "text": message.content}]
+        return []
+    events = []
+    for node, update in chunk.items():
+        update = update or {}
+        if node == "orchestrator":
+            plan = update.get("sections") or sections or []
+            events.append({"type": "plan", "sections": [{"name": s.name, "description": s.description} for s in plan]})
+        elif node == "llm_call":
+            for name, markdown in (update.get("section_outputs") or {}).items():
+                events.append({"type": "section", "name": name, "markdown": markdown})
+    return events
@@ -0,0 +1,206 @@
+'''
+hybrid retrieval over the document corpus: a local BM25 inverted index (sqlite, next to the chroma
+index) and the chroma vector search, merged with reciprocal rank fusion and optionally reranked by a
+local cross-encoder. everything runs on CPU.
+
+    RETRIEVER_MODE        hybrid (default) | vector | lexical
+    RETRIEVER_CANDIDATES  hits taken from each engine before fusion (default 20)
+    RETRIEVER_K           hits returned (default 4)
+    RETRIEVER_RERANK      cross-encoder model name to rerank the fused candidates, off when empty
+'''
+import json
+import math
+import os
+import re
+import sqlite3
+import threading
+from collections import Counter
+
+from core.cache import TTLCache
+from core.registry import get_embeddings, registry
+from retriever.vectorstore import INDEX_DIR, METADATA_FIELDS, RETRIEVER_K, get_vectorstore, metadata_filter
+
+RETRIEVER_MODE = os.getenv("RETRIEVER_MODE", "hybrid")
+RETRIEVER_CANDIDATES = int(os.getenv("RETRIEVER_CANDIDATES", "20"))
+RETRIEVER_RERANK = os.getenv("RETRIEVER_RERANK", "")
+RERANK_CACHE_TTL = float(os.getenv("RERANK_CACHE_TTL", 24 * 3600))
+LEXICAL_PATH = os.path.join(INDEX_DIR, "lexical.sqlite")
+RRF_K = 60
+BM25_K1 = 1.2
+BM25_B = 0.75
+
+# kept as single tokens: tickers, FY2023, 10-K, 391035 (thousands separators are dropped first)
+_TOKEN = re.compile(r"[a-z0-9]+(?:[.\-][a-z0-9]+)*")
+_STOPWORDS = {
+    "a", "an", "and", "are", "as", "at", "be", "by", "for", "from", "in", "is", "it", "of", "on",
+    "or", "that", "the", "this", "to", "was", "were", "with", "what", "which", "how",
+}
+
+
+def tokenize(text):
+    return [t for t in _TOKEN.findall(re.sub(r"(?<=\d),(?=\d{3})", "", text.lower())) if t not in _STOPWORDS]
+
+
+class LexicalIndex:
+    '''
+    BM25 over an inverted index kept in sqlite, filled by ingestion alongside chroma.
+    the metadata columns let a filtered query only score postings of matching chunks.
+    '''
+
+    def __init__(self, path=LEXICAL_PATH):
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        self._lock = threading.Lock()
+        columns = ", ".join(f"{field} TEXT" for field in METADATA_FIELDS)
+        self._db.executescript(f"""
+            CREATE TABLE IF NOT EXISTS docs (id TEXT PRIMARY KEY, length INTEGER, content TEXT, metadata TEXT, {columns});
+            CREATE TABLE IF NOT EXISTS postings (term TEXT, id TEXT, tf INTEGER, PRIMARY KEY (term, id));
+            CREATE INDEX IF NOT EXISTS postings_id ON postings (id);
+            CREATE INDEX IF NOT EXISTS docs_source ON docs (source);
+        """)
+        self._db.commit()
+
+    def add(self, ids, texts, metadatas):
+        fields = ", ".join(METADATA_FIELDS)
+        placeholders = ", ".join("?" for _ in METADATA_FIELDS)
+        with self._lock:
+            self._delete(ids)
+            for chunk_id, text, metadata in zip(ids, texts, metadatas):
+                counts = Counter(tokenize(text))
+                self._db.execute(
+                    f"INSERT INTO docs (id, length, content, metadata, {fields}) VALUES (?, ?, ?, ?, {placeholders})",
+                    (chunk_id, sum(counts.values()), text, json.dumps(metadata),
+                     *(None if metadata.get(f) is None else str(metadata[f]) for f in METADATA_FIELDS)),
+                )
+                self._db.executemany(
+                    "INSERT INTO postings (term, id, tf) VALUES (?, ?, ?)",
+                    [(term, chunk_id, tf) for term, tf in counts.items()],
+                )
+            self._db.commit()
+
+    def _delete(self, ids):
+        for i in range(0, len(ids), 500):
+            chunk = ids[i:i + 500]
+            marks = ", ".join("?" for _ in chunk)
+            self._db.execute(f"DELETE FROM postings WHERE id IN ({marks})", chunk)
+            self._db.execute(f"DELETE FROM docs WHERE id IN ({marks})", chunk)
+
+    def delete(self, ids):
+        with self._lock:
+            self._delete(list(ids))
+            self._db.commit()
+
+    def has_source(self, source):
+        with self._lock:
+            return self._db.execute("SELECT 1 FROM docs WHERE source = ? LIMIT 1", (source,)).fetchone() is not None
+
+    def search(self, query, limit, filters=None):
+        '''[(id, score, content, metadata)] best first'''
+        terms = list(dict.fromkeys(tokenize(query)))
+        if not terms:
+            return []
+        filters = {field: value for field, value in (filters or {}).items() if field in METADATA_FIELDS}
+        where = " AND ".join(f"d.{field} = ?" for field in filters)
+        where_sql = f" AND {where}" if where else ""
+        with self._lock:
+            total, avg_length = self._db.execute("SELECT COUNT(*), AVG(length) FROM docs").fetchone()
+            if not total:
+                return []
+            scores = Counter()
+            for term in terms:
+                df = self._db.execute("SELECT COUNT(*) FROM postings WHERE term = ?", (term,)).fetchone()[0]
+                if not df:
+                    continue
+                idf = math.log(1 + (total - df + 0.5) / (df + 0.5))
+                rows = self._db.execute(
+                    f"SELECT p.id, p.tf, d.length FROM postings p JOIN docs d ON d.id = p.id WHERE p.term = ?{where_sql}",
+                    (term, *filters.values()),
+                )
+                for chunk_id, tf, length in rows:
+                    norm = tf + BM25_K1 * (1 - BM25_B + BM25_B * length / (avg_length or 1))
+                    scores[chunk_id] += idf * tf * (BM25_K1 + 1) / norm
+            best = scores.most_common(limit)
+            docs = {}
+            for chunk_id, _ in best:
+                content, metadata = self._db.execute(
+                    "SELECT content, metadata FROM docs WHERE id = ?", (chunk_id,)
+                ).fetchone()
+                docs[chunk_id] = (content, json.loads(metadata))
+        return [(chunk_id, score, *docs[chunk_id]) for chunk_id, score in best]
+
+
+def get_lexical_index():
+    return registry.get_or_create(("lexical_index", LEXICAL_PATH), LexicalIndex)
+
+
+def vector_search(query, limit, filters=None):
+    '''[(id, distance, content, metadata)] from chroma, nearest first'''
+    collection = get_vectorstore()._collection
+    if not collection.count():
+        return []
+    result = collection.query(
+        query_embeddings=[get_embeddings().embed_query(query)],
+        n_results=limit,
+        where=metadata_filter(**(filters or {})),
+        include=["documents", "metadatas", "distances"],
+    )
+    return list(zip(result["ids"][0], result["distances"][0], result["documents"][0], result["metadatas"][0]))
+
+
+def reciprocal_rank_fusion(*rankings, k=RRF_K):
+    '''merges ranked hit lists by sum(1 / (k + rank)); returns [(id, score, content, metadata)]'''
+    scores = Counter()
+    docs = {}
+    for ranking in rankings:
+        for rank, (chunk_id, _, content, metadata) in enumerate(ranking, start=1):
+            scores[chunk_id] += 1.0 / (k + rank)
+            docs.setdefault(chunk_id, (content, metadata))
+    return [(chunk_id, score, *docs[chunk_id]) for chunk_id, score in scores.most_common()]
+
+
+def get_cross_encoder(model_name):
+    def build():
+        from sentence_transformers import CrossEncoder
+        return CrossEncoder(model_name, device="cpu")
+    return registry.get_or_create(("cross_encoder", model_name), build)
+
+
+def get_rerank_cache():
+    return registry.get_or_create(("rerank_cache",), lambda: TTLCache(max_entries=4096, name="rerank"))
+
+
+def rerank(query, hits, model_name):
+    '''re-scores hits with a cross-encoder; (model, query, chunk) scores are cached'''
+    cache = get_rerank_cache()
+    keys = [f"{model_name}\x00{query}\x00{chunk_id}" for chunk_id, *_ in hits]
+    scores = {}
+    missing = []
+    for key, hit in zip(keys, hits):
+        found, score = cache.get(key)
+        if found:
+            scores[key] = score
+        else:
+            missing.append((key, hit))
+    if missing:
+        predicted = get_cross_encoder(model_name).predict([(query, hit[2]) for _, hit in missing])
+        for (key, _), score in zip(missing, predicted):
+            scores[key] = float(score)
+            cache.set(key, float(score), RERANK_CACHE_TTL)
+    ranked = sorted(zip(keys, hits), key=lambda pair: scores[pair[0]], reverse=True)
+    return [(hit[0], scores[key], hit[2], hit[3]) for key, hit in ranked]
+
+
+def search(query, k=RETRIEVER_K, candidates=RETRIEVER_CANDIDATES, mode=RETRIEVER_MODE, rerank_model=RETRIEVER_RERANK, **filters):
+    '''top `k` chunks for `query` among those matching `filters` (ticker, filing_type, period, owner, source)'''
+    filters = {field: (value.upper() if field == "ticker" else value) for field, value in filters.items() if value}
+    candidates = max(candidates, k)
+    rankings = []
+    if mode in ("hybrid", "lexical"):
+        rankings.append(get_lexical_index().search(query, candidates, filters))
+    if mode in ("hybrid", "vector"):
+        rankings.append(vector_search(query, candidates, filters))
+    hits = rankings[0] if len(rankings) == 1 else reciprocal_rank_fusion(*rankings)
+    hits = hits[:candidates]
+    if rerank_model and hits:
+        hits = rerank(query, hits, rerank_model)
+    return hits[:k]
@@ -0,0 +1,248 @@
+'''
+streaming ingestion of the document corpus into the retriever index.
+
+documents are read lazily (a pdf page, a csv row or a block of text at a time), split as they
+arrive and embedded in fixed size batches on a worker pool; each batch is written to chroma as
+soon as its vectors are ready. at most INGEST_WORKERS batches are in flight, so memory stays
+bounded by batch size rather than file size.
+
+every stored batch also goes into the BM25 index of retriever/hybrid.py.
+
+ingestion runs ahead of queries: the app starts it in the background at launch, and it can be
+run on its own with
+
+    python -m retriever.ingest
+'''
+import os
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+from retriever.hybrid import get_lexical_index
+from retriever.vectorstore import (
+    get_vectorstore, file_hash, chunk_id, load_manifest, save_manifest, corpus_files,
+)
+
+INGEST_BATCH_SIZE = int(os.getenv("INGEST_BATCH_SIZE", "64"))
+INGEST_WORKERS = int(os.getenv("INGEST_WORKERS", str(os.cpu_count() or 1)))
+# how long a query waits for a running ingestion before searching what is already indexed
+INGEST_WAIT = float(os.getenv("INGEST_WAIT", "30"))
+TEXT_BLOCK_CHARS = 64 * 1024
+# prose and pdf pages split at paragraph, then line boundaries, so a statement line item is never cut
+CHUNK_SIZE = int(os.getenv("RETRIEVER_CHUNK_SIZE", "1000"))
+CHUNK_OVERLAP = int(os.getenv("RETRIEVER_CHUNK_OVERLAP", "100"))
+# a csv row is one chunk unless it is longer than this
+CSV_ROW_MAX_CHARS = 4000
+
+_index_lock = threading.Lock()
+_state_lock = threading.Lock()
+_thread = None
+# path -> (size, mtime, sha256) of the version last hashed, so a query doesn't rehash an unchanged file
+_hashes = {}
+# path -> (sha256, metadata) of the version this process last finished indexing
+_indexed = {}
+
+
+def text_blocks(path):
+    '''TextLoader reads the whole file at once; this yields it as ~TEXT_BLOCK_CHARS documents cut at line ends'''
+    from langchain_core.documents import Document
+    block = []
+    size = 0
+    with open(path, encoding="utf-8", errors="replace") as f:
+        for line in f:
+            block.append(line)
+            size += len(line)
+            if size >= TEXT_BLOCK_CHARS:
+                yield Document(page_content="".join(block), metadata={"source": path})
+                block, size = [], 0
+    if block:
+        yield Document(page_content="".join(block), metadata={"source": path})
+
+
+def iter_documents(path, loader_name):
+    if loader_name == "TextLoader":
+        return text_blocks(path)
+    from langchain_community import document_loaders
+    return getattr(document_loaders, loader_name)(path).lazy_load()
+
+
+def split_document(document, loader_name, splitter):
+    if loader_name == "CSVLoader" and len(document.page_content) <= CSV_ROW_MAX_CHARS:
+        # CSVLoader yields one "column: value" document per row, keep each row whole
+        return [document]
+    return splitter.split_documents([document])
+
+
+def iter_chunks(path, loader_name, metadata=None):
+    '''(id, chunk) pairs, split one loaded document at a time; chunks carry the file's metadata'''
+    from langchain_text_splitters import RecursiveCharacterTextSplitter
+    splitter = RecursiveCharacterTextSplitter(
+        chunk_size=CHUNK_SIZE, chunk_overlap=CHUNK_OVERLAP, separators=["\n\n", "\n", " ", ""],
+    )
+    seen = {}
+    for document in iter_documents(path, loader_name):
+        for chunk in split_document(document, loader_name, splitter):
+            chunk.metadata = {**chunk.metadata, **(metadata or {})}
+            yield chunk_id(path, chunk, seen), chunk
+
+
+def store_batch(db, batch):
+    '''embeds a batch and upserts it into chroma (add_texts upserts by id); returns (ids, texts, metadatas)'''
+    ids = [i for i, _ in batch]
+    texts = [c.page_content for _, c in batch]
+    # chroma only stores scalar metadata values
+    metadatas = [{k: v for k, v in c.metadata.items() if isinstance(v, (str, int, float, bool))} for _, c in batch]
+    db.add_texts(texts, metadatas=metadatas, ids=ids)
+    return ids, texts, metadatas
+
+
+def print_progress(path, stats):
+    print(
+        f"---INGEST {path}: {stats['chunks']} chunks read, {stats['embedded']} embedded, "
+        f"{stats['skipped']} unchanged ({stats['seconds']:.1f}s)---",
+        flush=True,
+    )
+
+
+def ingest_file(path, loader_name, db, known_ids=frozenset(), progress=print_progress, metadata=None):
+    '''
+    streams `path` into `db`, embedding only chunks whose id isn't in known_ids.
+    returns the ids of every chunk in the file, in order.
+    '''
+    started = time.monotonic()
+    stats = {"chunks": 0, "embedded": 0, "skipped": 0, "seconds": 0.0}
+    ids = []
+    batch = []
+    inflight = deque()
+
+    def write(future):
+        batch_ids, texts, metadatas = future.result()
+        get_lexical_index().add(batch_ids, texts, metadatas)
+        stats["embedded"] += len(batch_ids)
+        stats["seconds"] = time.monotonic() - started
+        if progress:
+            progress(path, stats)
+
+    with ThreadPoolExecutor(max_workers=INGEST_WORKERS, thread_name_prefix="ingest") as pool:
+        for cid, chunk in iter_chunks(path, loader_name, metadata):
+            ids.append(cid)
+            stats["chunks"] += 1
+            if cid in known_ids:
+                stats["skipped"] += 1
+                continue
+            batch.append((cid, chunk))
+            if len(batch) >= INGEST_BATCH_SIZE:
+                inflight.append(pool.submit(store_batch, db, batch))
+                batch = []
+                # backpressure: stop reading until the oldest batch is stored
+                while len(inflight) >= INGEST_WORKERS:
+                    write(inflight.popleft())
+        if batch:
+            inflight.append(pool.submit(store_batch, db, batch))
+        while inflight:
+            write(inflight.popleft())
+
+    stats["seconds"] = time.monotonic() - started
+    if progress:
+        progress(path, stats)
+    return ids
+
+
+def current_hash(path):
+    st = os.stat(path)
+    stamp = (st.st_size, st.st_mtime_ns)
+    cached = _hashes.get(path)
+    if cached is None or cached[:2] != stamp:
+        # a changed file replaces its old entry, the map holds one hash per corpus file
+        cached = _hashes[path] = (*stamp, file_hash(path))
+    return cached[2]
+
+
+def is_current(path, metadata):
+    if path not in _indexed:
+        entry = load_manifest().get(path)
+        if entry:
+            _indexed[path] = (entry["sha256"], entry.get("metadata"))
+    return _indexed.get(path) == (current_hash(path), metadata)
+
+
+def sync_index(progress=print_progress):
+    '''
+    brings the on-disk index in line with the corpus.
+    unchanged files are skipped without even being read by the loader, changed files only
+    embed the chunks whose hash is new, and chunks (or whole files) that disappeared are evicted.
+    a file whose metadata changed is re-embedded so every chunk carries the new values.
+    '''
+    files = corpus_files()
+
+    with _index_lock:
+        manifest = load_manifest()
+        db = get_vectorstore()
+        lexical = get_lexical_index()
+
+        current = {path for path, _, _ in files}
+        for old_path in [p for p in manifest if p not in current]:
+            stale = manifest.pop(old_path)["chunks"]
+            if stale:
+                db.delete(ids=stale)
+                lexical.delete(stale)
+            _indexed.pop(old_path, None)
+            _hashes.pop(old_path, None)
+        save_manifest(manifest)
+
+        for path, loader_name, metadata in files:
+            digest = current_hash(path)
+            entry = manifest.get(path)
+            if entry and entry["sha256"] == digest and entry.get("metadata") == metadata:
+                if entry["chunks"] and not lexical.has_source(path):
+                    # indexed before the lexical index existed, copy its chunks over from chroma
+                    stored = db.get(ids=entry["chunks"], include=["documents", "metadatas"])
+                    lexical.add(stored["ids"], stored["documents"], stored["metadatas"])
+                _indexed[path] = (digest, metadata)
+                continue
+
+            old_ids = set(entry["chunks"]) if entry else set()
+            known = old_ids if entry and entry.get("metadata") == metadata else frozenset()
+            ids = ingest_file(path, loader_name, db, known, progress, metadata)
+
+            removed = list(old_ids - set(ids))
+            if removed:
+                db.delete(ids=removed)
+                lexical.delete(removed)
+
+            manifest[path] = {"sha256": digest, "metadata": metadata, "chunks": ids}
+            save_manifest(manifest)
+            _indexed[path] = (digest, metadata)
+    return db
+
+
+def _run_sync():
+    try:
+        sync_index()
+    except Exception as e:
+        print(f"---INGEST FAILED: {e}---", flush=True)
+
+
+def start_ingest():
+    '''syncs the index on a background thread; returns that thread, or the one already running'''
+    global _thread
+    with _state_lock:
+        if _thread is None or not _thread.is_alive():
+            _thread = threading.Thread(target=_run_sync, name="retriever-ingest", daemon=True)
+            _thread.start()
+        return _thread
+
+
+def ensure_index(timeout=INGEST_WAIT):
+    '''
+    the store retriever_ searches: straight away when the index matches the corpus, otherwise after
+    waiting up to `timeout` seconds for the (background) ingestion, with whatever it stored so far
+    '''
+    if not all(is_current(path, metadata) for path, _, metadata in corpus_files()):
+        start_ingest().join(timeout)
+    return get_vectorstore()
+
+
+if __name__ == "__main__":
+    sync_index()
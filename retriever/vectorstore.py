@@ -1,46 +1,158 @@
-from langchain_community.document_loaders import TextLoader, PyPDFLoader, CSVLoader
-from langchain_text_splitters import RecursiveCharacterTextSplitter
-from langchain_community.vectorstores import Chroma
-from langchain_huggingface import HuggingFaceEmbeddings
 from langchain_core.tools import tool
+from core.registry import get_embeddings
 
 
+import hashlib
+import json
 import os
+import re
 
-@tool
-def retriever_(input):
+INDEX_DIR = os.getenv("RETRIEVER_INDEX_DIR", ".retriever_index")
+MANIFEST_PATH = os.path.join(INDEX_DIR, "manifest.json")
+COLLECTION_NAME = "user_files"
+# uploaded documents, one sub directory per user or company: corpus/<owner>/<file>
+CORPUS_DIR = os.getenv("RETRIEVER_CORPUS_DIR", "corpus")
+RETRIEVER_K = int(os.getenv("RETRIEVER_K", "4"))
+# single uploads in the working directory, still indexed under the "default" owner
+SOURCE_FILES = [('file.txt', 'TextLoader'), ('file.pdf', 'PyPDFLoader'), ('file.csv', 'CSVLoader')]
+LOADERS = {".txt": "TextLoader", ".md": "TextLoader", ".pdf": "PyPDFLoader", ".csv": "CSVLoader"}
+METADATA_FIELDS = ("ticker", "filing_type", "period", "owner", "source")
+
+_FILING_TYPES = [
+    (r"10-?k", "10-K"), (r"10-?q", "10-Q"), (r"8-?k", "8-K"), (r"20-?f", "20-F"),
+    (r"annual[ _-]?report", "annual_report"), (r"earnings|transcript", "earnings"),
+    (r"cash[ _-]?flow", "cash_flow"), (r"balance[ _-]?sheet", "balance_sheet"),
+    (r"income[ _-]?statement|p&l|profit[ _-]?and[ _-]?loss", "income_statement"),
+    (r"ledger", "ledger"),
+]
+
+_db = None
+
+
+def get_vectorstore():
+    '''
+    returns the persistent on-disk chroma collection, created once per process
+    '''
+    global _db
+    if _db is None:
+        from langchain_community.vectorstores import Chroma
+        _db = Chroma(
+            collection_name=COLLECTION_NAME,
+            embedding_function=get_embeddings(),
+            persist_directory=INDEX_DIR,
+        )
+    return _db
+
+
+def file_hash(path):
+    h = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(1 << 20), b''):
+            h.update(block)
+    return h.hexdigest()
+
+
+def chunk_id(source, chunk, seen):
+    '''
+    content hash of a chunk; repeated chunks inside one source get an occurrence suffix (tracked in
+    `seen`, one dict per source) so ids stay unique and stable between runs
     '''
-    This function must only be used if input doesnot contain any company details 
-    This function retrieves data from the user's input file.
-    The context and contents of the file are unknown: it might be a cash flow statement, company funds, or their plans.
-    The file type is checked among .txt, .pdf, or .csv.
+    digest = hashlib.sha256(f"{source}\x00{chunk.page_content}".encode("utf-8")).hexdigest()
+    n = seen.get(digest, 0)
+    seen[digest] = n + 1
+    return digest if n == 0 else f"{digest}-{n}"
+
+
+def load_manifest():
+    if not os.path.exists(MANIFEST_PATH):
+        return {}
+    with open(MANIFEST_PATH, 'r', encoding='utf-8') as f:
+        return json.load(f)
+
+
+def save_manifest(manifest):
+    os.makedirs(INDEX_DIR, exist_ok=True)
+    tmp = MANIFEST_PATH + ".tmp"
+    with open(tmp, 'w', encoding='utf-8') as f:
+        json.dump(manifest, f)
+    os.replace(tmp, MANIFEST_PATH)
+
+
+def infer_period(name):
+    match = re.search(r"(?i)\b(q[1-4])[ _-]?((?:19|20)\d{2})\b", name)
+    if match:
+        return f"{match.group(1).upper()}-{match.group(2)}"
+    match = re.search(r"(?i)\b(?:fy)?[ _-]?((?:19|20)\d{2})\b", name)
+    return f"FY{match.group(1)}" if match else None
+
+
+def file_metadata(path, owner):
+    '''
+    ticker, filing_type and period of a document: from a `<file>.meta.json` sidecar when there is one,
+    otherwise guessed from the owner directory and the file name (e.g. AAPL/10-K_FY2023.pdf)
     '''
+    from core.tickers import resolve_ticker
+    name = os.path.splitext(os.path.basename(path))[0].replace("_", " ")
+    metadata = {
+        "source": path,
+        "owner": owner,
+        "ticker": resolve_ticker(owner) or resolve_ticker(name),
+        "filing_type": next((label for pattern, label in _FILING_TYPES if re.search(pattern, name, re.I)), None),
+        "period": infer_period(name),
+        "format": os.path.splitext(path)[1].lstrip(".").lower(),
+    }
+    sidecar = path + ".meta.json"
+    if os.path.exists(sidecar):
+        with open(sidecar, encoding="utf-8") as f:
+            metadata.update(json.load(f))
+    return {k: v for k, v in metadata.items() if v is not None}
 
-    loader = None
-    if os.path.exists('file.txt'):
-        loader = TextLoader('file.txt')
-    elif os.path.exists('file.pdf'):
-        loader = PyPDFLoader('file.pdf')
-    elif os.path.exists('file.csv'):
-        loader = CSVLoader('file.csv')
-    else:
-        raise FileNotFoundError("No input file found with supported extension.")
 
-    documents = loader.load()
+def corpus_files():
+    '''[(path, loader name, metadata)] for every supported document in the corpus and the working directory'''
+    files = [(path, loader_name, file_metadata(path, "default")) for path, loader_name in SOURCE_FILES if os.path.exists(path)]
+    if os.path.isdir(CORPUS_DIR):
+        for root, _, names in os.walk(CORPUS_DIR):
+            rel = os.path.relpath(root, CORPUS_DIR)
+            owner = "default" if rel == "." else rel.split(os.sep)[0]
+            for name in sorted(names):
+                loader_name = LOADERS.get(os.path.splitext(name)[1].lower())
+                if loader_name:
+                    path = os.path.join(root, name)
+                    files.append((path, loader_name, file_metadata(path, owner)))
+    return files
 
-    splitter = RecursiveCharacterTextSplitter(chunk_size=100, chunk_overlap=20)
-    chunks = splitter.split_documents(documents)
 
-    embeddings = HuggingFaceEmbeddings(model_name="sentence-transformers/all-MiniLM-L6-v2")
+def metadata_filter(**filters):
+    '''chroma `where` clause for the given metadata values, None when nothing is filtered'''
+    clauses = []
+    for field, value in filters.items():
+        if value in (None, ""):
+            continue
+        if field == "ticker":
+            value = value.upper()
+        clauses.append({field: value})
+    if not clauses:
+        return None
+    return clauses[0] if len(clauses) == 1 else {"$and": clauses}
 
-    db = Chroma.from_documents(chunks, embedding=embeddings)
 
-    retriever = db.as_retriever(
-        search_type="similarity",
-        search_kwargs={'k': 2}
-    )
-    results = retriever.invoke(input)
-    return [doc.page_content for doc in results]
+@tool
+def retriever_(input: str, ticker: str = None, filing_type: str = None, period: str = None):
+    '''
+    This function retrieves data from the documents users uploaded (filings, statements, ledgers, notes).
+    Use it for questions about those files rather than live market data.
+    Optionally narrow the search to one company (ticker, e.g. "AAPL"), a filing type
+    ("10-K", "10-Q", "8-K", "annual_report", "earnings", "cash_flow", "balance_sheet",
+    "income_statement", "ledger") and/or a period ("FY2023", "Q3-2024").
+    '''
 
+    from retriever.ingest import ensure_index
+    from retriever.hybrid import search
+    ensure_index()
 
-# print(retriever_('tell me about the company'))
+    hits = search(input, ticker=ticker, filing_type=filing_type, period=period)
+    return [
+        {"content": content, **{k: metadata[k] for k in METADATA_FIELDS if k in metadata}}
+        for _, _, content, metadata in hits
+    ]
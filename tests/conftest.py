@@ -0,0 +1,16 @@
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from bench.fixture_server import FixtureServer
+
+
+@pytest.fixture
+def fixture_server():
+    '''the bench's recorded FMP responses served on a free local port'''
+    server = FixtureServer().start()
+    yield server
+    server.stop()
@@ -0,0 +1,80 @@
+import math
+
+import pytest
+
+from core import analytics
+
+
+def income(year, revenue, net_income, eps, gross=None, operating=None):
+    return {
+        "calendarYear": str(year), "revenue": revenue, "netIncome": net_income, "eps": eps,
+        "grossProfit": gross if gross is not None else revenue / 2,
+        "operatingIncome": operating if operating is not None else revenue / 4,
+        "ebitda": revenue / 3, "interestExpense": 1,
+    }
+
+
+@pytest.fixture
+def frame():
+    # FMP lists the newest year first
+    return analytics.to_frame({
+        "GROW": [income(2023, 121, 20, 2.0), income(2022, 110, 10, 1.0), income(2021, 100, 8, 0.8)],
+        "TURN": [income(2023, 90, 5, 0.5), income(2022, 100, -10, -1.0), income(2021, 100, -5, -0.5)],
+    }, analytics.INCOME_FIELDS)
+
+
+def test_frame_is_indexed_oldest_first(frame):
+    assert list(frame.loc["GROW"].index) == [2021, 2022, 2023]
+    assert frame.loc[("GROW", 2023), "revenue"] == 121
+
+
+def test_duplicate_periods_keep_the_first_record():
+    frame = analytics.to_frame({"X": [income(2023, 5, 1, 1), income(2023, 7, 1, 1)]}, analytics.INCOME_FIELDS)
+    assert list(frame["revenue"]) == [5]
+
+
+def test_year_over_year_growth(frame):
+    trends = analytics.income_trends(frame)
+    assert math.isnan(trends.loc[("GROW", 2021), "revenue_growth"])
+    assert trends.loc[("GROW", 2022), "revenue_growth"] == pytest.approx(0.10)
+    assert trends.loc[("GROW", 2023), "revenue_growth"] == pytest.approx(0.10)
+    assert trends.loc[("GROW", 2023), "net_income_growth"] == pytest.approx(1.0)
+    assert trends.loc[("GROW", 2023), "gross_margin"] == pytest.approx(0.5)
+
+
+def test_growth_from_a_loss_is_measured_against_its_size(frame):
+    trends = analytics.income_trends(frame)
+    # -5 -> -10 is 100% worse, -10 -> 5 is 150% better
+    assert trends.loc[("TURN", 2022), "net_income_growth"] == pytest.approx(-1.0)
+    assert trends.loc[("TURN", 2023), "net_income_growth"] == pytest.approx(1.5)
+    assert trends.loc[("TURN", 2023), "eps_growth"] == pytest.approx(1.5)
+
+
+def test_cagr_and_margin_change(frame):
+    summary = analytics.growth_summary(frame, analytics.income_trends(frame))
+    assert summary.loc["GROW", "years"] == 3
+    assert summary.loc["GROW", "revenue_cagr"] == pytest.approx(0.10)
+    assert summary.loc["GROW", "net_income_cagr"] == pytest.approx((20 / 8) ** 0.5 - 1)
+    assert summary.loc["GROW", "net_margin_change"] == pytest.approx(20 / 121 - 8 / 100)
+    assert summary.loc["TURN", "revenue_cagr"] == pytest.approx((90 / 100) ** 0.5 - 1)
+    # no CAGR across a sign change
+    assert math.isnan(summary.loc["TURN", "net_income_cagr"])
+
+
+def test_single_year_has_no_cagr():
+    frame = analytics.to_frame({"NEW": [income(2023, 50, 5, 1)]}, analytics.INCOME_FIELDS)
+    summary = analytics.growth_summary(frame, analytics.income_trends(frame))
+    assert summary.loc["NEW", "years"] == 1
+    assert math.isnan(summary.loc["NEW", "revenue_cagr"])
+
+
+def test_slopes_are_per_year(frame):
+    assert analytics.slopes(frame[["revenue"]]).loc["GROW", "revenue"] == pytest.approx(10.5)
+
+
+def test_zscore_of_the_latest_value(frame):
+    z = analytics.zscores(frame[["revenue"]])
+    values = [100, 110, 121]
+    mean = sum(values) / 3
+    std = (sum((v - mean) ** 2 for v in values) / 3) ** 0.5
+    assert z.loc["GROW", "revenue"] == pytest.approx((121 - mean) / std)
@@ -0,0 +1,84 @@
+import json
+
+import pytest
+
+from core import analytics
+from graphs import batch
+from graphs.batch import TICKER_QUERY, batch_items, completed_ids, prefetch_shared
+from core.fmp import FMPClient
+
+
+def ids(entries):
+    return [item["id"] for item in batch_items(entries)]
+
+
+def test_bare_symbols_and_names_get_the_standard_query():
+    items = batch_items(["AAPL", "TESLA", "Bank of America"])
+    assert [(i["id"], i["ticker"]) for i in items] == [("AAPL", "AAPL"), ("TSLA", "TSLA"), ("BAC", "BAC")]
+    assert items[0]["query"] == TICKER_QUERY.format(ticker="AAPL")
+
+
+def test_unknown_symbol_shaped_entries_are_promoted():
+    assert ids(["RIVN", "$sofi", "BRK.B"]) == ["RIVN", "SOFI", "BRK.B"]
+    # lower case without a $ could be any word
+    assert batch_items(["rivian"]) == [{"id": "rivian", "ticker": None, "query": "rivian"}]
+
+
+def test_names_the_index_knows_win_over_the_symbol_shape():
+    assert ids(["APPLE", "TESLA"]) == ["AAPL", "TSLA"]
+
+
+def test_other_entries_are_free_text_queries():
+    assert batch_items(["What moved Apple today?"]) == [
+        {"id": "What moved Apple today?", "ticker": "AAPL", "query": "What moved Apple today?"},
+    ]
+
+
+def test_comments_blanks_and_duplicates_are_dropped():
+    assert ids(["# watchlist", "", "AAPL", "aapl", "Apple", "$AAPL", "MSFT"]) == ["AAPL", "MSFT"]
+
+
+def test_resume_skips_finished_items_and_a_torn_last_line(tmp_path):
+    out = tmp_path / "batch.jsonl"
+    assert completed_ids(str(out)) == set()
+    out.write_text(
+        json.dumps({"id": "AAPL", "status": "ok"}) + "\n"
+        + json.dumps({"id": "MSFT", "status": "error"}) + "\n"
+        + '{"id": "NVDA", "stat'
+    )
+    assert completed_ids(str(out)) == {"AAPL"}
+
+
+@pytest.fixture
+def prefetch(fixture_server, monkeypatch):
+    '''prefetch_shared() against the fixture server, recording what it adds to the ticker index'''
+    added = {}
+    client = FMPClient(api_key="test", base_url=fixture_server.base_url, rate_per_minute=60000)
+    monkeypatch.setattr(batch, "get_client", lambda: client)
+    monkeypatch.setattr(batch, "add_companies", added.update)
+    monkeypatch.setattr(analytics, "analyze_tickers", lambda symbols: {"symbols": symbols})
+    return added
+
+
+def test_prefetch_drops_symbols_without_a_profile(fixture_server, prefetch, monkeypatch):
+    response = fixture_server.response
+
+    def without_zzzz(path, params):
+        records = response(path, params)
+        return [r for r in records if r.get("symbol") != "ZZZZ"] if path.startswith("profile/") else records
+    monkeypatch.setattr(fixture_server, "response", without_zzzz)
+
+    quotes, pinned, fundamentals, unknown = prefetch_shared(batch_items(["AAPL", "ZZZZ", "What moved the market?"]))
+    assert unknown == {"ZZZZ"}
+    assert set(prefetch) == {"AAPL"}
+    assert set(quotes) == {"AAPL"}
+    assert fundamentals == {"symbols": ["AAPL"]}
+    assert len(pinned) == 2
+
+
+def test_prefetch_keeps_every_symbol_when_no_profile_comes_back(fixture_server, prefetch, monkeypatch):
+    monkeypatch.setattr(fixture_server, "response", lambda path, params: [])
+
+    *_, fundamentals, unknown = prefetch_shared(batch_items(["AAPL", "ZZZZ"]))
+    assert unknown == set()
+    assert fundamentals == {"symbols": ["AAPL", "ZZZZ"]}
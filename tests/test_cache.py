@@ -0,0 +1,108 @@
+import asyncio
+import threading
+import time
+
+import pytest
+
+from core.concurrency import run_parallel
+from core.cache import TTLCache
+
+
+def wait_for(condition, timeout=5.0):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        assert time.monotonic() < deadline, "timed out"
+        time.sleep(0.005)
+
+
+def test_concurrent_misses_share_one_fetch():
+    cache = TTLCache()
+    release = threading.Event()
+    calls = []
+
+    def fetch():
+        calls.append(1)
+        release.wait(5)
+        return {"price": 1}
+
+    def lookup():
+        return cache.get_or_fetch("quote/AAPL", 60, fetch)
+
+    def release_when_queued():
+        wait_for(lambda: cache.metrics["coalesced"] == 7)
+        release.set()
+
+    results = run_parallel([lookup] * 8 + [release_when_queued], max_workers=9)[:8]
+
+    assert len(calls) == 1
+    assert results == [{"price": 1}] * 8
+    stats = cache.stats()
+    assert stats["misses"] == 1 and stats["coalesced"] == 7
+    assert stats["hit_rate"] == pytest.approx(7 / 8)
+
+
+def test_a_failed_fetch_reaches_every_waiter_and_is_not_cached():
+    cache = TTLCache()
+    release = threading.Event()
+
+    def fetch():
+        release.wait(5)
+        raise ValueError("upstream down")
+
+    def lookup():
+        try:
+            return cache.get_or_fetch("k", 60, fetch)
+        except ValueError as e:
+            return str(e)
+
+    def release_when_queued():
+        wait_for(lambda: cache.metrics["coalesced"] == 3)
+        release.set()
+
+    results = run_parallel([lookup] * 4 + [release_when_queued])
+    assert results[:4] == ["upstream down"] * 4
+    assert cache.get_or_fetch("k", 60, lambda: "ok") == "ok"
+
+
+def test_entries_expire_after_their_ttl():
+    cache = TTLCache()
+    cache.set("fresh", 1, 60)
+    cache.set("stale", 2, -1)
+    assert cache.get("fresh") == (True, 1)
+    assert cache.get("stale") == (False, None)
+
+
+def test_least_recently_used_entry_is_evicted():
+    cache = TTLCache(max_entries=2)
+    cache.set("a", 1, 60)
+    cache.set("b", 2, 60)
+    cache.get("a")
+    cache.set("c", 3, 60)
+    assert cache.get("b") == (False, None)
+    assert cache.get("a") == (True, 1)
+    assert cache.stats()["evictions"] == 1
+
+
+def test_disk_tier_survives_a_new_instance(tmp_path):
+    path = str(tmp_path / "cache.sqlite")
+    TTLCache(path=path).set("profile/AAPL", [{"symbol": "AAPL"}], 60)
+    cache = TTLCache(path=path)
+    assert cache.get("profile/AAPL") == (True, [{"symbol": "AAPL"}])
+    assert cache.stats()["hits_disk"] == 1
+
+
+def test_concurrent_async_misses_share_one_fetch():
+    cache = TTLCache()
+    calls = []
+
+    async def fetch():
+        calls.append(1)
+        await asyncio.sleep(0.01)
+        return {"grade": "good"}
+
+    async def main():
+        return await asyncio.gather(*[cache.aget_or_fetch("report", 60, fetch) for _ in range(5)])
+
+    assert asyncio.run(main()) == [{"grade": "good"}] * 5
+    assert len(calls) == 1
+    assert cache.metrics["misses"] == 1 and cache.metrics["coalesced"] == 4
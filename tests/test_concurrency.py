@@ -0,0 +1,123 @@
+import asyncio
+
+import pytest
+from langchain_core.runnables import RunnableLambda
+from langchain_core.tools import tool
+
+from core.concurrency import PROVIDER_LIMITS, AdmissionControl, Overloaded, limited_runnable, provider_limit
+from core.tools import limited_tool
+
+
+def run(coro):
+    return asyncio.run(coro)
+
+
+def test_a_client_over_its_share_is_refused():
+    async def scenario():
+        admission = AdmissionControl(max_running=4, max_queued=4, per_client=1, default_seconds=10)
+        async with admission.admit("alice"):
+            with pytest.raises(Overloaded) as refused:
+                async with admission.admit("alice"):
+                    pass
+            async with admission.admit("bob"):
+                assert admission.stats()["running"] == 2
+        return refused.value
+
+    refused = run(scenario())
+    assert refused.reason == "client"
+    assert refused.retry_after >= 1
+
+
+def test_requests_queue_for_a_slot_and_overflow_is_refused():
+    async def scenario():
+        admission = AdmissionControl(max_running=1, max_queued=1, per_client=5)
+        release = asyncio.Event()
+        order = []
+
+        async def request(name):
+            async with admission.admit(name):
+                order.append(name)
+                await release.wait()
+
+        first = asyncio.create_task(request("a"))
+        second = asyncio.create_task(request("b"))
+        await asyncio.sleep(0)
+        assert admission.stats()["running"] == 1 and admission.stats()["queued"] == 1
+        with pytest.raises(Overloaded) as refused:
+            async with admission.admit("c"):
+                pass
+        release.set()
+        await asyncio.gather(first, second)
+        return admission, order, refused.value
+
+    admission, order, refused = run(scenario())
+    assert refused.reason == "server"
+    assert order == ["a", "b"]
+    assert admission.stats()["running"] == 0 and admission.stats()["queued"] == 0
+    assert not admission.clients
+
+
+def test_a_cancelled_waiter_gives_back_its_queue_place():
+    async def scenario():
+        admission = AdmissionControl(max_running=1, max_queued=1, per_client=5)
+        release = asyncio.Event()
+
+        async def request():
+            async with admission.admit("x"):
+                await release.wait()
+
+        running = asyncio.create_task(request())
+        waiting = asyncio.create_task(request())
+        await asyncio.sleep(0)
+        waiting.cancel()
+        await asyncio.gather(waiting, return_exceptions=True)
+        queued = admission.stats()["queued"]
+        release.set()
+        await running
+        return admission, queued
+
+    admission, queued = run(scenario())
+    assert queued == 0
+    assert admission.stats() == {**admission.stats(), "running": 0, "queued": 0, "clients": 0}
+
+
+def test_retry_after_follows_recent_run_times():
+    admission = AdmissionControl(max_running=2, max_queued=4, per_client=1, default_seconds=30)
+    assert admission.retry_after() == 15
+    admission._durations.extend([2.0, 4.0])
+    admission.queued = 3
+    # mean 3s, four requests ahead of a newcomer over two slots
+    assert admission.retry_after() == 6
+
+
+def test_an_agent_holds_its_llm_slot_only_for_the_llm_call(monkeypatch):
+    monkeypatch.setitem(PROVIDER_LIMITS, "groq", 1)
+    running, peak = [], []
+
+    async def fake_llm(inputs):
+        running.append(inputs)
+        peak.append(len(running))
+        await asyncio.sleep(0.01)
+        running.remove(inputs)
+        return inputs
+
+    @tool
+    def lookup(ticker: str):
+        '''a tool the agent calls between two LLM steps'''
+        return ticker
+
+    llm = limited_runnable(RunnableLambda(fake_llm), "groq")
+    limited_lookup = limited_tool(lookup, "fmp")
+
+    async def agent(i):
+        await llm.ainvoke(i)
+        # the agent's groq slot is free while its tool runs
+        async with provider_limit("groq"):
+            assert await limited_lookup.ainvoke({"ticker": "AAPL"}) == "AAPL"
+        return await llm.ainvoke(i)
+
+    async def scenario():
+        return await asyncio.wait_for(asyncio.gather(*(agent(i) for i in range(3))), 5)
+
+    assert run(scenario()) == [0, 1, 2]
+    assert max(peak) == 1
@@ -0,0 +1,105 @@
+import time
+from types import SimpleNamespace
+
+import pytest
+import requests
+
+from core import fmp
+from core.cache import TTLCache
+from core.fmp import FMPClient, RateLimiter
+
+
+def make_client(server, **kwargs):
+    options = {"api_key": "test", "base_url": server.base_url, "rate_per_minute": 60000, "backoff": 0.01, "max_backoff": 0.05}
+    return FMPClient(**{**options, **kwargs})
+
+
+@pytest.fixture
+def sleeps(monkeypatch):
+    '''the retry delays the client asks for, recorded instead of waited out'''
+    delays = []
+    monkeypatch.setattr(fmp, "time", SimpleNamespace(sleep=delays.append, monotonic=time.monotonic))
+    return delays
+
+
+def test_retries_transient_statuses(fixture_server, sleeps):
+    client = make_client(fixture_server)
+    fixture_server.fail_next(429, 503)
+    data = client.fetch_json("profile/AAPL")
+    assert data[0]["symbol"] == "AAPL"
+    assert client.retries == 2
+    assert fixture_server.requests == 3
+    assert len(sleeps) == 2 and all(0 <= d <= 0.05 for d in sleeps)
+
+
+def test_gives_up_after_max_retries(fixture_server, sleeps):
+    client = make_client(fixture_server, max_retries=2)
+    fixture_server.fail_next(500, 502, 504)
+    with pytest.raises(requests.exceptions.HTTPError):
+        client.fetch_json("profile/AAPL")
+    assert fixture_server.requests == 3
+    assert client.retries == 2
+
+
+def test_client_errors_are_not_retried(fixture_server, sleeps):
+    client = make_client(fixture_server)
+    fixture_server.fail_next(404)
+    with pytest.raises(requests.exceptions.HTTPError):
+        client.fetch_json("profile/AAPL")
+    assert fixture_server.requests == 1
+    assert client.retries == 0 and sleeps == []
+
+
+def test_honours_retry_after(fixture_server, sleeps):
+    client = make_client(fixture_server, max_backoff=8.0)
+    fixture_server.fail_next(429, retry_after=2)
+    client.fetch_json("quote/AAPL")
+    assert sleeps == [2.0]
+
+
+def test_retry_after_is_capped_by_max_backoff(fixture_server, sleeps):
+    client = make_client(fixture_server, max_backoff=0.5)
+    fixture_server.fail_next(503, retry_after=120)
+    client.fetch_json("quote/AAPL")
+    assert sleeps == [0.5]
+
+
+def test_get_json_serves_repeats_from_cache(fixture_server):
+    client = make_client(fixture_server, cache=TTLCache())
+    first = client.get_json("profile/AAPL")
+    assert client.get_json("profile/AAPL") == first
+    assert fixture_server.requests == 1
+
+
+def test_get_many_caches_each_symbol(fixture_server):
+    client = make_client(fixture_server, cache=TTLCache())
+    records = client.get_many("profile", ["AAPL", "MSFT", "AAPL"])
+    assert set(records) == {"AAPL", "MSFT"}
+    assert client.get_json("profile/MSFT")[0]["symbol"] == "MSFT"
+    assert fixture_server.requests == 1
+
+
+def test_token_bucket_allows_a_burst_then_refills():
+    limiter = RateLimiter(60, burst=2)
+    assert limiter.try_acquire() and limiter.try_acquire()
+    assert not limiter.try_acquire()
+    # one second at 60/minute adds one token
+    limiter.updated -= 1.0
+    assert limiter.try_acquire()
+    assert not limiter.try_acquire()
+
+
+def test_token_bucket_never_exceeds_its_capacity():
+    limiter = RateLimiter(60, burst=3)
+    limiter.updated -= 3600
+    assert limiter.try_acquire(3)
+    assert not limiter.try_acquire()
+
+
+def test_acquire_waits_for_the_next_token():
+    limiter = RateLimiter(600, burst=1)
+    started = time.monotonic()
+    limiter.acquire()
+    limiter.acquire()
+    # 600/minute is a token every 0.1s
+    assert time.monotonic() - started >= 0.08
@@ -0,0 +1,60 @@
+import pytest
+
+from retriever.hybrid import LexicalIndex, reciprocal_rank_fusion, tokenize
+
+DOCS = {
+    "apple-10k": ("Apple revenue was 391,035 in FY2024, per the 10-K.", {"ticker": "AAPL", "filing_type": "10-K"}),
+    "apple-risk": ("Apple risk factors: supply chain concentration and regulation.", {"ticker": "AAPL", "filing_type": "10-K"}),
+    "msft-10k": ("Microsoft revenue grew on cloud demand; revenue from Azure rose.", {"ticker": "MSFT", "filing_type": "10-K"}),
+}
+
+
+@pytest.fixture
+def index(tmp_path):
+    index = LexicalIndex(path=str(tmp_path / "lexical.sqlite"))
+    ids = list(DOCS)
+    index.add(ids, [DOCS[i][0] for i in ids], [DOCS[i][1] for i in ids])
+    return index
+
+
+def test_tokenize_keeps_financial_tokens():
+    assert tokenize("The FY2024 10-K shows revenue of 391,035 for AAPL") == ["fy2024", "10-k", "shows", "revenue", "391035", "aapl"]
+
+
+def test_bm25_ranks_the_best_match_first(index):
+    hits = index.search("azure cloud revenue", 3)
+    assert [h[0] for h in hits][:2] == ["msft-10k", "apple-10k"]
+    assert hits[0][1] > hits[1][1] > 0
+    assert hits[0][2] == DOCS["msft-10k"][0] and hits[0][3]["ticker"] == "MSFT"
+
+
+def test_repeated_terms_score_higher(index):
+    scores = dict((h[0], h[1]) for h in index.search("revenue", 3))
+    assert scores["msft-10k"] > scores["apple-10k"]
+    assert "apple-risk" not in scores
+
+
+def test_metadata_filters_restrict_the_candidates(index):
+    assert [h[0] for h in index.search("revenue", 3, filters={"ticker": "AAPL"})] == ["apple-10k"]
+
+
+def test_reindexing_replaces_a_chunk(index):
+    index.add(["apple-10k"], ["Apple buybacks"], [{"ticker": "AAPL"}])
+    assert index.search("391,035", 3) == []
+    assert [h[0] for h in index.search("buybacks", 3)] == ["apple-10k"]
+    index.delete(["apple-10k"])
+    assert index.search("buybacks", 3) == []
+
+
+def test_query_of_stopwords_finds_nothing(index):
+    assert index.search("what is the", 3) == []
+
+
+def test_rrf_rewards_agreement_between_rankings():
+    lexical = [("a", 9.0, "A", {}), ("b", 5.0, "B", {})]
+    vector = [("b", 0.1, "B", {}), ("c", 0.2, "C", {})]
+    fused = reciprocal_rank_fusion(lexical, vector, k=60)
+    assert [f[0] for f in fused] == ["b", "a", "c"]
+    assert fused[0][1] == pytest.approx(1 / 62 + 1 / 61)
+    assert fused[1][1] == pytest.approx(1 / 61)
+    assert fused[0][2:] == ("B", {})
@@ -0,0 +1,18 @@
+import os
+
+from retriever import ingest
+
+
+def test_a_changed_file_replaces_its_cached_hash(tmp_path, monkeypatch):
+    monkeypatch.setattr(ingest, "_hashes", {})
+    path = str(tmp_path / "notes.txt")
+    with open(path, "w") as f:
+        f.write("revenue grew")
+    first = ingest.current_hash(path)
+    assert ingest.current_hash(path) == first
+
+    with open(path, "w") as f:
+        f.write("revenue fell sharply")
+    os.utime(path, ns=(0, os.stat(path).st_mtime_ns + 1))
+    assert ingest.current_hash(path) != first
+    assert list(ingest._hashes) == [path]
@@ -0,0 +1,50 @@
+import pytest
+
+from graphs.orchestrator import SECTION_TEMPLATES, Section, fits_template, normalize_plan, rule_plan
+
+
+@pytest.mark.parametrize("topic", [
+    "Analyze Apple",
+    "Give me a full financial analysis of AAPL",
+    "apple's market performance and risk overview",
+    "Provide a detailed report on $aapl stock",
+])
+def test_a_standard_analysis_of_one_company_gets_the_template_plan(topic):
+    plan = rule_plan(topic)
+    assert [s.name for s in plan] == list(SECTION_TEMPLATES)
+    assert all("AAPL" in s.description and topic in s.description for s in plan)
+
+
+@pytest.mark.parametrize("topic", [
+    "Compare nvidia vs amd",
+    "nvidia vs amd",
+    "What is Apple's dividend policy?",
+    "Analyze Apple's supply chain exposure to China",
+    "Analyze Rivian",
+    "What moved the market today?",
+])
+def test_everything_else_goes_to_the_llm_planner(topic):
+    assert rule_plan(topic) is None
+
+
+def test_fits_template_ignores_the_company_name():
+    assert fits_template("analysis of apple inc", "AAPL")
+    assert not fits_template("analysis of apple's buybacks", "AAPL")
+
+
+def test_normalize_plan_keeps_known_sections_once_and_fills_the_missing_ones():
+    plan = normalize_plan([
+        Section(name="Risk Analysis", description="ratios"),
+        Section(name="risk_analysis", description="duplicate"),
+        Section(name="valuation", description="not a section we run"),
+    ], "Analyze Apple")
+    assert [s.name for s in plan] == list(SECTION_TEMPLATES)
+    assert plan[2].description == "ratios"
+    assert plan[0].description == SECTION_TEMPLATES["fin_analysis"].format(ticker="AAPL", topic="Analyze Apple")
+
+
+@pytest.mark.parametrize("sections", [None, []])
+def test_normalize_plan_builds_the_template_plan_from_an_empty_answer(sections):
+    plan = normalize_plan(sections, "What moved the market today?")
+    assert [s.name for s in plan] == list(SECTION_TEMPLATES)
+    assert all("the company" in s.description for s in plan)
@@ -0,0 +1,39 @@
+import asyncio
+
+from core.request_context import arequest_stream, current_request, request_context, request_stream
+
+
+def topics():
+    yield current_request().topic
+    yield current_request().topic
+
+
+async def atopics():
+    for topic in topics():
+        yield topic
+
+
+def test_a_partly_read_stream_leaves_no_request_behind():
+    stream = request_stream("AAPL", topics())
+    assert next(stream) == "AAPL"
+    assert current_request() is None
+    stream.close()
+    assert current_request() is None
+
+
+def test_a_stream_inside_a_request_joins_it():
+    with request_context("outer") as outer:
+        assert list(request_stream("inner", topics())) == ["outer", "outer"]
+        assert current_request() is outer
+    assert current_request() is None
+
+
+def test_an_abandoned_async_stream_leaves_no_request_behind():
+    async def scenario():
+        async for topic in arequest_stream("AAPL", atopics()):
+            assert topic == "AAPL"
+            assert current_request() is None
+            break
+        return current_request()
+
+    assert asyncio.run(scenario()) is None
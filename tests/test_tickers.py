@@ -0,0 +1,73 @@
+import pytest
+
+from core import tickers
+from core.semantic_cache import SemanticCache, normalize_query
+from core.tickers import find_tickers, resolve_ticker
+
+
+def test_company_names_resolve_to_their_symbol():
+    assert resolve_ticker("Can Apple hit its target?") == "AAPL"
+    assert find_tickers("Can Apple hit its target?") == ["AAPL"]
+
+
+def test_every_named_company_is_found_in_order():
+    assert find_tickers("nvidia vs amd") == ["NVDA", "AMD"]
+    assert resolve_ticker("nvidia vs amd") == "NVDA"
+
+
+def test_everyday_words_only_match_when_capitalised():
+    assert find_tickers("what is the price target for a travel visa") == []
+    assert find_tickers("Target or Visa?") == ["TGT", "V"]
+
+
+@pytest.mark.parametrize("text", ["Analyze AAPL.", "analyze $aapl", "AAPL"])
+def test_explicit_symbols_resolve(text):
+    assert resolve_ticker(text) == "AAPL"
+
+
+def test_acronyms_are_not_symbols():
+    assert resolve_ticker("What does the CEO say about EPS growth?") is None
+
+
+def test_the_bucket_key_keeps_every_company():
+    assert normalize_query("nvidia vs amd")[0] == "NVDA,AMD"
+    assert normalize_query("Analyze Apple")[0] == "AAPL"
+    assert normalize_query("financial outlook for rivian")[0] is None
+
+
+@pytest.fixture
+def cache(monkeypatch):
+    cache = SemanticCache()
+    # every query embeds to the same vector: only the bucket key tells entries apart
+    monkeypatch.setattr(cache, "_embed", lambda text: [1.0, 0.0])
+    return cache
+
+
+def test_lookups_only_match_the_same_companies(cache):
+    cache.store("nvidia vs amd", "comparison")
+    assert cache.lookup("compare NVDA and AMD") == "comparison"
+    assert cache.lookup("analyze nvidia") is None
+
+
+def test_queries_without_a_company_only_match_exactly(cache, monkeypatch):
+    monkeypatch.setattr(cache, "_embed", lambda text: pytest.fail("embedded a query without a ticker"))
+    cache.store("financial outlook for rivian", "rivian report")
+    assert cache.lookup("Financial outlook for Rivian") == "rivian report"
+    assert cache.lookup("financial outlook for lucid") is None
+    assert cache.stats() == {"entries": 1, "hits": 1, "misses": 1}
+
+
+@pytest.fixture
+def restore_index():
+    before = tickers.load_index()
+    yield before
+    tickers._current()[0] = before
+
+
+def test_added_companies_swap_in_a_new_index(restore_index):
+    before = restore_index
+    tickers.add_companies({"rivn": "Rivian Automotive, Inc."})
+    assert resolve_ticker("How is Rivian Automotive doing?") == "RIVN"
+    assert resolve_ticker("RIVN") == "RIVN"
+    # readers holding the old snapshot never see it change under them
+    assert "RIVN" not in before[1] and "rivian automotive" not in before[0]